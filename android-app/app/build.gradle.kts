@@ -41,6 +41,9 @@ dependencies {
     
     // NanoHTTPD - 轻量级 HTTP 服务器
     implementation("org.nanohttpd:nanohttpd:2.3.1")
+
+    // NanoWSD - WebSocket 控制通道（/ws）
+    implementation("org.nanohttpd:nanohttpd-websocket:2.3.1")
     
     // JSON 处理 (Android 自带，但显式声明)
     // implementation("org.json:json:20230227")
@@ -14,6 +14,7 @@ import android.util.Log
 import android.view.Display
 import android.view.accessibility.AccessibilityEvent
 import android.view.accessibility.AccessibilityNodeInfo
+import org.json.JSONObject
 import java.io.ByteArrayOutputStream
 import java.util.concurrent.CountDownLatch
 import java.util.concurrent.TimeUnit
@@ -31,6 +32,7 @@ class AutoGLMAccessibilityService : AccessibilityService() {
     }
 
     private var httpServer: HttpServer? = null
+    private var lastWindowPackage: String? = null
 
     override fun onServiceConnected() {
         super.onServiceConnected()
@@ -43,7 +45,18 @@ class AutoGLMAccessibilityService : AccessibilityService() {
     }
 
     override fun onAccessibilityEvent(event: AccessibilityEvent?) {
-        // 不需要处理事件
+        // 前台应用变化时推送给 WebSocket 客户端，服务端不必轮询
+        if (event?.eventType != AccessibilityEvent.TYPE_WINDOW_STATE_CHANGED) return
+        val packageName = event.packageName?.toString() ?: return
+        if (packageName == lastWindowPackage) return
+        lastWindowPackage = packageName
+
+        httpServer?.broadcast(
+            JSONObject()
+                .put("event", "window")
+                .put("package", packageName)
+                .put("class", event.className?.toString() ?: "")
+        )
     }
 
     override fun onInterrupt() {
@@ -293,10 +306,26 @@ class AutoGLMAccessibilityService : AccessibilityService() {
         return null
     }
 
+    /**
+     * JPEG 截图及原始屏幕尺寸（缩放后可据此换算坐标）
+     */
+    class JpegScreenshot(val bytes: ByteArray, val screenWidth: Int, val screenHeight: Int)
+
     /**
      * 截取屏幕并返回 Base64 编码
      */
     fun takeScreenshotBase64(): String? {
+        val screenshot = takeScreenshotJpeg() ?: return null
+        return Base64.encodeToString(screenshot.bytes, Base64.NO_WRAP)
+    }
+
+    /**
+     * 截取屏幕并返回 JPEG 字节
+     *
+     * @param quality JPEG 质量（1~100）
+     * @param scale 缩放比例（0~1），1 表示原始分辨率
+     */
+    fun takeScreenshotJpeg(quality: Int = 80, scale: Float = 1f): JpegScreenshot? {
         return try {
             if (Build.VERSION.SDK_INT >= Build.VERSION_CODES.R) {
                 // Android 11+ 使用 takeScreenshot API
@@ -324,15 +353,34 @@ class AutoGLMAccessibilityService : AccessibilityService() {
                 
                 latch.await(5, TimeUnit.SECONDS)
                 
-                if (bitmap != null) {
-                    val outputStream = ByteArrayOutputStream()
-                    bitmap!!.compress(Bitmap.CompressFormat.JPEG, 80, outputStream)
-                    val bytes = outputStream.toByteArray()
-                    bitmap!!.recycle()
-                    Base64.encodeToString(bytes, Base64.NO_WRAP)
+                val source = bitmap ?: return null
+                val screenWidth = source.width
+                val screenHeight = source.height
+
+                // 硬件位图不能直接缩放，先复制为软件位图
+                val output = if (scale < 1f) {
+                    val software = source.copy(Bitmap.Config.ARGB_8888, false)
+                    val scaled = Bitmap.createScaledBitmap(
+                        software,
+                        maxOf(1, (screenWidth * scale).toInt()),
+                        maxOf(1, (screenHeight * scale).toInt()),
+                        true
+                    )
+                    if (scaled !== software) {
+                        software.recycle()
+                    }
+                    scaled
                 } else {
-                    null
+                    source
+                }
+
+                val outputStream = ByteArrayOutputStream()
+                output.compress(Bitmap.CompressFormat.JPEG, quality, outputStream)
+                if (output !== source) {
+                    output.recycle()
                 }
+                source.recycle()
+                JpegScreenshot(outputStream.toByteArray(), screenWidth, screenHeight)
             } else {
                 // Android 7-10 不支持 takeScreenshot，返回 null
                 // 调用方应降级到 ADB screencap
@@ -0,0 +1,131 @@
+package com.autoglm.helper
+
+import android.util.Log
+import fi.iki.elonen.NanoHTTPD.IHTTPSession
+import fi.iki.elonen.NanoWSD.WebSocket
+import fi.iki.elonen.NanoWSD.WebSocketFrame
+import fi.iki.elonen.NanoWSD.WebSocketFrame.CloseCode
+import org.json.JSONObject
+import java.io.IOException
+import java.nio.ByteBuffer
+import java.util.concurrent.Executors
+
+/**
+ * WebSocket 控制通道
+ *
+ * 请求（文本帧）: {"id": 1, "op": "tap", "x": 100, "y": 200}
+ *   op: status / screenshot / tap / swipe / input / batch，参数与 HTTP 接口相同
+ * 响应（文本帧）: {"id": 1, "success": true, ...}
+ * 截图响应（二进制帧）: 4 字节请求 id + 4 字节屏幕宽 + 4 字节屏幕高 + JPEG 字节
+ * 推送事件（文本帧）: {"event": "status", ...} / {"event": "window", "package": "..."}
+ *
+ * 同一连接上的请求按顺序在单独的线程执行，读取线程只负责收帧
+ */
+class ControlSocket(
+    handshake: IHTTPSession,
+    private val service: AutoGLMAccessibilityService,
+    private val server: HttpServer
+) : WebSocket(handshake) {
+
+    companion object {
+        private const val TAG = "AutoGLM-ControlSocket"
+    }
+
+    private val executor = Executors.newSingleThreadExecutor()
+
+    override fun onOpen() {
+        server.onSocketOpen(this)
+        sendEvent(server.statusJson().put("event", "status"))
+    }
+
+    override fun onClose(code: CloseCode?, reason: String?, initiatedByRemote: Boolean) {
+        server.onSocketClose(this)
+        executor.shutdownNow()
+    }
+
+    override fun onMessage(message: WebSocketFrame) {
+        val request = try {
+            JSONObject(message.textPayload)
+        } catch (e: Exception) {
+            Log.w(TAG, "Invalid message", e)
+            return
+        }
+        executor.execute { handleRequest(request) }
+    }
+
+    override fun onPong(pong: WebSocketFrame) {
+        // 心跳由客户端发起，服务端自动回复 pong
+    }
+
+    override fun onException(exception: IOException) {
+        Log.w(TAG, "WebSocket error: ${exception.message}")
+    }
+
+    /**
+     * 推送事件（连接已关闭时忽略）
+     */
+    fun sendEvent(event: JSONObject) {
+        try {
+            if (isOpen) {
+                send(event.toString())
+            }
+        } catch (e: IOException) {
+            Log.w(TAG, "Failed to push event: ${e.message}")
+        }
+    }
+
+    private fun handleRequest(request: JSONObject) {
+        val id = request.optInt("id")
+        try {
+            val response = when (request.optString("op")) {
+                "status" -> server.statusJson().put("success", true)
+                "screenshot" -> {
+                    if (sendScreenshot(id, request)) return
+                    JSONObject().put("success", false).put("error", "Failed to take screenshot")
+                }
+                "tap" -> JSONObject().put(
+                    "success", service.performTap(request.getInt("x"), request.getInt("y"))
+                )
+                "swipe" -> JSONObject().put(
+                    "success", service.performSwipe(
+                        request.getInt("x1"), request.getInt("y1"),
+                        request.getInt("x2"), request.getInt("y2"),
+                        request.optInt("duration", 300)
+                    )
+                )
+                "input" -> JSONObject().put("success", service.performInput(request.getString("text")))
+                "batch" -> {
+                    val ops = request.getJSONArray("ops")
+                    if (ops.length() > HttpServer.MAX_BATCH_OPS) {
+                        JSONObject().put("success", false).put("error", "Too many ops")
+                    } else {
+                        server.runBatch(ops, request.optBoolean("stop_on_error", true))
+                    }
+                }
+                else -> JSONObject().put("success", false).put("error", "Unknown op")
+            }
+            response.put("id", id)
+            send(response.toString())
+        } catch (e: Exception) {
+            Log.e(TAG, "Error handling request", e)
+            try {
+                send(JSONObject().put("id", id).put("success", false).put("error", e.message).toString())
+            } catch (ignored: IOException) {
+            }
+        }
+    }
+
+    private fun sendScreenshot(id: Int, request: JSONObject): Boolean {
+        val quality = request.optInt("quality", 80).coerceIn(1, 100)
+        val scale = request.optDouble("scale", 1.0).toFloat().coerceIn(0.1f, 1f)
+        val screenshot = service.takeScreenshotJpeg(quality, scale) ?: return false
+
+        val frame = ByteBuffer.allocate(12 + screenshot.bytes.size)
+        frame.putInt(id)
+        frame.putInt(screenshot.screenWidth)
+        frame.putInt(screenshot.screenHeight)
+        frame.put(screenshot.bytes)
+        send(frame.array())
+        return true
+    }
+}
@@ -1,17 +1,62 @@
 package com.autoglm.helper
 
 import android.util.Log
-import fi.iki.elonen.NanoHTTPD
+import fi.iki.elonen.NanoWSD
+import org.json.JSONArray
 import org.json.JSONObject
 import java.io.ByteArrayInputStream
+import java.util.concurrent.CopyOnWriteArraySet
+import java.util.concurrent.Executors
 
-class HttpServer(private val service: AutoGLMAccessibilityService, port: Int = 8080) : NanoHTTPD(port) {
+/**
+ * HTTP 接口 + WebSocket 控制通道（/ws）
+ * NanoWSD 对带 Upgrade: websocket 头的请求建立 WebSocket，其余请求交给 serveHttp
+ */
+class HttpServer(private val service: AutoGLMAccessibilityService, port: Int = 8080) : NanoWSD(port) {
     
     companion object {
         private const val TAG = "AutoGLM-HttpServer"
+        const val MAX_BATCH_OPS = 50
+        private const val MAX_WAIT_MS = 5000L
     }
 
-    override fun serve(session: IHTTPSession): Response {
+    private val sockets = CopyOnWriteArraySet<ControlSocket>()
+
+    // 事件推送在单独的线程发送（无障碍事件回调在主线程，不能做网络操作）
+    private val pushExecutor = Executors.newSingleThreadExecutor()
+
+    override fun openWebSocket(handshake: IHTTPSession): WebSocket {
+        return ControlSocket(handshake, service, this)
+    }
+
+    fun onSocketOpen(socket: ControlSocket) {
+        sockets.add(socket)
+        Log.i(TAG, "WebSocket connected (${sockets.size} open)")
+    }
+
+    fun onSocketClose(socket: ControlSocket) {
+        sockets.remove(socket)
+        Log.i(TAG, "WebSocket closed (${sockets.size} open)")
+    }
+
+    /**
+     * 向所有 WebSocket 连接推送事件
+     */
+    fun broadcast(event: JSONObject) {
+        if (sockets.isEmpty()) return
+        pushExecutor.execute {
+            for (socket in sockets) {
+                socket.sendEvent(event)
+            }
+        }
+    }
+
+    override fun stop() {
+        super.stop()
+        pushExecutor.shutdownNow()
+    }
+
+    override fun serveHttp(session: IHTTPSession): Response {
         val uri = session.uri
         val method = session.method
         
@@ -21,9 +66,11 @@ class HttpServer(private val service: AutoGLMAccessibilityService, port: Int = 8
             when {
                 uri == "/status" && method == Method.GET -> handleStatus()
                 uri == "/screenshot" && method == Method.GET -> handleScreenshot()
+                uri == "/screenshot.jpg" && method == Method.GET -> handleScreenshotJpeg(session)
                 uri == "/tap" && method == Method.POST -> handleTap(session)
                 uri == "/swipe" && method == Method.POST -> handleSwipe(session)
                 uri == "/input" && method == Method.POST -> handleInput(session)
+                uri == "/batch" && method == Method.POST -> handleBatch(session)
                 else -> newFixedLengthResponse(
                     Response.Status.NOT_FOUND,
                     "application/json",
@@ -40,12 +87,17 @@ class HttpServer(private val service: AutoGLMAccessibilityService, port: Int = 8
         }
     }
 
-    private fun handleStatus(): Response {
+    fun statusJson(): JSONObject {
         val json = JSONObject()
         json.put("status", "ok")
         json.put("service", "AutoGLM Helper")
         json.put("version", "1.0.0")
         json.put("accessibility_enabled", service.isAccessibilityEnabled())
+        return json
+    }
+
+    private fun handleStatus(): Response {
+        val json = statusJson()
         
         return newFixedLengthResponse(
             Response.Status.OK,
@@ -81,6 +133,33 @@ class HttpServer(private val service: AutoGLMAccessibilityService, port: Int = 8
         }
     }
 
+    /**
+     * 二进制截图：直接返回 JPEG 字节（带 Content-Length），不做 base64 编码
+     * 查询参数 quality（1~100，默认 80）和 scale（0.1~1，默认 1）
+     */
+    private fun handleScreenshotJpeg(session: IHTTPSession): Response {
+        val params = session.parameters
+        val quality = (params["quality"]?.firstOrNull()?.toIntOrNull() ?: 80).coerceIn(1, 100)
+        val scale = (params["scale"]?.firstOrNull()?.toFloatOrNull() ?: 1f).coerceIn(0.1f, 1f)
+
+        val screenshot = service.takeScreenshotJpeg(quality, scale)
+            ?: return newFixedLengthResponse(
+                Response.Status.INTERNAL_ERROR,
+                "application/json",
+                """{"success": false, "error": "Failed to take screenshot"}"""
+            )
+
+        val response = newFixedLengthResponse(
+            Response.Status.OK,
+            "image/jpeg",
+            ByteArrayInputStream(screenshot.bytes),
+            screenshot.bytes.size.toLong()
+        )
+        response.addHeader("X-Screen-Width", screenshot.screenWidth.toString())
+        response.addHeader("X-Screen-Height", screenshot.screenHeight.toString())
+        return response
+    }
+
     private fun handleTap(session: IHTTPSession): Response {
         val body = getRequestBody(session)
         val json = JSONObject(body)
@@ -140,6 +219,73 @@ class HttpServer(private val service: AutoGLMAccessibilityService, port: Int = 8
         )
     }
 
+    /**
+     * 批量动作：按顺序执行 tap / swipe / input / wait，一次往返返回每一步的结果
+     * 请求: {"ops": [{"type": "tap", "x": 1, "y": 2}, {"type": "wait", "ms": 100}, ...],
+     *        "stop_on_error": true}
+     */
+    private fun handleBatch(session: IHTTPSession): Response {
+        val body = getRequestBody(session)
+        val json = JSONObject(body)
+
+        val ops = json.getJSONArray("ops")
+        val stopOnError = json.optBoolean("stop_on_error", true)
+        if (ops.length() > MAX_BATCH_OPS) {
+            return newFixedLengthResponse(
+                Response.Status.BAD_REQUEST,
+                "application/json",
+                """{"success": false, "error": "Too many ops (max $MAX_BATCH_OPS)"}"""
+            )
+        }
+
+        return newFixedLengthResponse(
+            Response.Status.OK,
+            "application/json",
+            runBatch(ops, stopOnError).toString()
+        )
+    }
+
+    /**
+     * 按顺序执行批量操作，返回 {"success": ..., "results": [...]}
+     */
+    fun runBatch(ops: JSONArray, stopOnError: Boolean): JSONObject {
+        val results = JSONArray()
+        var allSuccess = true
+        for (i in 0 until ops.length()) {
+            val op = ops.getJSONObject(i)
+            val result = JSONObject()
+            val success = when (op.optString("type")) {
+                "tap" -> service.performTap(op.getInt("x"), op.getInt("y"))
+                "swipe" -> service.performSwipe(
+                    op.getInt("x1"), op.getInt("y1"),
+                    op.getInt("x2"), op.getInt("y2"),
+                    op.optInt("duration", 300)
+                )
+                "input" -> service.performInput(op.getString("text"))
+                "wait" -> {
+                    Thread.sleep(op.optLong("ms", 0).coerceIn(0, MAX_WAIT_MS))
+                    true
+                }
+                else -> {
+                    result.put("error", "Unknown op type")
+                    false
+                }
+            }
+            result.put("success", success)
+            results.put(result)
+
+            if (!success) {
+                allSuccess = false
+                if (stopOnError) break
+            }
+        }
+
+        val response = JSONObject()
+        response.put("success", allSuccess)
+        response.put("results", results)
+        return response
+    }
+
     private fun getRequestBody(session: IHTTPSession): String {
         val map = HashMap<String, String>()
         session.parseBody(map)
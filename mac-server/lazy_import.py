@@ -0,0 +1,64 @@
+"""
+延迟导入模块
+PIL、requests、aiohttp、phone_agent 等较重的依赖在第一次访问属性时才真正导入，
+只查看历史记录、管理手机或执行简单命令时不付出导入开销
+
+    requests = lazy_module('requests')
+    session = requests.Session()   # 此时才导入 requests
+
+类型注解中引用这些模块时需要写成字符串（如 'requests.Session'），否则定义函数时就会触发导入
+"""
+
+import importlib
+import importlib.util
+import logging
+import time
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+# 已导入的延迟模块及导入耗时（毫秒），用于启动耗时分析
+load_timings: Dict[str, float] = {}
+
+
+class LazyModule:
+    """模块代理，第一次访问属性时导入真正的模块"""
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._module is not None
+
+    def _load(self):
+        # import_module 自身是线程安全的，多个线程同时首次访问时只会执行一次模块代码
+        if self._module is None:
+            started = time.perf_counter()
+            module = importlib.import_module(self._name)
+            elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+            load_timings.setdefault(self._name, elapsed_ms)
+            logger.debug(f"延迟导入 {self._name}: {elapsed_ms} ms")
+            self._module = module
+        return self._module
+
+    def __getattr__(self, attr: str):
+        return getattr(self._load(), attr)
+
+    def __repr__(self) -> str:
+        state = 'loaded' if self._module is not None else 'not loaded'
+        return f"<LazyModule {self._name} ({state})>"
+
+
+def lazy_module(name: str) -> LazyModule:
+    """返回延迟导入的模块代理（模块不存在时在第一次使用时抛出 ImportError）"""
+    return LazyModule(name)
+
+
+def is_available(name: str) -> bool:
+    """模块是否可以导入（只查找，不执行模块代码；子模块会导入其父包）"""
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
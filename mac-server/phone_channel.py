@@ -0,0 +1,293 @@
+"""
+手机 WebSocket 控制通道
+与 Helper 的 /ws 保持一条长连接：请求带 id 在同一连接上复用，心跳保活，断线自动重连，
+并接收 Helper 主动推送的事件（连接时的状态、前台应用变化等），不需要轮询
+"""
+
+import itertools
+import json
+import logging
+import struct
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Callable, Dict, List, Optional, Tuple
+
+from lazy_import import is_available, lazy_module
+
+# websocket-client 在建立通道时才导入
+WEBSOCKET_AVAILABLE = is_available('websocket')
+websocket = lazy_module('websocket')
+
+logger = logging.getLogger(__name__)
+
+# 截图响应的二进制帧头：请求 id、屏幕宽、屏幕高（大端 int32）
+_SCREENSHOT_HEADER = struct.Struct('>iii')
+
+
+class ChannelError(Exception):
+    """
+    通道请求失败
+
+    Attributes:
+        sent: 请求是否已经发出（已发出的动作不能再通过 HTTP 重试，否则可能重复执行）
+    """
+
+    def __init__(self, message: str, sent: bool = False):
+        super().__init__(message)
+        self.sent = sent
+
+
+class PhoneChannel:
+    """
+    WebSocket 控制通道
+
+    Args:
+        helper_url: Helper 的 HTTP 地址（如 http://192.168.1.100:8080），通道地址为 ws://.../ws
+        heartbeat_interval: 心跳间隔（秒）。Helper 的读取超时为 5 秒，间隔需小于 2.5 秒
+        connect_timeout: 建立连接超时（秒）
+        backoff_min: 重连初始等待（秒），每次失败翻倍
+        backoff_max: 重连最长等待（秒）
+    """
+
+    def __init__(self, helper_url: str, heartbeat_interval: float = 2.0, connect_timeout: float = 3.0,
+                 backoff_min: float = 0.5, backoff_max: float = 30.0):
+        if not WEBSOCKET_AVAILABLE:
+            raise ImportError("WebSocket 通道需要 websocket-client，请执行: pip install websocket-client")
+
+        base = helper_url.rstrip('/')
+        if base.startswith('https://'):
+            self.url = 'wss://' + base[len('https://'):] + '/ws'
+        else:
+            self.url = 'ws://' + base.split('://', 1)[-1] + '/ws'
+
+        self.heartbeat_interval = heartbeat_interval
+        self.connect_timeout = connect_timeout
+        self.backoff_min = backoff_min
+        self.backoff_max = backoff_max
+
+        self._ids = itertools.count(1)
+        self._pending: Dict[int, Future] = {}
+        self._pending_lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._ws = None
+        self._connected = threading.Event()
+        self._closed = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._last_sent = 0.0
+        self._ping_sent_at: Optional[float] = None
+
+        # Helper 推送的最新状态
+        self.status: dict = {}
+        self.current_app: Optional[str] = None
+        self.event_listeners: List[Callable[[dict], None]] = []
+
+        self.heartbeat_rtt_ms: Optional[float] = None
+        self.stats = {'connects': 0, 'disconnects': 0, 'requests': 0, 'events': 0}
+
+    @property
+    def connected(self) -> bool:
+        return self._connected.is_set()
+
+    def start(self):
+        """启动后台连接线程（立即返回）"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._closed.clear()
+        self._thread = threading.Thread(target=self._run, name=f"phone-channel-{self.url}", daemon=True)
+        self._thread.start()
+
+    def wait_connected(self, timeout: float) -> bool:
+        """等待连接建立"""
+        return self._connected.wait(timeout)
+
+    def close(self):
+        """关闭通道，不再重连"""
+        self._closed.set()
+        ws = self._ws
+        if ws is not None:
+            try:
+                ws.close()
+            except Exception:
+                pass
+        if self._thread:
+            self._thread.join(timeout=2)
+
+    def request(self, op: str, timeout: float = 10, **params):
+        """
+        发送请求并等待响应
+
+        Returns:
+            响应 JSON（截图请求返回 (JPEG 字节, 屏幕宽, 屏幕高)）
+
+        Raises:
+            ChannelError: 未连接、发送失败或等待超时
+        """
+        if not self.connected:
+            raise ChannelError("通道未连接")
+
+        request_id = next(self._ids)
+        future: Future = Future()
+        with self._pending_lock:
+            self._pending[request_id] = future
+
+        try:
+            self._send(json.dumps(dict(params, id=request_id, op=op)))
+        except Exception as e:
+            with self._pending_lock:
+                self._pending.pop(request_id, None)
+            raise ChannelError(f"发送失败: {e}")
+
+        self.stats['requests'] += 1
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            raise ChannelError(f"等待响应超时: {op}", sent=True)
+        finally:
+            with self._pending_lock:
+                self._pending.pop(request_id, None)
+
+    def screenshot(self, quality: Optional[int] = None, scale: Optional[float] = None,
+                   timeout: float = 15) -> Tuple[bytes, int, int]:
+        """截图，返回 (JPEG 字节, 屏幕宽, 屏幕高)"""
+        params = {}
+        if quality:
+            params['quality'] = int(quality)
+        if scale:
+            params['scale'] = scale
+        result = self.request('screenshot', timeout=timeout, **params)
+        if isinstance(result, dict):
+            raise ChannelError(f"截图失败: {result.get('error')}", sent=True)
+        return result
+
+    def get_stats(self) -> dict:
+        """通道状态和计数"""
+        return dict(
+            self.stats,
+            connected=self.connected,
+            heartbeat_rtt_ms=self.heartbeat_rtt_ms,
+            current_app=self.current_app,
+        )
+
+    def _send(self, payload, opcode=None):
+        ws = self._ws
+        if ws is None:
+            raise ChannelError("通道未连接")
+        with self._send_lock:
+            if opcode is None:
+                ws.send(payload)
+            else:
+                ws.send(payload, opcode)
+            self._last_sent = time.monotonic()
+
+    def _run(self):
+        """连接循环：断线后按指数退避重连"""
+        delay = self.backoff_min
+        while not self._closed.is_set():
+            try:
+                ws = websocket.create_connection(self.url, timeout=self.connect_timeout)
+            except Exception as e:
+                logger.debug(f"WebSocket 连接失败 {self.url}: {e}")
+            else:
+                self._ws = ws
+                self._last_sent = time.monotonic()
+                self._ping_sent_at = None
+                self._connected.set()
+                self.stats['connects'] += 1
+                logger.info(f"WebSocket 通道已连接: {self.url}")
+                delay = self.backoff_min
+                try:
+                    self._read_loop(ws)
+                except Exception as e:
+                    if not self._closed.is_set():
+                        logger.warning(f"WebSocket 通道断开 {self.url}: {e}")
+                finally:
+                    self._connected.clear()
+                    self._ws = None
+                    self.stats['disconnects'] += 1
+                    self._fail_pending(ChannelError("连接已断开", sent=True))
+                    try:
+                        ws.close()
+                    except Exception:
+                        pass
+
+            if self._closed.wait(delay):
+                break
+            delay = min(delay * 2, self.backoff_max)
+
+    def _read_loop(self, ws):
+        """接收响应和事件；空闲时发送心跳，长时间收不到任何帧视为断线"""
+        ws.settimeout(self.heartbeat_interval)
+        last_received = time.monotonic()
+
+        while not self._closed.is_set():
+            now = time.monotonic()
+            if now - self._last_sent >= self.heartbeat_interval:
+                self._ping_sent_at = now
+                self._send(b'', websocket.ABNF.OPCODE_PING)
+
+            try:
+                opcode, data = ws.recv_data(control_frame=True)
+            except websocket.WebSocketTimeoutException:
+                if time.monotonic() - last_received > self.heartbeat_interval * 3:
+                    raise ChannelError("心跳超时")
+                continue
+
+            last_received = time.monotonic()
+            if opcode == websocket.ABNF.OPCODE_TEXT:
+                self._dispatch_text(data)
+            elif opcode == websocket.ABNF.OPCODE_BINARY:
+                self._dispatch_binary(data)
+            elif opcode == websocket.ABNF.OPCODE_PONG:
+                if self._ping_sent_at is not None:
+                    self.heartbeat_rtt_ms = round((last_received - self._ping_sent_at) * 1000, 1)
+                    self._ping_sent_at = None
+            elif opcode == websocket.ABNF.OPCODE_CLOSE:
+                raise ChannelError("Helper 关闭了连接")
+
+    def _dispatch_text(self, data: bytes):
+        try:
+            message = json.loads(data)
+        except ValueError:
+            logger.debug("无法解析 WebSocket 消息")
+            return
+
+        if 'event' in message:
+            self._handle_event(message)
+            return
+
+        with self._pending_lock:
+            future = self._pending.get(message.get('id'))
+        if future is not None and not future.done():
+            future.set_result(message)
+
+    def _dispatch_binary(self, data: bytes):
+        if len(data) < _SCREENSHOT_HEADER.size:
+            return
+        request_id, width, height = _SCREENSHOT_HEADER.unpack_from(data)
+        with self._pending_lock:
+            future = self._pending.get(request_id)
+        if future is not None and not future.done():
+            future.set_result((data[_SCREENSHOT_HEADER.size:], width, height))
+
+    def _handle_event(self, event: dict):
+        """处理 Helper 推送的事件"""
+        self.stats['events'] += 1
+        if event['event'] == 'status':
+            self.status = {k: v for k, v in event.items() if k != 'event'}
+        elif event['event'] == 'window':
+            self.current_app = event.get('package')
+
+        for listener in self.event_listeners:
+            try:
+                listener(event)
+            except Exception as e:
+                logger.debug(f"事件回调失败: {e}")
+
+    def _fail_pending(self, error: Exception):
+        with self._pending_lock:
+            pending = list(self._pending.values())
+            self._pending.clear()
+        for future in pending:
+            if not future.done():
+                future.set_exception(error)
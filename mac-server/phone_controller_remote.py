@@ -7,13 +7,21 @@ Open-AutoGLM Mac 服务器 - 远程手机控制器
 """
 
 import os
-import requests
 import base64
 import logging
-from typing import Optional
-from PIL import Image
+import threading
+import time
+from typing import Dict, List, Optional
 from io import BytesIO
 
+from lazy_import import lazy_module
+from phone_channel import ChannelError, PhoneChannel, WEBSOCKET_AVAILABLE
+from tracing import span
+
+# 第一次发请求 / 解码图片时才导入
+requests = lazy_module('requests')
+Image = lazy_module('PIL.Image')
+
 # 配置日志
 logging.basicConfig(
     level=logging.INFO,
@@ -21,24 +29,161 @@ logging.basicConfig(
 )
 logger = logging.getLogger('PhoneControllerRemote')
 
+# 各接口默认超时（秒），连接超时统一由 PHONE_CONNECT_TIMEOUT 控制
+DEFAULT_TIMEOUTS = {
+    'status': 5,
+    'screenshot': 15,
+    'screenshot.jpg': 15,
+    'tap': 5,
+    'swipe': 10,
+    'input': 5,
+    'batch': 30,
+}
+
+
+def scale_from_headers(headers, image_width: int) -> float:
+    """根据 X-Screen-Width 响应头计算设备像素 / 截图像素的比例"""
+    try:
+        screen_width = int(headers.get('X-Screen-Width', 0))
+    except (TypeError, ValueError):
+        return 1.0
+    if screen_width <= 0 or image_width <= 0:
+        return 1.0
+    return screen_width / image_width
+
+
+def detect_image_mime(data: bytes) -> str:
+    """根据文件头判断图片 MIME 类型"""
+    if data[:3] == b'\xff\xd8\xff':
+        return 'image/jpeg'
+    if data[:8] == b'\x89PNG\r\n\x1a\n':
+        return 'image/png'
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'image/webp'
+    return 'application/octet-stream'
+
+
+class RemoteScreenshot:
+    """
+    手机截图
+
+    保留 Helper 返回的原始压缩字节（通常是 JPEG，可以是 bytes 或 bytearray），
+    像素只在访问 image 时才解码。获取 base64 / data URI 不需要解码和重新编码。
+    """
+
+    def __init__(self, data: bytes, mime_type: Optional[str] = None):
+        self.data = data
+        self.mime_type = mime_type or detect_image_mime(data)
+        self._image: Optional['Image.Image'] = None
+        self._size: Optional[tuple] = None
+        self._base64: Optional[str] = None
+        # 设备像素 / 截图像素的比例（截图被缩小后大于 1）
+        self.scale = 1.0
+
+    @property
+    def image(self) -> 'Image.Image':
+        """解码后的 PIL.Image（首次访问时解码）"""
+        if self._image is None:
+            with span('screenshot.decode'):
+                image = Image.open(BytesIO(self.data))
+                image.load()
+            self._image = image
+            self._size = image.size
+        return self._image
+
+    @property
+    def size(self) -> tuple:
+        """图片尺寸 (宽, 高)，只解析文件头"""
+        if self._size is None:
+            with Image.open(BytesIO(self.data)) as image:
+                self._size = image.size
+        return self._size
+
+    @property
+    def width(self) -> int:
+        return self.size[0]
+
+    @property
+    def height(self) -> int:
+        return self.size[1]
+
+    @property
+    def base64_data(self) -> str:
+        """原始字节的 base64 编码"""
+        if self._base64 is None:
+            with span('screenshot.base64'):
+                self._base64 = base64.b64encode(self.data).decode()
+        return self._base64
+
+    @property
+    def data_uri(self) -> str:
+        """data URI 形式，可直接用于 <img> 或模型请求"""
+        return f"data:{self.mime_type};base64,{self.base64_data}"
+
 
 class PhoneControllerRemote:
     """远程手机控制器 - Mac 服务器版本"""
 
-    def __init__(self, helper_url: Optional[str] = None):
+    def __init__(self, helper_url: Optional[str] = None,
+                 pool_size: Optional[int] = None,
+                 timeouts: Optional[Dict[str, float]] = None,
+                 max_retries: Optional[int] = None,
+                 backoff_factor: Optional[float] = None,
+                 use_channel: Optional[bool] = None,
+                 check_connection: bool = True):
         """
         初始化远程手机控制器
 
         Args:
             helper_url: AutoGLM Helper 的 URL，如果不指定则从环境变量读取
+            pool_size: 连接池大小（默认读取 PHONE_HTTP_POOL_SIZE，否则为 4）
+            timeouts: 各接口读取超时覆盖，如 {'screenshot': 20}
+            max_retries: 幂等请求（GET）的最大重试次数（默认读取 PHONE_HTTP_RETRIES，否则为 2）
+            backoff_factor: 重试退避系数（默认读取 PHONE_HTTP_BACKOFF，否则为 0.3）
+            use_channel: 是否使用 WebSocket 控制通道（默认 PHONE_CHANNEL=websocket 时启用）
+            check_connection: 是否在初始化时测试连接（失败抛出异常）。
+                为 False 时不发起任何网络请求，由调用方（如健康检查）稍后验证
         """
         # 从环境变量或参数获取 URL
         self.helper_url = helper_url or os.getenv('PHONE_HELPER_URL', 'http://localhost:8080')
 
+        self.pool_size = pool_size or int(os.getenv('PHONE_HTTP_POOL_SIZE', '4'))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv('PHONE_HTTP_RETRIES', '2'))
+        self.backoff_factor = (backoff_factor if backoff_factor is not None
+                               else float(os.getenv('PHONE_HTTP_BACKOFF', '0.3')))
+        self.connect_timeout = float(os.getenv('PHONE_CONNECT_TIMEOUT', '3'))
+        self.timeouts = dict(DEFAULT_TIMEOUTS)
+        if timeouts:
+            self.timeouts.update(timeouts)
+
+        # 每台手机一个长连接 Session，复用 TCP 连接；第一次请求时创建（启动时不导入 requests）
+        self._session: Optional['requests.Session'] = None
+        self._adapter = None
+        self._session_lock = threading.Lock()
+
+        # Helper 是否支持二进制截图接口 / 批量动作接口（None 表示尚未探测）
+        self.binary_screenshot: Optional[bool] = None
+        self.batch_supported: Optional[bool] = None
+
+        # WebSocket 控制通道（可选）：连接建立前和断线期间自动使用 HTTP
+        if use_channel is None:
+            use_channel = os.getenv('PHONE_CHANNEL', 'http').lower() == 'websocket'
+        self.channel: Optional[PhoneChannel] = None
+        if use_channel:
+            if WEBSOCKET_AVAILABLE:
+                self.channel = PhoneChannel(
+                    self.helper_url,
+                    heartbeat_interval=float(os.getenv('PHONE_CHANNEL_HEARTBEAT', '2')),
+                    connect_timeout=self.connect_timeout,
+                )
+                self.channel.start()
+            else:
+                logger.warning("未安装 websocket-client，WebSocket 通道不可用，使用 HTTP")
+
         logger.info(f"初始化远程手机控制器: {self.helper_url}")
 
         # 测试连接
-        if not self._test_connection():
+        if check_connection and not self._test_connection():
             raise Exception(
                 f"无法连接到手机控制服务: {self.helper_url}\n"
                 "请确保:\n"
@@ -47,13 +192,125 @@ class PhoneControllerRemote:
                 "3. config.env 中的 PHONE_HELPER_URL 配置正确\n"
             )
 
+    @property
+    def session(self) -> 'requests.Session':
+        """长连接 Session（第一次使用时创建）"""
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    self._session = self._create_session()
+        return self._session
+
+    def _create_session(self) -> 'requests.Session':
+        """创建带连接池和重试策略的 Session"""
+        # 只对幂等的 GET 请求做读取/状态码重试；建立连接失败时请求尚未发出，可安全重试
+        retry = requests.adapters.Retry(
+            total=self.max_retries,
+            connect=self.max_retries,
+            read=self.max_retries,
+            status=self.max_retries,
+            backoff_factor=self.backoff_factor,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset(['GET']),
+            raise_on_status=False,
+        )
+        self._adapter = requests.adapters.HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=self.pool_size,
+            max_retries=retry,
+        )
+
+        session = requests.Session()
+        session.mount('http://', self._adapter)
+        session.mount('https://', self._adapter)
+        session.headers.update({'Connection': 'keep-alive'})
+        return session
+
+    def _request(self, method: str, endpoint: str, **kwargs) -> 'requests.Response':
+        """通过连接池发送请求，按接口使用对应的超时"""
+        timeout = (self.connect_timeout, self.timeouts.get(endpoint, 10))
+        return self.session.request(
+            method,
+            f"{self.helper_url}/{endpoint}",
+            timeout=timeout,
+            **kwargs
+        )
+
+    def get_connection_stats(self) -> dict:
+        """
+        获取连接复用统计
+
+        Returns:
+            包含请求数、新建连接数、复用连接数和复用率的字典
+        """
+        pools = self._adapter.poolmanager.pools if self._adapter is not None else {}
+        total = created = 0
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                total += pool.num_requests
+                created += pool.num_connections
+        reused = max(total - created, 0)
+        return {
+            'requests': total,
+            'new_connections': created,
+            'reused_connections': reused,
+            'reuse_ratio': round(reused / total, 3) if total else 0.0,
+            'pool_size': self.pool_size,
+            'channel': self.channel.get_stats() if self.channel else None,
+        }
+
+    def close(self):
+        """关闭连接池和 WebSocket 通道"""
+        if self.channel:
+            self.channel.close()
+        if self._session is not None:
+            self._session.close()
+
+    def _channel_action(self, op: str, **params) -> Optional[dict]:
+        """
+        通过 WebSocket 通道执行动作
+
+        Returns:
+            响应 JSON；通道不可用、请求尚未发出时返回 None（调用方改用 HTTP）。
+            请求已发出但失败（如超时）时返回失败结果，不再通过 HTTP 重试，避免动作重复执行
+        """
+        if not self.channel or not self.channel.connected:
+            return None
+        try:
+            return self.channel.request(op, timeout=self.timeouts.get(op, 10), **params)
+        except ChannelError as e:
+            if not e.sent:
+                return None
+            logger.error(f"{op} 失败（WebSocket）: {e}")
+            return {'success': False, 'error': str(e)}
+
+    def get_status(self) -> dict:
+        """
+        获取 Helper 状态（WebSocket 通道已连接时通过通道获取）
+
+        Returns:
+            状态 JSON，如 {'status': 'ok', 'accessibility_enabled': True}
+
+        Raises:
+            requests.RequestException / ChannelError: 无法访问 Helper
+            IOError: Helper 返回非 200 状态码
+        """
+        if self.channel and self.channel.connected:
+            try:
+                return self.channel.request('status', timeout=self.timeouts['status'])
+            except ChannelError as e:
+                logger.debug(f"WebSocket 获取状态失败，改用 HTTP: {e}")
+
+        response = self._request('GET', 'status')
+        if response.status_code != 200:
+            raise IOError(f"HTTP {response.status_code}")
+        return response.json()
+
     def _test_connection(self) -> bool:
         """测试与手机的连接"""
         try:
-            response = requests.get(
-                f"{self.helper_url}/status",
-                timeout=5
-            )
+            response = self._request('GET', 'status')
 
             if response.status_code == 200:
                 data = response.json()
@@ -74,27 +331,118 @@ class PhoneControllerRemote:
             logger.error(f"连接失败: {e}")
             return False
 
-    def screenshot(self) -> Optional[Image.Image]:
+    def screenshot(self) -> Optional['Image.Image']:
         """
         截取手机屏幕
 
         Returns:
             PIL.Image 对象，失败返回 None
         """
+        shot = self.screenshot_raw()
+        return shot.image if shot else None
+
+    def screenshot_raw(self, quality: Optional[int] = None,
+                       scale: Optional[float] = None) -> Optional[RemoteScreenshot]:
+        """
+        截取手机屏幕，保留原始压缩字节
+
+        优先使用二进制接口 /screenshot.jpg；旧版 Helper 返回 404 时
+        记住结果，之后直接使用 JSON（base64）接口
+
+        Args:
+            quality: JPEG 质量（仅二进制接口支持）
+            scale: 截图缩放比例 0~1（仅二进制接口支持）
+
+        Returns:
+            RemoteScreenshot 对象，失败返回 None
+        """
+        with span('screenshot.capture'):
+            return self._screenshot_raw(quality, scale)
+
+    def _screenshot_raw(self, quality: Optional[int] = None,
+                        scale: Optional[float] = None) -> Optional[RemoteScreenshot]:
+        if self.channel and self.channel.connected:
+            try:
+                data, screen_width, _ = self.channel.screenshot(quality, scale, timeout=self.timeouts['screenshot'])
+                shot = RemoteScreenshot(data)
+                if screen_width > 0:
+                    shot.scale = screen_width / shot.width
+                return shot
+            except ChannelError as e:
+                # 截图是幂等的，通道失败时直接改用 HTTP
+                logger.warning(f"WebSocket 截图失败，改用 HTTP: {e}")
+
+        if self.binary_screenshot is not False:
+            try:
+                shot = self._screenshot_binary(quality, scale)
+                if shot is not None or self.binary_screenshot:
+                    return shot
+            except Exception as e:
+                logger.error(f"截图失败: {e}")
+                if self.binary_screenshot:
+                    return None
+
+        return self._screenshot_json()
+
+    def _screenshot_binary(self, quality: Optional[int], scale: Optional[float]) -> Optional[RemoteScreenshot]:
+        """
+        通过 /screenshot.jpg 获取原始 JPEG 字节
+
+        按 Content-Length 预分配缓冲区，边接收边写入，
+        不需要 JSON 解析和 base64 解码（峰值内存约为图片大小的 1 倍，而非 3 倍）
+        """
+        params = {}
+        if quality:
+            params['quality'] = int(quality)
+        if scale:
+            params['scale'] = scale
+
+        with self._request('GET', 'screenshot.jpg', params=params, stream=True) as response:
+            if response.status_code == 404:
+                logger.info("Helper 不支持二进制截图接口，使用 JSON 接口")
+                self.binary_screenshot = False
+                return None
+            if response.status_code != 200:
+                logger.error(f"截图失败: HTTP {response.status_code}")
+                return None
+
+            self.binary_screenshot = True
+            data = self._read_body(response)
+
+        shot = RemoteScreenshot(data, response.headers.get('Content-Type', '').split(';')[0] or None)
+        shot.scale = scale_from_headers(response.headers, shot.width)
+        logger.debug(f"截图成功: {len(data)} 字节 ({shot.mime_type})")
+        return shot
+
+    @staticmethod
+    def _read_body(response: 'requests.Response'):
+        """读取流式响应体；有 Content-Length 时直接写入预分配的缓冲区"""
+        length = int(response.headers.get('Content-Length') or 0)
+        if length <= 0:
+            return b''.join(response.iter_content(64 * 1024))
+
+        buffer = bytearray(length)
+        view = memoryview(buffer)
+        received = 0
+        while received < length:
+            count = response.raw.readinto(view[received:])
+            if not count:
+                raise IOError(f"截图数据不完整: {received}/{length} 字节")
+            received += count
+        return buffer
+
+    def _screenshot_json(self) -> Optional[RemoteScreenshot]:
+        """通过 /screenshot 获取 base64 编码的截图（旧版 Helper）"""
         try:
-            response = requests.get(
-                f"{self.helper_url}/screenshot",
-                timeout=15
-            )
+            response = self._request('GET', 'screenshot')
 
             if response.status_code == 200:
                 data = response.json()
                 if data.get('success'):
-                    # 解码 Base64 图片
-                    image_data = base64.b64decode(data['image'])
-                    image = Image.open(BytesIO(image_data))
-                    logger.debug(f"截图成功: {image.size}")
-                    return image
+                    # 只做 base64 解码，不解码像素
+                    shot = RemoteScreenshot(base64.b64decode(data['image']))
+                    logger.debug(f"截图成功: {len(shot.data)} 字节 ({shot.mime_type})")
+                    return shot
 
             logger.error(f"截图失败: HTTP {response.status_code}")
             return None
@@ -114,12 +462,16 @@ class PhoneControllerRemote:
         Returns:
             是否成功
         """
+        with span('action.dispatch'):
+            return self._tap(x, y)
+
+    def _tap(self, x: int, y: int) -> bool:
+        result = self._channel_action('tap', x=x, y=y)
+        if result is not None:
+            return bool(result.get('success'))
+
         try:
-            response = requests.post(
-                f"{self.helper_url}/tap",
-                json={'x': x, 'y': y},
-                timeout=5
-            )
+            response = self._request('POST', 'tap', json={'x': x, 'y': y})
 
             if response.status_code == 200:
                 data = response.json()
@@ -147,11 +499,18 @@ class PhoneControllerRemote:
         Returns:
             是否成功
         """
+        with span('action.dispatch'):
+            return self._swipe(x1, y1, x2, y2, duration)
+
+    def _swipe(self, x1: int, y1: int, x2: int, y2: int, duration: int = 300) -> bool:
+        result = self._channel_action('swipe', x1=x1, y1=y1, x2=x2, y2=y2, duration=duration)
+        if result is not None:
+            return bool(result.get('success'))
+
         try:
-            response = requests.post(
-                f"{self.helper_url}/swipe",
-                json={'x1': x1, 'y1': y1, 'x2': x2, 'y2': y2, 'duration': duration},
-                timeout=10
+            response = self._request(
+                'POST', 'swipe',
+                json={'x1': x1, 'y1': y1, 'x2': x2, 'y2': y2, 'duration': duration}
             )
 
             if response.status_code == 200:
@@ -176,12 +535,16 @@ class PhoneControllerRemote:
         Returns:
             是否成功
         """
+        with span('action.dispatch'):
+            return self._input_text(text)
+
+    def _input_text(self, text: str) -> bool:
+        result = self._channel_action('input', text=text)
+        if result is not None:
+            return bool(result.get('success'))
+
         try:
-            response = requests.post(
-                f"{self.helper_url}/input",
-                json={'text': text},
-                timeout=5
-            )
+            response = self._request('POST', 'input', json={'text': text})
 
             if response.status_code == 200:
                 data = response.json()
@@ -195,6 +558,76 @@ class PhoneControllerRemote:
             logger.error(f"输入失败: {e}")
             return False
 
+    def batch(self, ops: List[dict], stop_on_error: bool = True) -> List[bool]:
+        """
+        批量执行动作，一次往返完成多个操作
+
+        Args:
+            ops: 按顺序执行的操作，如
+                 {'type': 'tap', 'x': 1, 'y': 2}
+                 {'type': 'swipe', 'x1': 1, 'y1': 2, 'x2': 3, 'y2': 4, 'duration': 300}
+                 {'type': 'input', 'text': 'hello'}
+                 {'type': 'wait', 'ms': 100}
+            stop_on_error: 某个操作失败后是否停止执行后续操作
+
+        Returns:
+            每个操作是否成功（未执行的操作为 False）
+        """
+        with span('action.dispatch'):
+            return self._batch(ops, stop_on_error)
+
+    def _batch(self, ops: List[dict], stop_on_error: bool = True) -> List[bool]:
+        result = self._channel_action('batch', ops=ops, stop_on_error=stop_on_error)
+        if result is not None:
+            results = [bool(r.get('success')) for r in result.get('results', [])]
+            return results + [False] * (len(ops) - len(results))
+
+        if self.batch_supported is not False:
+            try:
+                response = self._request('POST', 'batch', json={'ops': ops, 'stop_on_error': stop_on_error})
+
+                if response.status_code == 200:
+                    self.batch_supported = True
+                    results = [bool(r.get('success')) for r in response.json().get('results', [])]
+                    return results + [False] * (len(ops) - len(results))
+
+                if response.status_code != 404:
+                    logger.error(f"批量动作失败: HTTP {response.status_code}")
+                    return [False] * len(ops)
+
+                # 旧版 Helper 不支持批量接口，之后逐个发送
+                logger.info("Helper 不支持批量动作接口，逐个执行")
+                self.batch_supported = False
+
+            except Exception as e:
+                logger.error(f"批量动作失败: {e}")
+                return [False] * len(ops)
+
+        return self._batch_sequential(ops, stop_on_error)
+
+    def _batch_sequential(self, ops: List[dict], stop_on_error: bool) -> List[bool]:
+        """逐个执行批量操作（旧版 Helper）"""
+        results = []
+        for op in ops:
+            op_type = op.get('type')
+            if op_type == 'tap':
+                success = self._tap(op['x'], op['y'])
+            elif op_type == 'swipe':
+                success = self._swipe(op['x1'], op['y1'], op['x2'], op['y2'], op.get('duration', 300))
+            elif op_type == 'input':
+                success = self._input_text(op['text'])
+            elif op_type == 'wait':
+                time.sleep(op.get('ms', 0) / 1000)
+                success = True
+            else:
+                logger.error(f"未知的批量操作类型: {op_type}")
+                success = False
+
+            results.append(success)
+            if not success and stop_on_error:
+                break
+        return results + [False] * (len(ops) - len(results))
+
 
 # 测试代码
 if __name__ == '__main__':
@@ -226,6 +659,7 @@ if __name__ == '__main__':
             print("❌ 点击失败")
 
         print("")
+        print(f"连接复用统计: {controller.get_connection_stats()}")
         print("测试完成！")
 
     except Exception as e:
@@ -0,0 +1,284 @@
+"""
+生产服务模式（WEB_SERVER_MODE=aiohttp）
+用 aiohttp 事件循环接收连接，替代 Flask 开发服务器的"每个连接一个线程"：
+
+- 实时日志流（SSE）直接在事件循环中推送，订阅事件总线的回调，等待期间不占用线程
+- 其他请求交给 Flask 应用，在有上限的线程池中执行（响应整体返回）
+- 同时处理的请求数（含 SSE 连接）超过上限时直接返回 503
+
+启动方式:
+    WEB_SERVER_MODE=aiohttp python app.py
+    gunicorn -c gunicorn.conf.py        # 见 gunicorn.conf.py
+"""
+
+import asyncio
+import io
+import json
+import logging
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from urllib.parse import unquote_to_bytes
+
+try:
+    from aiohttp import web
+    AIOHTTP_AVAILABLE = True
+except ImportError:
+    web = None
+    AIOHTTP_AVAILABLE = False
+
+from config import WEB_WORKER_THREADS, WEB_MAX_CONNECTIONS
+
+logger = logging.getLogger(__name__)
+
+# 请求体上限（字节）
+MAX_REQUEST_BODY = 16 * 1024 * 1024
+
+# 逐跳头部，不能原样转发
+HOP_BY_HOP_HEADERS = {'connection', 'keep-alive', 'transfer-encoding', 'upgrade'}
+
+
+class WSGIBridge:
+    """
+    在线程池中执行 WSGI 应用
+
+    Args:
+        wsgi_app: WSGI 应用（Flask app）
+        executor: 执行请求的线程池
+    """
+
+    def __init__(self, wsgi_app, executor: ThreadPoolExecutor):
+        self.wsgi_app = wsgi_app
+        self.executor = executor
+
+    @staticmethod
+    def build_environ(request: 'web.Request', body: bytes) -> dict:
+        host, _, port = (request.host or '').partition(':')
+        environ = {
+            'REQUEST_METHOD': request.method,
+            'SCRIPT_NAME': '',
+            # PEP 3333: PATH_INFO 为 latin-1 解码的原始字节
+            'PATH_INFO': unquote_to_bytes(request.rel_url.raw_path).decode('latin-1'),
+            'QUERY_STRING': request.rel_url.raw_query_string,
+            'SERVER_NAME': host or 'localhost',
+            'SERVER_PORT': port or ('443' if request.secure else '80'),
+            'SERVER_PROTOCOL': f"HTTP/{request.version.major}.{request.version.minor}",
+            'REMOTE_ADDR': request.remote or '',
+            'CONTENT_LENGTH': str(len(body)),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': request.scheme,
+            'wsgi.input': io.BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        if 'Content-Type' in request.headers:
+            environ['CONTENT_TYPE'] = request.headers['Content-Type']
+        for name in request.headers:
+            key = name.upper().replace('-', '_')
+            if key in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+                continue
+            environ['HTTP_' + key] = ','.join(request.headers.getall(name))
+        return environ
+
+    def _call(self, environ: dict):
+        """在线程池中执行，返回 (状态行, 头部, 响应体)"""
+        response = {}
+        chunks = []
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info and response:
+                raise exc_info[1].with_traceback(exc_info[2])
+            response['status'] = status
+            response['headers'] = headers
+            return chunks.append
+
+        result = self.wsgi_app(environ, start_response)
+        try:
+            chunks.extend(result)
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+        return response['status'], response['headers'], b''.join(chunks)
+
+    async def handle(self, request: 'web.Request') -> 'web.Response':
+        body = await request.read()
+        environ = self.build_environ(request, body)
+        loop = asyncio.get_running_loop()
+        status, headers, payload = await loop.run_in_executor(self.executor, self._call, environ)
+
+        code, _, reason = status.partition(' ')
+        response = web.Response(status=int(code), reason=reason or None, body=payload)
+        for name, value in headers:
+            lower = name.lower()
+            if lower in HOP_BY_HOP_HEADERS or lower == 'content-length':
+                continue
+            response.headers.add(name, value)
+        return response
+
+
+class TaskLogStream:
+    """
+    异步 SSE 日志流（与 app.get_task_logs_stream 的事件和续传语义一致）
+
+    Args:
+        executor: 读取任务快照的线程池（任务管理器初始化期间也在线程池中等待）
+        keepalive: 心跳间隔（秒）
+    """
+
+    def __init__(self, executor: ThreadPoolExecutor, keepalive: float):
+        self.executor = executor
+        self.keepalive = keepalive
+
+    async def handle(self, request: 'web.Request') -> 'web.StreamResponse':
+        from app import format_sse_event
+        from tasks import TaskStatus, get_task_manager
+
+        task_id = request.match_info['task_id']
+        try:
+            last_event_id = int(request.headers['Last-Event-ID'])
+        except (KeyError, ValueError):
+            last_event_id = None
+
+        response = web.StreamResponse(headers={
+            'Content-Type': 'text/event-stream; charset=utf-8',
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no',  # 禁用 Nginx 缓冲
+        })
+        if 'Origin' in request.headers:
+            response.headers['Access-Control-Allow-Origin'] = '*'
+        await response.prepare(request)
+
+        async def send(data: dict, event_id: Optional[int] = None):
+            await response.write(format_sse_event(data, event_id).encode('utf-8'))
+
+        loop = asyncio.get_running_loop()
+        task_manager = await loop.run_in_executor(self.executor, get_task_manager)
+        event_bus = task_manager.event_bus
+        task = await loop.run_in_executor(self.executor, task_manager.get_task, task_id)
+        if not task:
+            await send({'error': '任务不存在'})
+            return response
+
+        if last_event_id is not None and event_bus.can_resume(task_id, last_event_id):
+            # 断线续传：只补发缺失的事件
+            cursor = last_event_id
+            sent_logs = 0
+        else:
+            # 先取游标再取快照，快照之后的日志按下标去重
+            cursor = event_bus.last_event_id(task_id)
+            snapshot = await loop.run_in_executor(self.executor, task.to_dict)
+            sent_logs = len(snapshot['logs'])
+            await send({'type': 'init', 'task': snapshot}, cursor)
+
+            if snapshot['status'] in (TaskStatus.COMPLETED, TaskStatus.FAILED):
+                await send({'type': 'end', 'status': snapshot['status']}, cursor)
+                return response
+
+        wakeup = asyncio.Event()
+
+        def listener():
+            loop.call_soon_threadsafe(wakeup.set)
+
+        event_bus.add_listener(task_id, listener)
+        try:
+            while True:
+                # 先清除再读取，读取之后发布的事件会重新唤醒
+                wakeup.clear()
+                events, closed = event_bus.wait(task_id, cursor, timeout=0)
+
+                for event_id, event in events:
+                    cursor = event_id
+                    if event['type'] == 'log' and event['index'] < sent_logs:
+                        continue
+                    await send(event, event_id)
+                    if event['type'] == 'end':
+                        return response
+
+                if closed:
+                    return response
+
+                if not events:
+                    try:
+                        await asyncio.wait_for(wakeup.wait(), self.keepalive)
+                    except asyncio.TimeoutError:
+                        # 心跳，防止代理断开空闲连接
+                        await response.write(b": keep-alive\n\n")
+        except ConnectionResetError:
+            # 客户端已断开（未开启 handler_cancellation 时在下一次写入时发现）
+            logger.debug(f"日志流客户端断开: {task_id}")
+            return response
+        finally:
+            event_bus.remove_listener(task_id, listener)
+
+
+def create_server_app(flask_app, worker_threads: int = WEB_WORKER_THREADS,
+                      max_connections: int = WEB_MAX_CONNECTIONS) -> 'web.Application':
+    """
+    创建 aiohttp 应用：SSE 日志流异步处理，其余请求转发给 Flask
+
+    Args:
+        flask_app: Flask 应用（app.create_app）
+        worker_threads: 执行 Flask 请求的线程数
+        max_connections: 同时处理的请求上限（含 SSE 连接）
+    """
+    if not AIOHTTP_AVAILABLE:
+        raise ImportError("生产服务模式需要 aiohttp，请执行: pip install aiohttp")
+
+    from app import SSE_KEEPALIVE_SECONDS
+
+    executor = ThreadPoolExecutor(max_workers=max(1, worker_threads), thread_name_prefix='web')
+    bridge = WSGIBridge(flask_app, executor)
+    log_stream = TaskLogStream(executor, SSE_KEEPALIVE_SECONDS)
+    active = {'requests': 0}
+
+    @web.middleware
+    async def limit_connections(request, handler):
+        if active['requests'] >= max_connections:
+            logger.warning(f"连接数达到上限 {max_connections}，拒绝请求: {request.method} {request.path}")
+            return web.Response(
+                status=503,
+                text=json.dumps({'error': '服务繁忙，请稍后重试'}, ensure_ascii=False),
+                content_type='application/json',
+                headers={'Retry-After': '1'},
+            )
+        active['requests'] += 1
+        try:
+            return await handler(request)
+        finally:
+            active['requests'] -= 1
+
+    async def shutdown_executor(_):
+        executor.shutdown(wait=False)
+
+    server_app = web.Application(middlewares=[limit_connections], client_max_size=MAX_REQUEST_BODY)
+    server_app['active'] = active
+    server_app.router.add_get('/api/tasks/{task_id}/logs', log_stream.handle)
+    server_app.router.add_route('*', '/{path:.*}', bridge.handle)
+    server_app.on_cleanup.append(shutdown_executor)
+    return server_app
+
+
+def run_server(flask_app, host: str, port: int):
+    """以生产模式运行（阻塞直到收到中断信号）"""
+    server_app = create_server_app(flask_app)
+    logger.info(f"生产服务模式: aiohttp，线程池 {WEB_WORKER_THREADS}，连接上限 {WEB_MAX_CONNECTIONS}")
+    # Flask 的 before_request 已记录请求日志，不再输出 aiohttp 访问日志；
+    # 客户端断开时取消处理函数，SSE 连接立即释放而不是等到下一次心跳
+    web.run_app(server_app, host=host, port=port, access_log=None, print=None, handler_cancellation=True)
+
+
+async def gunicorn_app() -> 'web.Application':
+    """gunicorn 入口（aiohttp.GunicornWebWorker）：后台初始化任务管理器并返回 aiohttp 应用"""
+    from app import create_app
+    from tasks import TaskManager
+
+    async def stop_worker(_):
+        task_manager = TaskManager()
+        if task_manager.ready.is_set():
+            task_manager.stop_worker()
+
+    server_app = create_server_app(create_app())
+    server_app.on_cleanup.append(stop_worker)
+    return server_app
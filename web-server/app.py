@@ -3,18 +3,21 @@ AutoGLM Web 界面 - Flask 主应用
 提供任务提交、实时日志、截图展示功能
 """
 
+import json
 import logging
 import sys
-from flask import Flask, render_template, request, jsonify, Response
+import threading
+from flask import Blueprint, Flask, render_template, request, jsonify, Response, send_file
 from flask_cors import CORS
 
 # 导入本地模块
 from config import (
-    WEB_HOST, WEB_PORT, AUTH_TOKEN, LOG_FILE,
+    WEB_HOST, WEB_PORT, WEB_SERVER_MODE, AUTH_TOKEN, LOG_FILE,
     get_config_summary, validate_config
 )
 from auth import require_auth, simple_rate_limit, log_request
-from tasks import task_manager, TaskStatus
+from tasks import get_task_manager, TaskManager, TaskStatus, TaskPriority
+from metrics import REGISTRY, PROMETHEUS_CONTENT_TYPE
 
 # 配置日志
 logging.basicConfig(
@@ -27,40 +30,77 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# 创建 Flask 应用
-app = Flask(__name__)
-CORS(app)  # 允许跨域（方便开发）
+# SSE 心跳间隔（秒）
+SSE_KEEPALIVE_SECONDS = 15
+
+
+def format_sse_event(data: dict, event_id: int = None) -> str:
+    """格式化一条 SSE 事件"""
+    payload = json.dumps(data, ensure_ascii=False)
+    if event_id is None:
+        return f"data: {payload}\n\n"
+    return f"id: {event_id}\ndata: {payload}\n\n"
+
+# 页面和 API 路由，由 create_app 注册到 Flask 应用
+bp = Blueprint('web', __name__)
+
+
+def create_app(init_task_manager: bool = True) -> Flask:
+    """
+    应用工厂：创建 Flask 应用并注册路由
+
+    创建应用不会初始化任务管理器。init_task_manager 为 True 时在后台线程中初始化
+    （加载任务历史、白名单、PhoneAgent）并启动 worker，服务可以立即监听端口；
+    初始化完成前 /api/ready 返回 503，其他用到任务管理器的接口等待初始化完成
+    """
+    app = Flask(__name__)
+    CORS(app)  # 允许跨域（方便开发）
+    app.register_blueprint(bp)
+
+    if init_task_manager:
+        threading.Thread(target=start_task_manager, name="task-manager-init", daemon=True).start()
+
+    return app
+
+
+def start_task_manager():
+    """初始化任务管理器并启动 worker"""
+    try:
+        get_task_manager().start_worker()
+    except Exception as e:
+        logger.error(f"任务管理器启动失败: {e}")
+
 
 # 在每个请求前记录日志
-@app.before_request
+@bp.before_app_request
 def before_request():
     log_request()
 
 
 # ==================== 页面路由 ====================
 
-@app.route('/')
+@bp.route('/')
 def index():
     """主页 - 任务提交界面"""
     return render_template('index.html', auth_token=AUTH_TOKEN)
 
 
-@app.route('/task/<task_id>')
+@bp.route('/task/<task_id>')
 def task_detail(task_id):
     """任务详情页 - 实时日志和截图"""
-    task = task_manager.get_task(task_id)
+    task = get_task_manager().get_task(task_id)
     if not task:
         return "任务不存在", 404
     return render_template('task.html', task=task, auth_token=AUTH_TOKEN)
 
 
-@app.route('/history')
+@bp.route('/history')
 def history():
     """历史记录页"""
     return render_template('history.html', auth_token=AUTH_TOKEN)
 
 
-@app.route('/phones')
+@bp.route('/phones')
 def phones():
     """手机管理页"""
     return render_template('phones.html', auth_token=AUTH_TOKEN)
@@ -68,33 +108,88 @@ def phones():
 
 # ==================== API 路由 ====================
 
-@app.route('/api/config', methods=['GET'])
+@bp.route('/api/config', methods=['GET'])
 def get_config():
     """获取配置信息（隐藏敏感信息）"""
     return jsonify(get_config_summary())
 
 
-@app.route('/api/health', methods=['GET'])
+@bp.route('/api/health', methods=['GET'])
 def health_check():
-    """健康检查"""
+    """健康检查（无需认证，只返回服务状态；任务管理器初始化期间不等待，直接返回 starting）"""
+    if not TaskManager().ready.is_set():
+        return jsonify({'status': 'starting', 'message': 'AutoGLM Web 服务正在初始化'})
+    return jsonify({'status': 'ok', 'message': 'AutoGLM Web 服务运行正常'})
+
+
+@bp.route('/api/health/details', methods=['GET'])
+@require_auth
+def health_details():
+    """健康检查详情：初始化进度、执行中的任务、手机连接统计和后台探测结果"""
+    task_manager = TaskManager()
+    if not task_manager.ready.is_set():
+        return jsonify({
+            'status': 'starting',
+            'init': task_manager.get_init_status()
+        })
+
+    controller = task_manager.phone_controller
+    current_task = task_manager.get_current_task()
     return jsonify({
         'status': 'ok',
-        'message': 'AutoGLM Web 服务运行正常',
-        'current_task': task_manager.get_current_task().id if task_manager.get_current_task() else None
+        'current_task': current_task.id if current_task else None,
+        'running_tasks': [task.id for task in task_manager.get_running_tasks()],
+        'phone_connection': controller.get_connection_stats() if controller else None,
+        'phone_health': task_manager.get_phone_health(),
+        'phones': task_manager.health.get_metrics()['summary']
+    })
+
+
+@bp.route('/api/ready', methods=['GET'])
+def readiness_check():
+    """就绪检查：任务管理器初始化完成返回 200，否则返回 503（附各组件初始化耗时）"""
+    status = TaskManager().get_init_status()
+    return jsonify(status), 200 if status['ready'] else 503
+
+
+@bp.route('/api/stats', methods=['GET'])
+@require_auth
+def get_stats():
+    """运行指标（JSON）"""
+    task_manager = get_task_manager()
+    return jsonify({
+        'queue': task_manager.get_queue_stats(),
+        'settle_ms': task_manager.get_settle_stats(),
+        'task_cache': task_manager.get_cache_stats(),
     })
 
 
-@app.route('/api/tasks', methods=['POST'])
+@bp.route('/metrics', methods=['GET'])
+@require_auth
+def prometheus_metrics():
+    """Prometheus 指标（文本格式）：各阶段耗时、单步耗时、排队等待、界面稳定直方图和手机状态"""
+    return Response(REGISTRY.render(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+
+@bp.route('/api/tasks', methods=['POST'])
 @require_auth
 @simple_rate_limit(max_requests=10, window_seconds=60)
 def submit_task():
     """
     提交新任务
-    请求体: {"description": "任务描述"}
+    请求体: {
+        "description": "任务描述",
+        "phone_id": "手机 ID（可选，默认当前激活手机；any 表示自动选择负载和延迟最低的可用手机）",
+        "priority": "high / normal / low（可选，默认 normal）",
+        "tags": ["标签"]（可选，只在包含这些标签的手机中自动选择）
+    }
     """
     try:
         data = request.get_json()
         description = data.get('description', '').strip()
+        phone_id = data.get('phone_id') or None
+        priority = data.get('priority') or TaskPriority.NORMAL
+        tags = data.get('tags') or None
 
         if not description:
             return jsonify({'error': '任务描述不能为空'}), 400
@@ -103,89 +198,106 @@ def submit_task():
             return jsonify({'error': '任务描述过长（最大 500 字符）'}), 400
 
         # 提交任务
-        task = task_manager.submit_task(description)
+        task = get_task_manager().submit_task(description, phone_id=phone_id, priority=priority, tags=tags)
 
         return jsonify({
             'success': True,
             'task_id': task.id,
+            'phone_id': task.phone_id,
             'message': '任务已提交',
             'task_url': f'/task/{task.id}'
         }), 201
 
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logger.error(f"提交任务失败: {e}", exc_info=True)
         return jsonify({'error': f'提交失败: {str(e)}'}), 500
 
 
-@app.route('/api/tasks/<task_id>', methods=['GET'])
+@bp.route('/api/tasks/<task_id>', methods=['GET'])
 @require_auth
 def get_task(task_id):
     """获取任务详情"""
-    task = task_manager.get_task(task_id)
+    task = get_task_manager().get_task(task_id)
     if not task:
         return jsonify({'error': '任务不存在'}), 404
 
     return jsonify(task.to_dict())
 
 
-@app.route('/api/tasks', methods=['GET'])
+@bp.route('/api/tasks', methods=['GET'])
 @require_auth
 def get_tasks():
-    """获取任务列表"""
-    limit = request.args.get('limit', 20, type=int)
-    tasks = task_manager.get_recent_tasks(limit)
-    return jsonify([task.to_dict() for task in tasks])
+    """
+    获取任务列表（按创建时间倒序）
+    查询参数: limit, status, phone_id, before（游标，取上一页响应头 X-Next-Cursor）
+    """
+    limit = max(1, min(request.args.get('limit', 20, type=int), 200))
+    tasks = get_task_manager().get_recent_tasks(
+        limit,
+        status=request.args.get('status') or None,
+        phone_id=request.args.get('phone_id') or None,
+        before=request.args.get('before') or None
+    )
 
+    response = jsonify([task.to_dict() for task in tasks])
+    if len(tasks) == limit:
+        response.headers['X-Next-Cursor'] = tasks[-1].cursor
+    return response
 
-@app.route('/api/tasks/<task_id>/logs', methods=['GET'])
+
+@bp.route('/api/tasks/<task_id>/logs', methods=['GET'])
 def get_task_logs_stream(task_id):
     """
     实时日志流（Server-Sent Events）
-    客户端通过 EventSource 连接此端点接收实时日志
+    客户端通过 EventSource 连接此端点接收实时日志；
+    事件由任务变更直接推送，断线重连时根据 Last-Event-ID 续传
+    （WEB_SERVER_MODE=aiohttp 时此端点由 aio_server 以异步方式提供，不占用线程）
     """
+    last_event_id = request.headers.get('Last-Event-ID', type=int)
+    task_manager = get_task_manager()
+    event_bus = task_manager.event_bus
 
     def event_stream():
         """生成 SSE 事件流"""
         task = task_manager.get_task(task_id)
         if not task:
-            yield f"data: {jsonify({'error': '任务不存在'}).get_data(as_text=True)}\n\n"
+            yield format_sse_event({'error': '任务不存在'})
             return
 
-        # 发送初始状态
-        yield f"data: {jsonify({'type': 'init', 'task': task.to_dict()}).get_data(as_text=True)}\n\n"
-
-        # 记录已发送的日志数量
-        sent_logs = 0
+        if last_event_id is not None and event_bus.can_resume(task_id, last_event_id):
+            # 断线续传：只补发缺失的事件
+            cursor = last_event_id
+            sent_logs = 0
+        else:
+            # 先取游标再取快照，快照之后的日志按下标去重
+            cursor = event_bus.last_event_id(task_id)
+            snapshot = task.to_dict()
+            sent_logs = len(snapshot['logs'])
+            yield format_sse_event({'type': 'init', 'task': snapshot}, cursor)
+
+            if snapshot['status'] in (TaskStatus.COMPLETED, TaskStatus.FAILED):
+                yield format_sse_event({'type': 'end', 'status': snapshot['status']}, cursor)
+                return
 
-        # 持续推送更新
-        import time
         while True:
-            # 检查任务状态
-            current_task = task_manager.get_task(task_id)
-            if not current_task:
-                break
+            events, closed = event_bus.wait(task_id, cursor, timeout=SSE_KEEPALIVE_SECONDS)
 
-            # 发送新日志
-            if len(current_task.logs) > sent_logs:
-                new_logs = current_task.logs[sent_logs:]
-                for log in new_logs:
-                    yield f"data: {jsonify({'type': 'log', 'message': log}).get_data(as_text=True)}\n\n"
-                sent_logs = len(current_task.logs)
+            for event_id, event in events:
+                cursor = event_id
+                if event['type'] == 'log' and event['index'] < sent_logs:
+                    continue
+                yield format_sse_event(event, event_id)
+                if event['type'] == 'end':
+                    return
 
-            # 发送截图更新
-            if current_task.screenshot:
-                yield f"data: {jsonify({'type': 'screenshot', 'data': current_task.screenshot}).get_data(as_text=True)}\n\n"
+            if closed:
+                return
 
-            # 发送状态更新
-            yield f"data: {jsonify({'type': 'status', 'status': current_task.status}).get_data(as_text=True)}\n\n"
-
-            # 如果任务完成或失败，结束流
-            if current_task.status in [TaskStatus.COMPLETED, TaskStatus.FAILED]:
-                yield f"data: {jsonify({'type': 'end', 'status': current_task.status}).get_data(as_text=True)}\n\n"
-                break
-
-            # 每秒检查一次
-            time.sleep(1)
+            if not events:
+                # 心跳，防止代理断开空闲连接
+                yield ": keep-alive\n\n"
 
     return Response(
         event_stream(),
@@ -197,11 +309,35 @@ def get_task_logs_stream(task_id):
     )
 
 
-@app.route('/api/current-task', methods=['GET'])
+@bp.route('/api/screenshots/<digest>', methods=['GET'])
+def get_screenshot(digest):
+    """
+    获取截图文件
+    截图按内容哈希寻址、写入后不变，因此允许永久缓存；
+    与 SSE 一样不要求 Token（<img> 标签无法携带 Authorization 头）
+    """
+    store = get_task_manager().screenshot_store
+    path = store.get_path(digest)
+    if not path:
+        return jsonify({'error': '截图不存在'}), 404
+
+    response = send_file(
+        path,
+        mimetype=store.get_mime_type(path),
+        etag=digest,
+        max_age=31536000,
+        conditional=True
+    )
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+@bp.route('/api/current-task', methods=['GET'])
 @require_auth
 def get_current_task():
     """获取当前正在执行的任务"""
-    task = task_manager.get_current_task()
+    task = get_task_manager().get_current_task()
     if not task:
         return jsonify({'message': '当前无任务执行'}), 404
 
@@ -210,12 +346,23 @@ def get_current_task():
 
 # ==================== 手机管理 API ====================
 
-@app.route('/api/phones', methods=['GET'])
+@bp.route('/api/phones', methods=['GET'])
 @require_auth
 def get_phones():
     """获取手机列表"""
     try:
-        phones = task_manager.phone_manager.get_phones()
+        task_manager = get_task_manager()
+        phones = []
+        for phone in task_manager.phone_manager.get_phones():
+            worker = task_manager.workers.get(phone['id'])
+            phones.append({
+                **phone,
+                'worker': {
+                    'queue_size': worker.queue_size(),
+                    'current_task': worker.current_task.id if worker.current_task else None,
+                } if worker else None,
+                'health': task_manager.health.get(phone['id'])
+            })
         return jsonify({
             'success': True,
             'phones': phones
@@ -225,7 +372,14 @@ def get_phones():
         return jsonify({'error': str(e)}), 500
 
 
-@app.route('/api/phones', methods=['POST'])
+@bp.route('/api/phones/metrics', methods=['GET'])
+@require_auth
+def get_phone_metrics():
+    """手机健康指标：各手机的状态、探测延迟分位数（毫秒）和错误率"""
+    return jsonify(get_task_manager().health.get_metrics())
+
+
+@bp.route('/api/phones', methods=['POST'])
 @require_auth
 def add_phone():
     """添加新手机"""
@@ -234,6 +388,7 @@ def add_phone():
         name = data.get('name', '').strip()
         url = data.get('url', '').strip()
         description = data.get('description', '').strip()
+        tags = data.get('tags') or None
 
         if not name:
             return jsonify({'error': '手机名称不能为空'}), 400
@@ -242,7 +397,7 @@ def add_phone():
             return jsonify({'error': '手机 URL 不能为空'}), 400
 
         # 添加手机
-        phone = task_manager.phone_manager.add_phone(name, url, description)
+        phone = get_task_manager().phone_manager.add_phone(name, url, description, tags)
 
         return jsonify({
             'success': True,
@@ -257,15 +412,18 @@ def add_phone():
         return jsonify({'error': f'添加失败: {str(e)}'}), 500
 
 
-@app.route('/api/phones/<phone_id>', methods=['DELETE'])
+@bp.route('/api/phones/<phone_id>', methods=['DELETE'])
 @require_auth
 def delete_phone(phone_id):
     """删除手机"""
     try:
+        task_manager = get_task_manager()
         success = task_manager.phone_manager.remove_phone(phone_id)
         if not success:
             return jsonify({'error': '手机不存在'}), 404
 
+        task_manager.remove_worker(phone_id)
+
         return jsonify({
             'success': True,
             'message': '手机删除成功'
@@ -276,12 +434,38 @@ def delete_phone(phone_id):
         return jsonify({'error': f'删除失败: {str(e)}'}), 500
 
 
-@app.route('/api/phones/<phone_id>/activate', methods=['POST'])
+@bp.route('/api/phones/<phone_id>/tags', methods=['PUT'])
+@require_auth
+def set_phone_tags(phone_id):
+    """
+    设置手机标签
+    请求体: {"tags": ["标签1", "标签2"]}（也可以是逗号分隔的字符串）
+    """
+    try:
+        data = request.get_json() or {}
+        phone = get_task_manager().phone_manager.set_tags(phone_id, data.get('tags'))
+        if not phone:
+            return jsonify({'error': '手机不存在'}), 404
+
+        return jsonify({
+            'success': True,
+            'phone': phone
+        })
+
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"设置手机标签失败: {e}", exc_info=True)
+        return jsonify({'error': f'设置失败: {str(e)}'}), 500
+
+
+@bp.route('/api/phones/<phone_id>/activate', methods=['POST'])
 @require_auth
 def activate_phone(phone_id):
     """激活（切换到）指定手机"""
     try:
         # 检查手机是否存在
+        task_manager = get_task_manager()
         phone = task_manager.phone_manager.get_phone(phone_id)
         if not phone:
             return jsonify({'error': '手机不存在'}), 404
@@ -302,12 +486,12 @@ def activate_phone(phone_id):
         return jsonify({'error': f'激活失败: {str(e)}'}), 500
 
 
-@app.route('/api/phones/current', methods=['GET'])
+@bp.route('/api/phones/current', methods=['GET'])
 @require_auth
 def get_current_phone():
     """获取当前激活的手机"""
     try:
-        phone = task_manager.phone_manager.get_active_phone()
+        phone = get_task_manager().phone_manager.get_active_phone()
         if not phone:
             return jsonify({'message': '当前无激活手机'}), 404
 
@@ -323,12 +507,12 @@ def get_current_phone():
 
 # ==================== 错误处理 ====================
 
-@app.errorhandler(404)
+@bp.app_errorhandler(404)
 def not_found(error):
     return jsonify({'error': '资源不存在'}), 404
 
 
-@app.errorhandler(500)
+@bp.app_errorhandler(500)
 def internal_error(error):
     logger.error(f"服务器内部错误: {error}", exc_info=True)
     return jsonify({'error': '服务器内部错误'}), 500
@@ -358,21 +542,28 @@ def main():
     logger.info(f"访问地址: http://{WEB_HOST}:{WEB_PORT}")
     logger.info("=" * 60)
 
-    # 启动任务管理器
-    task_manager.start_worker()
+    # 任务管理器在后台线程中初始化并启动 worker，不阻塞端口监听
+    app = create_app()
 
-    # 启动 Flask 应用
+    # 启动 Web 服务
     try:
-        app.run(
-            host=WEB_HOST,
-            port=WEB_PORT,
-            debug=False,
-            threaded=True
-        )
+        if WEB_SERVER_MODE == 'aiohttp':
+            from aio_server import run_server
+            run_server(app, WEB_HOST, WEB_PORT)
+        else:
+            # 开发服务器：每个连接一个线程，SSE 连接会一直占用线程
+            app.run(
+                host=WEB_HOST,
+                port=WEB_PORT,
+                debug=False,
+                threaded=True
+            )
     except KeyboardInterrupt:
         logger.info("收到中断信号，正在关闭...")
     finally:
-        task_manager.stop_worker()
+        task_manager = TaskManager()
+        if task_manager.ready.is_set():
+            task_manager.stop_worker()
         logger.info("服务已关闭")
 
 
@@ -0,0 +1,131 @@
+"""
+异步任务步骤执行器（PHONE_IO_MODE=async）
+在一个事件循环中同时推进所有手机的任务，不再为每台手机创建执行线程：
+
+- 每台手机一个协程，按优先级依次取出队列中的任务，队列为空时等待唤醒，不占用线程
+- 任务的执行过程与线程模式相同（PhoneWorker._task_plan），
+  健康检查、模型调用和动作等阻塞单元在有上限的线程池中执行，单元之间不占用线程
+- 事件循环与 SyncPhoneController 共享（phone_controller_async.get_event_loop_thread）
+"""
+
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from queue import Empty
+from typing import Dict, Optional
+
+from config import AGENT_STEP_THREADS
+from phone_controller_async import EventLoopThread, get_event_loop_thread
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncStepRunner:
+    """
+    异步步骤执行器
+
+    Args:
+        loop_thread: 运行协程的事件循环线程
+        max_workers: 同时执行的阻塞单元（模型调用、动作等）数量上限
+    """
+
+    def __init__(self, loop_thread: EventLoopThread, max_workers: int = AGENT_STEP_THREADS):
+        self.loop_thread = loop_thread
+        self.executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix='agent-step')
+        self._lock = threading.Lock()
+        self._jobs: Dict['PhoneWorker', Future] = {}
+        self._wakeups: Dict['PhoneWorker', asyncio.Event] = {}
+
+    def start(self, worker: 'PhoneWorker'):
+        """在事件循环中启动该手机的协程（已在运行时忽略）"""
+        with self._lock:
+            job = self._jobs.get(worker)
+            if job is not None and not job.done():
+                return
+            self._jobs[worker] = asyncio.run_coroutine_threadsafe(self._serve(worker), self.loop_thread.loop)
+
+    def wake(self, worker: 'PhoneWorker'):
+        """队列中有新任务或停止信号时唤醒该手机的协程（可在任意线程调用）"""
+        wakeup = self._wakeups.get(worker)
+        if wakeup is not None:
+            self.loop_thread.loop.call_soon_threadsafe(wakeup.set)
+
+    def join(self, worker: 'PhoneWorker', timeout: Optional[float] = None):
+        """等待该手机的协程退出（收到停止信号并执行完当前任务）"""
+        with self._lock:
+            job = self._jobs.get(worker)
+        if job is None:
+            return
+        try:
+            job.result(timeout=timeout)
+        except FutureTimeoutError:
+            logger.warning(f"等待任务协程退出超时: {worker.name}")
+        with self._lock:
+            if self._jobs.get(worker) is job and job.done():
+                del self._jobs[worker]
+
+    async def _call(self, worker: 'PhoneWorker', func, *args):
+        """在线程池中执行，设备操作路由到该 worker 的手机"""
+        def bound():
+            worker.bind_device()
+            return func(*args)
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, bound)
+
+    async def run_task(self, worker: 'PhoneWorker', task: 'Task'):
+        """执行单个任务：在线程池中逐个执行 plan 的单元"""
+        from tasks import advance_plan
+
+        plan = worker._task_plan(task)
+        unit = await self._call(worker, advance_plan, plan)
+        while unit is not None:
+            unit = await self._call(worker, advance_plan, plan, unit)
+
+    async def _serve(self, worker: 'PhoneWorker'):
+        """单台手机的主循环：按优先级依次执行队列中的任务，收到停止信号后退出"""
+        wakeup = self._wakeups[worker] = asyncio.Event()
+        logger.info(f"Worker 协程已启动: {worker.name}")
+        try:
+            while True:
+                # 先清除再读取，读取之后加入的任务会重新唤醒
+                wakeup.clear()
+                try:
+                    _, _, task = worker.task_queue.get_nowait()
+                except Empty:
+                    await wakeup.wait()
+                    continue
+
+                try:
+                    if task is None:
+                        break
+
+                    worker.current_task = task
+                    await self.run_task(worker, task)
+
+                except Exception as e:
+                    logger.error(f"Worker 协程错误: {e}", exc_info=True)
+                finally:
+                    worker.current_task = None
+                    worker.task_queue.task_done()
+        finally:
+            self._wakeups.pop(worker, None)
+            logger.info(f"Worker 协程已退出: {worker.name}")
+
+    def shutdown(self, wait: bool = True):
+        """关闭线程池"""
+        self.executor.shutdown(wait=wait)
+
+
+_runner: Optional[AsyncStepRunner] = None
+_runner_lock = threading.Lock()
+
+
+def get_step_runner() -> AsyncStepRunner:
+    """进程内共享的执行器（第一次调用时创建）"""
+    global _runner
+    with _runner_lock:
+        if _runner is None:
+            _runner = AsyncStepRunner(get_event_loop_thread())
+        return _runner
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+离线压测脚本
+使用模拟 Helper（mock_helper）和脚本化的 PhoneAgent（fake_agent），不需要真实手机和模型 API，
+把 N 个任务推过 TaskManager 或 Flask 接口，输出吞吐量、单步耗时分位数和内存占用
+
+用法:
+    python benchmark.py --tasks 20 --steps 5 --phones 2
+    python benchmark.py --driver flask --latency 40 --jitter 15 --frame-kb 300 --think 200
+    python benchmark.py --json > result.json        # 输出 JSON，便于比较多次结果
+    python benchmark.py --phones 20 --io-mode async   # 所有手机由一个事件循环推进（需 aiohttp）
+    python benchmark.py --no-prefetch                 # 与关闭截图预取的串行执行对比
+
+任务日志、截图和白名单写入临时目录，不影响正式数据
+"""
+
+import argparse
+import json
+import logging
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import config
+from mock_helper import MockPhone, create_server
+
+logger = logging.getLogger('benchmark')
+
+
+def start_helpers(count: int, args) -> list:
+    """启动模拟 Helper，返回 [(名称, URL, server)]"""
+    helpers = []
+    for index in range(count):
+        phone = MockPhone(args.width, args.height, args.frame_kb * 1024)
+        server = create_server('127.0.0.1', 0, phone, latency_ms=args.latency, jitter_ms=args.jitter)
+        threading.Thread(target=server.serve_forever, name=f"mock-helper-{index}", daemon=True).start()
+        helpers.append((f"bench-{index + 1}", f"http://127.0.0.1:{server.server_address[1]}", server))
+    return helpers
+
+
+def isolate_storage(directory: Path):
+    """把任务存储、截图和白名单指向临时目录（必须在导入 tasks 之前调用）"""
+    config.TASK_HISTORY_FILE = directory / 'task_history.json'
+    config.TASK_JOURNAL_FILE = directory / 'task_journal.jsonl'
+    config.TASK_DB_FILE = directory / 'tasks.db'
+    config.TASK_SPILL_FILE = directory / 'task_spill.db'
+    config.SCREENSHOT_DIR = directory / 'screenshots'
+    config.PHONE_WHITELIST_FILE = directory / 'phone_whitelist.json'
+
+
+def prepare_manager(helpers: list, args):
+    """创建 TaskManager，为每个模拟 Helper 添加手机并换上脚本化的 PhoneAgent"""
+    import tasks as tasks_module
+    from fake_agent import FakePhoneAgent
+
+    task_manager = tasks_module.get_task_manager()
+    for seed, (name, url, _) in enumerate(helpers):
+        phone = task_manager.phone_manager.add_phone(name, url)
+        worker = task_manager.get_worker(phone['id'])
+        worker.phone_agent = FakePhoneAgent(
+            tasks_module.device_router,
+            steps=args.steps,
+            think_ms=args.think,
+            jitter_ms=args.think_jitter,
+            seed=seed,
+        )
+        task_manager.health.check(phone['id'])
+    return task_manager
+
+
+def wait_for(tasks: list, timeout: float):
+    """等待所有任务结束"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if all(task.status in ('completed', 'failed') for task in tasks):
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def drive_manager(task_manager, args) -> list:
+    """直接通过 TaskManager 提交任务"""
+    tasks = [
+        task_manager.submit_task(f"压测任务 {index + 1}", phone_id='any')
+        for index in range(args.tasks)
+    ]
+    if not wait_for(tasks, args.timeout):
+        logger.warning("等待任务超时")
+    return tasks
+
+
+def drive_flask(task_manager, args) -> list:
+    """通过 Flask 接口提交任务并轮询状态（包含请求解析、认证和序列化开销）"""
+    from app import create_app
+
+    client = create_app(init_task_manager=False).test_client()
+    headers = {'Authorization': f'Bearer {config.AUTH_TOKEN}'}
+    task_ids = []
+    for index in range(args.tasks):
+        # 提交接口按 IP 限速，每个请求使用不同的来源地址
+        response = client.post(
+            '/api/tasks',
+            json={'description': f"压测任务 {index + 1}", 'phone_id': 'any'},
+            headers=headers,
+            environ_base={'REMOTE_ADDR': f'10.{index // 65536 % 256}.{index // 256 % 256}.{index % 256}'},
+        )
+        if response.status_code != 201:
+            raise RuntimeError(f"提交失败: HTTP {response.status_code} {response.get_json()}")
+        task_ids.append(response.get_json()['task_id'])
+
+    deadline = time.monotonic() + args.timeout
+    pending = set(task_ids)
+    while pending and time.monotonic() < deadline:
+        for task_id in list(pending):
+            data = client.get(f'/api/tasks/{task_id}', headers=headers).get_json()
+            if data['status'] in ('completed', 'failed'):
+                pending.discard(task_id)
+        time.sleep(0.05)
+    if pending:
+        logger.warning(f"等待任务超时: {len(pending)} 个未完成")
+
+    return [task_manager.get_task(task_id) for task_id in task_ids]
+
+
+def peak_rss_mb() -> float:
+    """进程峰值常驻内存（MB）"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为 KB，macOS 为字节
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def summarize(tasks: list, elapsed: float, args) -> dict:
+    from metrics import RollingStats
+
+    step_stats = RollingStats(window=100000)
+    span_totals = {}
+    steps = 0
+    saved_ms = 0.0
+    for task in tasks:
+        for timing in task.step_timings:
+            steps += 1
+            step_stats.add(timing.get('total_ms', timing['step_ms']))
+            saved_ms += timing.get('saved_ms', 0.0)
+        for name, elapsed_ms in task.timing_breakdown().items():
+            span_totals[name] = span_totals.get(name, 0.0) + elapsed_ms
+
+    step_snapshot = step_stats.snapshot()
+    return {
+        'driver': args.driver,
+        'io_mode': config.PHONE_IO_MODE,
+        'settle_mode': config.SCREENSHOT_SETTLE_MODE,
+        'prefetch': config.SCREENSHOT_PREFETCH,
+        'phones': args.phones,
+        'tasks': len(tasks),
+        'completed': sum(1 for task in tasks if task.status == 'completed'),
+        'failed': sum(1 for task in tasks if task.status == 'failed'),
+        'steps': steps,
+        'elapsed_s': round(elapsed, 2),
+        'steps_per_s': round(steps / elapsed, 2) if elapsed else None,
+        'step_ms': {'p50': step_snapshot['p50'], 'p99': step_snapshot['p99'], 'max': step_snapshot['max']},
+        'avg_saved_ms': round(saved_ms / steps, 1) if steps else None,
+        'avg_span_ms': {name: round(total / steps, 1) for name, total in sorted(span_totals.items())} if steps else {},
+        'threads': threading.active_count(),
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='AutoGLM 离线压测')
+    parser.add_argument('--driver', choices=('manager', 'flask'), default='manager', help='任务提交方式')
+    parser.add_argument('--tasks', type=int, default=20, help='任务数')
+    parser.add_argument('--steps', type=int, default=5, help='每个任务的步数')
+    parser.add_argument('--phones', type=int, default=2, help='模拟手机数')
+    parser.add_argument('--io-mode', choices=('sync', 'async'), default=config.PHONE_IO_MODE,
+                        help='手机 I/O 模式（async 时任务由一个事件循环推进）')
+    parser.add_argument('--settle-mode', choices=('fixed', 'adaptive'), default=config.SCREENSHOT_SETTLE_MODE,
+                        help='动作后等待界面稳定的方式')
+    parser.add_argument('--no-prefetch', action='store_true', help='关闭截图预取（下一步截图前同步等待界面稳定）')
+    parser.add_argument('--think', type=float, default=100, help='模拟模型耗时（毫秒）')
+    parser.add_argument('--think-jitter', type=float, default=0, help='模型耗时波动（±毫秒）')
+    parser.add_argument('--latency', type=float, default=20, help='Helper 请求延迟（毫秒）')
+    parser.add_argument('--jitter', type=float, default=5, help='Helper 延迟波动（±毫秒）')
+    parser.add_argument('--frame-kb', type=int, default=0, help='全尺寸截图的最小大小（KB）')
+    parser.add_argument('--width', type=int, default=1080)
+    parser.add_argument('--height', type=int, default=2400)
+    parser.add_argument('--timeout', type=float, default=600, help='等待所有任务完成的最长时间（秒）')
+    parser.add_argument('--tracemalloc', action='store_true', help='统计 Python 堆内存峰值（会降低吞吐量）')
+    parser.add_argument('--json', action='store_true', help='输出 JSON')
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO if args.verbose else logging.WARNING,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    if not args.verbose:
+        # 默认手机不可达、未安装 phone_agent 等启动警告与压测无关
+        for name in ('tasks', 'health'):
+            logging.getLogger(name).setLevel(logging.ERROR)
+
+    # 必须在导入 tasks 之前设置
+    config.PHONE_IO_MODE = args.io_mode
+    config.SCREENSHOT_SETTLE_MODE = args.settle_mode
+    config.SCREENSHOT_PREFETCH = not args.no_prefetch
+
+    with tempfile.TemporaryDirectory(prefix='autoglm-bench-') as directory:
+        isolate_storage(Path(directory))
+        helpers = start_helpers(args.phones, args)
+
+        task_manager = prepare_manager(helpers, args)
+
+        if args.tracemalloc:
+            tracemalloc.start()
+
+        start = time.monotonic()
+        driver = drive_flask if args.driver == 'flask' else drive_manager
+        tasks = driver(task_manager, args)
+        elapsed = time.monotonic() - start
+
+        result = summarize(tasks, elapsed, args)
+        result['task_cache'] = task_manager.get_cache_stats()
+        if args.tracemalloc:
+            result['tracemalloc_peak_mb'] = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 1)
+            tracemalloc.stop()
+
+        task_manager.stop_worker()
+        for _, _, server in helpers:
+            server.shutdown()
+
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        return
+
+    print(f"驱动: {result['driver']}  I/O 模式: {result['io_mode']}  手机: {result['phones']}  任务: {result['tasks']} "
+          f"(完成 {result['completed']}, 失败 {result['failed']})")
+    print(f"界面稳定: {result['settle_mode']}  预取: {'开' if result['prefetch'] else '关'}  "
+          f"预取节省: {result['avg_saved_ms']} ms/步")
+    print(f"步数: {result['steps']}  耗时: {result['elapsed_s']} s  吞吐量: {result['steps_per_s']} 步/秒")
+    print(f"单步耗时: p50 {result['step_ms']['p50']} ms  p99 {result['step_ms']['p99']} ms  "
+          f"max {result['step_ms']['max']} ms")
+    print("各阶段平均耗时（毫秒/步）:")
+    for name, elapsed_ms in result['avg_span_ms'].items():
+        print(f"  {name:<20} {elapsed_ms}")
+    print(f"线程数: {result['threads']}  峰值内存: {result['peak_rss_mb']} MB"
+          + (f"  Python 堆峰值: {result['tracemalloc_peak_mb']} MB" if 'tracemalloc_peak_mb' in result else ''))
+    cache = result['task_cache']
+    print(f"任务缓存: {cache['tasks']} 个任务  {round(cache['bytes'] / 1024, 1)} KB  淘汰 {cache['evictions']} 次")
+
+
+if __name__ == '__main__':
+    main()
@@ -31,6 +31,13 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 WEB_HOST = os.getenv('WEB_HOST', '127.0.0.1')
 WEB_PORT = int(os.getenv('WEB_PORT', '5000'))
 
+# 服务模式: dev（Flask 开发服务器，每个连接一个线程）或 aiohttp（事件循环 + 有上限的线程池，需安装 aiohttp）
+WEB_SERVER_MODE = os.getenv('WEB_SERVER_MODE', 'dev').lower()
+# aiohttp 模式下执行 Flask 请求的线程数（SSE 日志流不占用线程）
+WEB_WORKER_THREADS = int(os.getenv('WEB_WORKER_THREADS', '16'))
+# aiohttp 模式下同时处理的请求上限（含 SSE 连接），超出返回 503
+WEB_MAX_CONNECTIONS = int(os.getenv('WEB_MAX_CONNECTIONS', '1000'))
+
 # 认证配置
 # 生成或读取 auth token（首次运行时自动生成）
 AUTH_TOKEN_FILE = BASE_DIR / 'web-server' / '.auth_token'
@@ -49,6 +56,41 @@ else:
 PHONE_HELPER_URL = os.getenv('PHONE_HELPER_URL', 'http://192.168.1.100:8080')
 PHONE_AGENT_API_KEY = os.getenv('PHONE_AGENT_API_KEY', '')
 
+# 手机 I/O 模式: sync（requests 连接池，默认）或 async（aiohttp，所有手机共享一个事件循环）
+PHONE_IO_MODE = os.getenv('PHONE_IO_MODE', 'sync').lower()
+
+# async 模式下同时执行模型调用和动作的线程数（所有手机共用，任务由一个事件循环推进）
+AGENT_STEP_THREADS = int(os.getenv('AGENT_STEP_THREADS', '8'))
+
+# 动作完成后等待界面稳定再截图，在后台与其他工作重叠执行
+# - fixed（默认）：固定等待 SCREENSHOT_SETTLE_DELAY 秒
+# - adaptive：交替截取探测帧和全尺寸帧，相邻帧一致即返回，最长等待 SCREENSHOT_SETTLE_MAX_WAIT 秒；
+#   两次截图至少间隔约 0.35 秒，模型响应很快（上一张截图刚截完就执行动作）时不比 fixed 快
+SCREENSHOT_SETTLE_MODE = os.getenv('SCREENSHOT_SETTLE_MODE', 'fixed').lower()
+SCREENSHOT_SETTLE_DELAY = float(os.getenv('SCREENSHOT_SETTLE_DELAY', '0.5'))
+SCREENSHOT_SETTLE_MAX_WAIT = float(os.getenv('SCREENSHOT_SETTLE_MAX_WAIT', '1.5'))
+# 是否在后台预取截图（关闭时在下一步截图前同步等待界面稳定，与原来的串行执行相同）
+SCREENSHOT_PREFETCH = os.getenv('SCREENSHOT_PREFETCH', 'true').lower() in ('1', 'true', 'yes')
+
+# 发给模型的截图处理策略：长边最大像素（0 为不缩小）、编码格式（original / jpeg / webp）、
+# 质量和是否转灰度。动作坐标会按缩放比例换算回设备像素
+SCREENSHOT_MAX_EDGE = int(os.getenv('SCREENSHOT_MAX_EDGE', '0'))
+SCREENSHOT_FORMAT = os.getenv('SCREENSHOT_FORMAT', 'original').lower()
+SCREENSHOT_QUALITY = int(os.getenv('SCREENSHOT_QUALITY', '75'))
+SCREENSHOT_GRAYSCALE = os.getenv('SCREENSHOT_GRAYSCALE', 'false').lower() in ('1', 'true', 'yes')
+
+# 帧差异检测：上一步动作后画面没有变化时，先等待 FRAME_DIFF_RETRY_DELAY 秒重新截图
+# （最多 FRAME_DIFF_RETRIES 次），避免把相同的画面再发给模型
+FRAME_DIFF_ENABLED = os.getenv('FRAME_DIFF_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+FRAME_DIFF_RETRIES = int(os.getenv('FRAME_DIFF_RETRIES', '2'))
+FRAME_DIFF_RETRY_DELAY = float(os.getenv('FRAME_DIFF_RETRY_DELAY', '0.5'))
+FRAME_DIFF_HASH_THRESHOLD = int(os.getenv('FRAME_DIFF_HASH_THRESHOLD', '2'))
+
+# 手机健康检查：探测间隔（秒，连续失败时逐步延长，最长 60 秒）、单次超时（秒）、并发探测数
+PHONE_HEALTH_INTERVAL = float(os.getenv('PHONE_HEALTH_INTERVAL', '15'))
+PHONE_HEALTH_TIMEOUT = float(os.getenv('PHONE_HEALTH_TIMEOUT', '3'))
+PHONE_HEALTH_CONCURRENCY = int(os.getenv('PHONE_HEALTH_CONCURRENCY', '8'))
+
 # 日志配置
 LOG_DIR = BASE_DIR / 'logs' / 'web'
 LOG_DIR.mkdir(parents=True, exist_ok=True)
@@ -57,6 +99,24 @@ LOG_FILE = LOG_DIR / 'app.log'
 # 任务存储配置
 TASK_HISTORY_FILE = BASE_DIR / 'web-server' / 'task_history.json'
 
+# 任务日志（追加写），每追加 TASK_JOURNAL_COMPACT_EVERY 条事件压缩为快照
+TASK_JOURNAL_FILE = BASE_DIR / 'web-server' / 'task_journal.jsonl'
+TASK_JOURNAL_COMPACT_EVERY = int(os.getenv('TASK_JOURNAL_COMPACT_EVERY', '500'))
+TASK_JOURNAL_FSYNC = os.getenv('TASK_JOURNAL_FSYNC', 'false').lower() in ('1', 'true', 'yes')
+
+# 任务存储后端: journal（追加写日志 + 快照，默认）或 sqlite（支持长期历史和索引查询）
+TASK_STORE = os.getenv('TASK_STORE', 'journal').lower()
+TASK_DB_FILE = BASE_DIR / 'web-server' / 'tasks.db'
+
+# 内存中的任务缓存上限（估算内存 MB 和任务数，0 表示不限制），超出时按 LRU 淘汰已结束的任务；
+# 被淘汰的任务在 sqlite 存储中直接按需读取，journal 存储下写入 TASK_SPILL_FILE
+TASK_CACHE_MAX_MB = float(os.getenv('TASK_CACHE_MAX_MB', '64'))
+TASK_CACHE_MAX_TASKS = int(os.getenv('TASK_CACHE_MAX_TASKS', '500'))
+TASK_SPILL_FILE = BASE_DIR / 'web-server' / 'task_spill.db'
+
+# 截图存储目录（按内容哈希去重）
+SCREENSHOT_DIR = BASE_DIR / 'web-server' / 'screenshots'
+
 # 手机白名单配置
 PHONE_WHITELIST_FILE = BASE_DIR / 'web-server' / 'phone_whitelist.json'
 
@@ -75,10 +135,28 @@ def get_config_summary():
     return {
         'web_host': WEB_HOST,
         'web_port': WEB_PORT,
+        'web_server_mode': WEB_SERVER_MODE,
         'phone_helper_url': PHONE_HELPER_URL,
+        'phone_io_mode': PHONE_IO_MODE,
+        'agent_step_threads': AGENT_STEP_THREADS,
+        'screenshot_settle_mode': SCREENSHOT_SETTLE_MODE,
+        'screenshot_settle_delay': SCREENSHOT_SETTLE_DELAY,
+        'screenshot_settle_max_wait': SCREENSHOT_SETTLE_MAX_WAIT,
+        'screenshot_prefetch': SCREENSHOT_PREFETCH,
+        'screenshot_max_edge': SCREENSHOT_MAX_EDGE,
+        'screenshot_format': SCREENSHOT_FORMAT,
+        'screenshot_quality': SCREENSHOT_QUALITY,
+        'screenshot_grayscale': SCREENSHOT_GRAYSCALE,
+        'frame_diff_enabled': FRAME_DIFF_ENABLED,
+        'frame_diff_retries': FRAME_DIFF_RETRIES,
+        'phone_health_interval': PHONE_HEALTH_INTERVAL,
         'auth_token': f"{AUTH_TOKEN[:8]}..." if AUTH_TOKEN else "未设置",
         'log_dir': str(LOG_DIR),
         'task_history_file': str(TASK_HISTORY_FILE),
+        'task_store': TASK_STORE,
+        'task_cache_max_mb': TASK_CACHE_MAX_MB,
+        'task_cache_max_tasks': TASK_CACHE_MAX_TASKS,
+        'screenshot_dir': str(SCREENSHOT_DIR),
     }
 
 
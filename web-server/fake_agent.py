@@ -0,0 +1,109 @@
+"""
+PhoneAgent 替身
+按脚本执行截图 -> 模拟模型思考 -> 动作，不调用模型 API，用于压测和调试任务执行链路
+
+与 PhoneAgent 一样通过设备接口（如 tasks.device_router 或 PhoneControllerAdapter）操作手机，
+返回与 StepResult 字段相同的结果，可以直接赋值给 PhoneWorker.phone_agent
+"""
+
+import logging
+import random
+import time
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 默认脚本：点击、滑动、输入轮流执行（坐标为 0~999 的相对坐标，与 PhoneAgent 相同）
+DEFAULT_SCRIPT = [
+    {'action': 'Tap', 'element': [500, 300]},
+    {'action': 'Swipe', 'start': [500, 800], 'end': [500, 200]},
+    {'action': 'Type', 'text': 'hello'},
+]
+
+
+class FakeStepResult:
+    """与 phone_agent 的 StepResult 字段相同"""
+
+    def __init__(self, success: bool, finished: bool, action: Optional[dict],
+                 thinking: str, message: Optional[str] = None):
+        self.success = success
+        self.finished = finished
+        self.action = action
+        self.thinking = thinking
+        self.message = message
+
+
+class FakePhoneAgent:
+    """
+    脚本化的 PhoneAgent
+
+    Args:
+        device: 设备接口（get_screenshot / tap / swipe / type_text）
+        steps: 每个任务执行的步数，最后一步返回 finished
+        think_ms: 模拟模型请求耗时（毫秒）
+        jitter_ms: 模型耗时的随机波动（±毫秒）
+        script: 按顺序循环执行的动作
+        seed: 随机数种子（保证多次压测可比）
+    """
+
+    def __init__(self, device, steps: int = 5, think_ms: float = 300, jitter_ms: float = 0,
+                 script: Optional[List[dict]] = None, seed: Optional[int] = None):
+        self.device = device
+        self.steps = max(1, steps)
+        self.think_ms = think_ms
+        self.jitter_ms = jitter_ms
+        self.script = script or DEFAULT_SCRIPT
+        self._random = random.Random(seed)
+        self._step_count = 0
+        self._context: List[dict] = []
+
+    @property
+    def step_count(self) -> int:
+        return self._step_count
+
+    def reset(self):
+        self._step_count = 0
+        self._context = []
+
+    def step(self, task: Optional[str] = None) -> FakeStepResult:
+        """执行一步：截图、构造模型请求、等待"模型"返回、执行动作"""
+        screenshot = self.device.get_screenshot()
+
+        # 与 PhoneAgent 一样把截图编码为 data URI 放入上下文（只保留最近一轮）
+        self._context = [
+            {'role': 'user', 'content': task or '继续'},
+            {'role': 'user', 'content': [{'type': 'image_url', 'image_url': {'url': screenshot.data_uri}}]},
+        ]
+
+        delay = max(0.0, self.think_ms + self._random.uniform(-self.jitter_ms, self.jitter_ms))
+        time.sleep(delay / 1000)
+
+        action = dict(self.script[self._step_count % len(self.script)], _metadata='do')
+        success = self._execute(action, screenshot.width, screenshot.height)
+        self._step_count += 1
+
+        finished = self._step_count >= self.steps
+        return FakeStepResult(
+            success=success,
+            finished=finished,
+            action=action,
+            thinking=f"第 {self._step_count} 步: {action['action']}",
+            message='脚本执行完成' if finished else None,
+        )
+
+    def _execute(self, action: dict, width: int, height: int) -> bool:
+        def point(relative):
+            return round(relative[0] / 1000 * width), round(relative[1] / 1000 * height)
+
+        name = action['action']
+        if name == 'Tap':
+            return self.device.tap(*point(action['element']))
+        if name == 'Swipe':
+            return self.device.swipe(*point(action['start']), *point(action['end']))
+        if name == 'Type':
+            return self.device.type_text(action['text'])
+        if name == 'Wait':
+            time.sleep(action.get('seconds', 1))
+            return True
+        logger.warning(f"未知的脚本动作: {name}")
+        return False
@@ -0,0 +1,141 @@
+"""
+截图帧差异检测模块
+使用感知哈希（dHash）和分区灰度差判断两帧截图是否基本一致，
+动作没有产生可见变化时可以等待重截，而不是再调用一次视觉模型
+"""
+
+import io
+import logging
+from typing import List, Optional, Tuple
+
+from lazy_import import lazy_module
+
+Image = lazy_module('PIL.Image')
+
+logger = logging.getLogger(__name__)
+
+# 分区比较使用的灰度图尺寸和网格（列, 行），每个格子 6x8 像素
+REGION_SIZE = (18, 40)
+REGION_GRID = (3, 5)
+
+
+class FrameSignature:
+    """一帧截图的特征：64 位 dHash 和低分辨率灰度图"""
+
+    __slots__ = ('dhash', 'pixels')
+
+    def __init__(self, dhash: int, pixels: bytes):
+        self.dhash = dhash
+        self.pixels = pixels
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'FrameSignature':
+        image = Image.open(io.BytesIO(data))
+        if image.format == 'JPEG':
+            # 在解码阶段按 1/2~1/8 缩小
+            image.draft('L', (REGION_SIZE[0] * 4, REGION_SIZE[1] * 4))
+        gray = image.convert('L')
+
+        # dHash: 9x8 灰度图中每行相邻像素的大小关系
+        small = gray.resize((9, 8), Image.BILINEAR).tobytes()
+        dhash = 0
+        for row in range(8):
+            for col in range(8):
+                left = small[row * 9 + col]
+                right = small[row * 9 + col + 1]
+                dhash = (dhash << 1) | (1 if left > right else 0)
+
+        pixels = gray.resize(REGION_SIZE, Image.BILINEAR).tobytes()
+        return cls(dhash, pixels)
+
+
+class FrameDiff:
+    """两帧的比较结果"""
+
+    __slots__ = ('hash_distance', 'changed_regions', 'unchanged')
+
+    def __init__(self, hash_distance: int, changed_regions: List[Tuple[int, int]], unchanged: bool):
+        self.hash_distance = hash_distance        # dHash 汉明距离（0~64）
+        self.changed_regions = changed_regions    # 有变化的格子 (列, 行)
+        self.unchanged = unchanged                # 是否视为未变化
+
+    def to_dict(self) -> dict:
+        return {
+            'hash_distance': self.hash_distance,
+            'changed_regions': len(self.changed_regions),
+            'unchanged': self.unchanged,
+        }
+
+
+def changed_regions(a: bytes, b: bytes, region_threshold: float) -> List[Tuple[int, int]]:
+    """按网格比较两张低分辨率灰度图，返回平均灰度差超过阈值的格子"""
+    width, height = REGION_SIZE
+    cols, rows = REGION_GRID
+    cell_w, cell_h = width // cols, height // rows
+
+    regions = []
+    for row in range(rows):
+        for col in range(cols):
+            total = 0
+            for y in range(row * cell_h, (row + 1) * cell_h):
+                offset = y * width + col * cell_w
+                for x in range(cell_w):
+                    total += abs(a[offset + x] - b[offset + x])
+            if total / (cell_w * cell_h) > region_threshold:
+                regions.append((col, row))
+    return regions
+
+
+def compare_frames(previous: FrameSignature, current: FrameSignature,
+                   hash_threshold: int = 2, region_threshold: float = 6.0) -> FrameDiff:
+    """
+    比较两帧
+
+    dHash 对整体布局变化敏感，但可能忽略小控件的变化（如勾选框），
+    因此还要求所有格子都没有明显变化才视为未变化
+
+    Args:
+        hash_threshold: dHash 汉明距离不超过该值视为相似
+        region_threshold: 格子平均灰度差超过该值视为有变化
+    """
+    distance = bin(previous.dhash ^ current.dhash).count('1')
+    regions = changed_regions(previous.pixels, current.pixels, region_threshold)
+    return FrameDiff(distance, regions, distance <= hash_threshold and not regions)
+
+
+class FrameComparator:
+    """
+    记录上一帧发给模型的截图，判断新截图相对它是否有变化
+
+    Args:
+        hash_threshold: 见 compare_frames
+        region_threshold: 见 compare_frames
+    """
+
+    def __init__(self, hash_threshold: int = 2, region_threshold: float = 6.0):
+        self.hash_threshold = hash_threshold
+        self.region_threshold = region_threshold
+        self._previous: Optional[FrameSignature] = None
+
+    def reset(self):
+        """清除上一帧（新任务开始时调用）"""
+        self._previous = None
+
+    def remember(self, data: bytes):
+        """记录发给模型的截图"""
+        try:
+            self._previous = FrameSignature.from_bytes(data)
+        except Exception as e:
+            logger.debug(f"截图特征计算失败: {e}")
+            self._previous = None
+
+    def compare(self, data: bytes) -> Optional[FrameDiff]:
+        """与上一帧比较，没有上一帧或无法解析时返回 None"""
+        if self._previous is None:
+            return None
+        try:
+            current = FrameSignature.from_bytes(data)
+        except Exception as e:
+            logger.debug(f"截图特征计算失败: {e}")
+            return None
+        return compare_frames(self._previous, current, self.hash_threshold, self.region_threshold)
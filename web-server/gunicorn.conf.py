@@ -0,0 +1,24 @@
+"""
+gunicorn 配置（生产服务模式）
+
+用法（在 web-server 目录下）:
+    pip install gunicorn aiohttp
+    gunicorn -c gunicorn.conf.py
+
+任务队列、手机 worker 和事件总线都在进程内，只能运行一个 worker 进程；
+并发由 aiohttp 事件循环（SSE）和线程池（WEB_WORKER_THREADS）承担
+"""
+
+from config import WEB_HOST, WEB_PORT
+
+wsgi_app = 'aio_server:gunicorn_app'
+worker_class = 'aiohttp.GunicornWebWorker'
+workers = 1
+
+bind = f"{WEB_HOST}:{WEB_PORT}"
+
+# 停止时等待正在执行的请求完成（秒）
+graceful_timeout = 30
+
+# 请求日志由 Flask 记录
+accesslog = None
@@ -0,0 +1,303 @@
+"""
+手机健康检查模块
+后台线程定期并发探测白名单中每台手机的 Helper 状态，记录往返延迟分位数、错误率和无障碍状态，
+控制器创建、启动和切换手机时不再同步等待连接测试；
+WebSocket 通道已连接时直接使用 Helper 推送的状态和心跳延迟，不额外发请求
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime
+from typing import Callable, Dict, Optional
+
+from metrics import RollingStats
+from phone_controller_remote import PhoneControllerRemote
+
+logger = logging.getLogger(__name__)
+
+# 健康状态
+HEALTH_UNKNOWN = 'unknown'                    # 尚未探测
+HEALTH_ONLINE = 'online'                      # Helper 可访问且无障碍服务已开启
+HEALTH_NO_ACCESSIBILITY = 'no_accessibility'  # Helper 可访问，但无障碍服务未开启
+HEALTH_OFFLINE = 'offline'                    # 无法访问 Helper
+
+HEALTH_STATES = (HEALTH_UNKNOWN, HEALTH_ONLINE, HEALTH_NO_ACCESSIBILITY, HEALTH_OFFLINE)
+
+
+class PhoneHealth:
+    """
+    单台手机的健康状态和探测指标
+
+    Args:
+        window: 计算延迟分位数和错误率的最近探测次数
+    """
+
+    def __init__(self, phone_id: str, helper_url: str, window: int = 100):
+        self.phone_id = phone_id
+        self.helper_url = helper_url
+        self.controller = None        # worker 的控制器（读取 WebSocket 通道推送的状态）
+        self.probe_controller: Optional[PhoneControllerRemote] = None  # 探测专用，不重试
+        self.lock = threading.Lock()
+
+        self.state = HEALTH_UNKNOWN
+        self.accessibility_enabled: Optional[bool] = None
+        self.latency_ms: Optional[float] = None
+        self.error: Optional[str] = None
+        self.last_checked: Optional[str] = None
+        self.last_ok: Optional[str] = None
+        self.consecutive_failures = 0
+        self.next_check = 0.0  # time.monotonic() 时间，0 表示尽快探测
+
+        self.rtt_stats = RollingStats(window)
+        self._results: deque = deque(maxlen=window)  # 最近探测是否成功
+        self.checks = 0
+        self.failures = 0
+
+    @property
+    def error_rate(self) -> Optional[float]:
+        """最近探测的失败比例"""
+        results = list(self._results)
+        if not results:
+            return None
+        return round(results.count(False) / len(results), 3)
+
+    def record(self, ok: bool, rtt_ms: Optional[float] = None):
+        self.checks += 1
+        self._results.append(ok)
+        if not ok:
+            self.failures += 1
+        if rtt_ms is not None:
+            self.rtt_stats.add(rtt_ms)
+
+    def close(self):
+        if self.probe_controller:
+            self.probe_controller.close()
+            self.probe_controller = None
+
+    def to_dict(self) -> dict:
+        return {
+            'state': self.state,
+            'accessibility_enabled': self.accessibility_enabled,
+            'latency_ms': self.latency_ms,
+            'error': self.error,
+            'last_checked': self.last_checked,
+            'last_ok': self.last_ok,
+            'consecutive_failures': self.consecutive_failures,
+            'error_rate': self.error_rate,
+        }
+
+    def metrics(self) -> dict:
+        """完整指标：状态 + 延迟分布（毫秒）+ 累计探测次数"""
+        return dict(
+            self.to_dict(),
+            helper_url=self.helper_url,
+            rtt_ms=self.rtt_stats.snapshot(),
+            checks=self.checks,
+            failures=self.failures,
+        )
+
+
+class PhoneHealthProber:
+    """
+    手机健康检查器
+
+    Args:
+        interval: 正常状态下的探测间隔（秒）
+        max_backoff: 连续失败时探测间隔翻倍的上限（秒）
+        timeout: 单次探测的读取超时（秒）
+        concurrency: 同时探测的手机数
+        targets: 返回 {手机 ID: Helper URL} 的函数，每轮探测前调用以同步白名单；
+            为 None 时只探测通过 register 登记的手机
+    """
+
+    def __init__(self, interval: float = 15.0, max_backoff: float = 60.0, timeout: float = 3.0,
+                 concurrency: int = 8, targets: Optional[Callable[[], Dict[str, str]]] = None):
+        self.interval = interval
+        self.max_backoff = max(interval, max_backoff)
+        self.timeout = timeout
+        self.concurrency = max(1, concurrency)
+        self.targets = targets
+        self._phones: Dict[str, PhoneHealth] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def start(self):
+        """启动后台探测线程（立即返回）"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopped.clear()
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="phone-health")
+        self._thread = threading.Thread(target=self._run, name="phone-health", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+        if self._executor:
+            self._executor.shutdown(wait=False)
+        with self._lock:
+            for health in self._phones.values():
+                health.close()
+
+    def register(self, phone_id: str, controller):
+        """登记 worker 的手机控制器，后台线程会尽快完成第一次探测"""
+        with self._lock:
+            health = self._phones.get(phone_id)
+            if health is None:
+                health = self._phones[phone_id] = PhoneHealth(phone_id, controller.helper_url)
+            health.controller = controller
+        self._wakeup.set()
+
+    def unregister(self, phone_id: str):
+        with self._lock:
+            health = self._phones.pop(phone_id, None)
+        if health:
+            health.close()
+
+    def get(self, phone_id: str) -> Optional[dict]:
+        """获取手机的健康状态，未登记返回 None"""
+        health = self._phones.get(phone_id)
+        return health.to_dict() if health else None
+
+    def get_all(self) -> Dict[str, dict]:
+        return {phone_id: health.to_dict() for phone_id, health in list(self._phones.items())}
+
+    def get_metrics(self) -> dict:
+        """所有手机的探测指标和各状态的手机数"""
+        phones = {phone_id: health.metrics() for phone_id, health in list(self._phones.items())}
+        summary = {state: 0 for state in HEALTH_STATES}
+        for metrics in phones.values():
+            summary[metrics['state']] += 1
+        return {'summary': summary, 'phones': phones}
+
+    def get_state(self, phone_id: str) -> str:
+        health = self._phones.get(phone_id)
+        return health.state if health else HEALTH_UNKNOWN
+
+    def get_latency(self, phone_id: str) -> Optional[float]:
+        """最近探测往返延迟的中位数（毫秒），没有样本返回 None"""
+        health = self._phones.get(phone_id)
+        return health.rtt_stats.percentile(0.5) if health else None
+
+    def is_online(self, phone_id: str) -> bool:
+        health = self._phones.get(phone_id)
+        return bool(health and health.state == HEALTH_ONLINE)
+
+    def schedule(self, phone_id: str):
+        """让后台线程尽快探测该手机（不等待结果）"""
+        health = self._phones.get(phone_id)
+        if health:
+            health.next_check = 0.0
+            self._wakeup.set()
+
+    def check(self, phone_id: str) -> Optional[dict]:
+        """在当前线程立即探测并返回结果（执行任务前确认离线手机是否已恢复）"""
+        health = self._phones.get(phone_id)
+        if not health:
+            return None
+        self._probe(health)
+        return health.to_dict()
+
+    def _sync_targets(self):
+        """按白名单增删探测目标（worker 登记的手机保留）"""
+        if self.targets is None:
+            return
+        try:
+            targets = self.targets()
+        except Exception as e:
+            logger.warning(f"获取探测目标失败: {e}")
+            return
+
+        removed = []
+        with self._lock:
+            for phone_id, helper_url in targets.items():
+                health = self._phones.get(phone_id)
+                if health is None:
+                    self._phones[phone_id] = PhoneHealth(phone_id, helper_url)
+                elif health.helper_url != helper_url:
+                    health.helper_url = helper_url
+                    removed.append(health)
+            for phone_id, health in list(self._phones.items()):
+                if phone_id not in targets and health.controller is None:
+                    removed.append(self._phones.pop(phone_id))
+        for health in removed:
+            health.close()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._sync_targets()
+
+            now = time.monotonic()
+            due = [h for h in list(self._phones.values()) if h.next_check <= now]
+            if due:
+                # 并发探测，单台手机超时不会拖慢其他手机
+                wait([self._executor.submit(self._probe, health) for health in due])
+
+            next_check = min((h.next_check for h in list(self._phones.values())), default=None)
+            timeout = self.interval if next_check is None else max(0.0, next_check - time.monotonic())
+            self._wakeup.wait(timeout)
+            self._wakeup.clear()
+
+    def _get_status(self, health: PhoneHealth):
+        """获取 Helper 状态，返回 (状态 JSON, 往返延迟毫秒)"""
+        channel = getattr(health.controller, 'channel', None)
+        if channel is not None and channel.connected and channel.status:
+            return channel.status, channel.heartbeat_rtt_ms
+
+        if health.probe_controller is None:
+            health.probe_controller = PhoneControllerRemote(
+                health.helper_url,
+                pool_size=1,
+                timeouts={'status': self.timeout},
+                max_retries=0,
+                use_channel=False,
+                check_connection=False,
+            )
+        started = time.monotonic()
+        status = health.probe_controller.get_status()
+        return status, round((time.monotonic() - started) * 1000, 1)
+
+    def _probe(self, health: PhoneHealth):
+        """探测一次并更新状态"""
+        with health.lock:
+            try:
+                status, latency_ms = self._get_status(health)
+            except Exception as e:
+                # requests / 通道的异常都视为离线
+                self._record_failure(health, str(e) or type(e).__name__)
+                return
+
+            now = datetime.now().isoformat()
+            previous = health.state
+            health.accessibility_enabled = bool(status.get('accessibility_enabled'))
+            health.state = HEALTH_ONLINE if health.accessibility_enabled else HEALTH_NO_ACCESSIBILITY
+            health.latency_ms = latency_ms
+            health.error = None if health.state == HEALTH_ONLINE else '无障碍服务未开启'
+            health.last_checked = now
+            health.last_ok = now
+            health.consecutive_failures = 0
+            health.next_check = time.monotonic() + self.interval
+            health.record(True, latency_ms)
+            if health.state != previous:
+                logger.info(f"手机 {health.phone_id} 状态: {previous} -> {health.state}")
+
+    def _record_failure(self, health: PhoneHealth, error: str):
+        previous = health.state
+        health.state = HEALTH_OFFLINE
+        health.error = error
+        health.last_checked = datetime.now().isoformat()
+        health.consecutive_failures += 1
+        health.record(False)
+        # 连续失败时逐步拉长探测间隔，避免对离线手机反复等待超时
+        backoff = min(self.interval * 2 ** (health.consecutive_failures - 1), self.max_backoff)
+        health.next_check = time.monotonic() + backoff
+        if previous != HEALTH_OFFLINE:
+            logger.warning(f"手机 {health.phone_id} 离线: {error}")
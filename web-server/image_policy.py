@@ -0,0 +1,98 @@
+"""
+截图上传策略模块
+发给模型前按配置缩小、转灰度并重新编码截图，减少上传时间和视觉 token；
+记录缩放比例，模型输出的坐标由适配器换算回设备像素
+"""
+
+import logging
+from io import BytesIO
+
+from lazy_import import lazy_module
+from phone_controller_remote import RemoteScreenshot
+
+Image = lazy_module('PIL.Image')
+features = lazy_module('PIL.features')
+
+logger = logging.getLogger(__name__)
+
+# 支持的输出格式（original 表示保持 Helper 返回的编码）
+FORMATS = {
+    'jpeg': ('JPEG', 'image/jpeg'),
+    'webp': ('WEBP', 'image/webp'),
+}
+
+
+class ImagePolicy:
+    """
+    截图处理策略
+
+    Args:
+        max_edge: 长边最大像素，0 表示不缩小
+        format: original / jpeg / webp
+        quality: JPEG / WebP 质量（1~100）
+        grayscale: 是否转为灰度
+    """
+
+    def __init__(self, max_edge: int = 0, format: str = 'original', quality: int = 75,
+                 grayscale: bool = False):
+        self.max_edge = max(0, max_edge)
+        self.format = (format or 'original').lower()
+        self.quality = min(100, max(1, quality))
+        self.grayscale = grayscale
+
+        if self.format not in FORMATS and self.format != 'original':
+            logger.warning(f"不支持的截图格式 {format}，保持原始编码")
+            self.format = 'original'
+        if self.format == 'webp' and not features.check('webp'):
+            logger.warning("当前 Pillow 不支持 WebP，改用 JPEG")
+            self.format = 'jpeg'
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.max_edge or self.grayscale or self.format != 'original')
+
+    def target_size(self, size: tuple) -> tuple:
+        """缩小后的尺寸（保持宽高比）"""
+        width, height = size
+        long_edge = max(width, height)
+        if not self.max_edge or long_edge <= self.max_edge:
+            return size
+        ratio = self.max_edge / long_edge
+        return max(1, round(width * ratio)), max(1, round(height * ratio))
+
+    def apply(self, screenshot: RemoteScreenshot) -> RemoteScreenshot:
+        """
+        按策略处理截图
+
+        Returns:
+            处理后的截图，scale 为设备像素 / 截图像素的比例；
+            策略未启用或无需处理时返回原截图
+        """
+        if not self.enabled:
+            return screenshot
+
+        size = screenshot.size
+        target = self.target_size(size)
+        if target == size and not self.grayscale and self.format == 'original':
+            return screenshot
+
+        image = Image.open(BytesIO(screenshot.data))
+        if image.format == 'JPEG' and target != size:
+            # 在解码阶段按 1/2~1/8 缩小，只解码需要的像素
+            image.draft('L' if self.grayscale else 'RGB', target)
+        image = image.convert('L' if self.grayscale else 'RGB')
+        if image.size != target:
+            image = image.resize(target, Image.LANCZOS)
+
+        if self.format == 'original':
+            pil_format, mime_type = FORMATS['webp'] if screenshot.mime_type == 'image/webp' else FORMATS['jpeg']
+        else:
+            pil_format, mime_type = FORMATS[self.format]
+
+        buffer = BytesIO()
+        image.save(buffer, format=pil_format, quality=self.quality)
+
+        result = RemoteScreenshot(buffer.getvalue(), mime_type)
+        # 原截图可能已在手机端缩小（scale 参数或 X-Screen-Width），两次缩放相乘
+        result.scale = screenshot.scale * size[0] / target[0]
+        return result
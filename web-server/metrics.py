@@ -0,0 +1,241 @@
+"""
+运行指标模块
+提供滑动窗口统计，用于队列等待、截图、动作等耗时指标；
+以及累计的直方图、计数器和仪表，以 Prometheus 文本格式输出
+"""
+
+import logging
+import threading
+from collections import deque
+from typing import Callable, Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+
+class RollingStats:
+    """
+    滑动窗口统计
+
+    保留最近 window 个样本计算分位数，同时累计全部样本的数量和总和。
+    """
+
+    def __init__(self, window: int = 1000):
+        self._lock = threading.Lock()
+        self._samples: deque = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, value: float):
+        """记录一个样本"""
+        with self._lock:
+            self._samples.append(value)
+            self.count += 1
+            self.total += value
+
+    @staticmethod
+    def _percentile(sorted_values: list, q: float) -> Optional[float]:
+        if not sorted_values:
+            return None
+        index = min(int(round(q * (len(sorted_values) - 1))), len(sorted_values) - 1)
+        return sorted_values[index]
+
+    def percentile(self, q: float) -> Optional[float]:
+        """窗口内的分位数（q 取 0~1）"""
+        with self._lock:
+            values = sorted(self._samples)
+        return self._percentile(values, q)
+
+    def snapshot(self) -> dict:
+        """
+        获取统计摘要
+
+        Returns:
+            count / avg 为全部样本，p50 / p95 / p99 / max 为窗口内样本
+        """
+        with self._lock:
+            values = sorted(self._samples)
+            count = self.count
+            total = self.total
+
+        def rounded(value):
+            return round(value, 2) if value is not None else None
+
+        return {
+            'count': count,
+            'avg': rounded(total / count) if count else None,
+            'p50': rounded(self._percentile(values, 0.50)),
+            'p95': rounded(self._percentile(values, 0.95)),
+            'p99': rounded(self._percentile(values, 0.99)),
+            'max': rounded(values[-1]) if values else None,
+        }
+
+    def histogram(self, bounds: Sequence[float]) -> dict:
+        """
+        窗口内样本的累计直方图
+
+        Args:
+            bounds: 递增的桶上界
+
+        Returns:
+            {上界: 小于等于该值的样本数}，最后一个桶为 '+Inf'
+        """
+        with self._lock:
+            values = list(self._samples)
+
+        buckets = {}
+        for bound in bounds:
+            buckets[str(bound)] = sum(1 for value in values if value <= bound)
+        buckets['+Inf'] = len(values)
+        return buckets
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in zip(names, values)
+    ]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Histogram:
+    """
+    Prometheus 直方图（从进程启动开始累计，与 RollingStats 的滑动窗口不同）
+
+    Args:
+        name: 指标名称
+        documentation: 说明（HELP）
+        buckets: 递增的桶上界
+        labelnames: 标签名称
+    """
+
+    def __init__(self, name: str, documentation: str, buckets: Sequence[float],
+                 labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets))
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        # 标签值 -> [各桶计数..., 总数, 总和]
+        self._series: Dict[tuple, list] = {}
+
+    def observe(self, value: float, *labelvalues: str):
+        """记录一个样本（标签值按 labelnames 顺序传入）"""
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [0] * len(self.buckets) + [0, 0.0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def collect(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((labels, list(values)) for labels, values in self._series.items())
+        for labelvalues, values in series:
+            for bound, count in zip(self.buckets, values):
+                labels = _format_labels(self.labelnames, labelvalues, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{labels} {count}")
+            labels = _format_labels(self.labelnames, labelvalues, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{labels} {values[-2]}")
+            labels = _format_labels(self.labelnames, labelvalues)
+            lines.append(f"{self.name}_count{labels} {values[-2]}")
+            lines.append(f"{self.name}_sum{labels} {_format_value(round(values[-1], 6))}")
+        return lines
+
+
+class Counter:
+    """Prometheus 计数器"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, *labelvalues: str, amount: float = 1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def collect(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        for labelvalues, value in values:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_value(value)}")
+        return lines
+
+
+class Gauge:
+    """
+    Prometheus 仪表，渲染时调用 callback 读取当前值
+
+    Args:
+        callback: 无标签时返回数值；有标签时返回 {标签值元组: 数值}
+    """
+
+    def __init__(self, name: str, documentation: str, callback: Callable[[], object],
+                 labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+        self.labelnames = tuple(labelnames)
+
+    def collect(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        values = self.callback()
+        if not self.labelnames:
+            values = {(): values}
+        for labelvalues, value in sorted(values.items()):
+            if value is None:
+                continue
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_value(value)}")
+        return lines
+
+
+class MetricsRegistry:
+    """指标注册表，按注册顺序渲染为 Prometheus 文本格式"""
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        """注册指标；同名指标已存在时返回已注册的实例"""
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def unregister(self, name: str):
+        with self._lock:
+            self._metrics.pop(name, None)
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            try:
+                lines.extend(metric.collect())
+            except Exception as e:
+                logger.warning(f"指标 {metric.name} 采集失败: {e}")
+        return '\n'.join(lines) + '\n'
+
+
+# Prometheus 文本格式的 Content-Type
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# 全局注册表，由 /metrics 渲染
+REGISTRY = MetricsRegistry()
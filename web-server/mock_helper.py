@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+AutoGLM Helper 模拟服务器
+在没有手机的情况下提供与 Android Helper 相同的 HTTP 接口，用于调试和压测
+
+用法:
+    python mock_helper.py --port 8080
+    python mock_helper.py --port 8080 --legacy      # 不提供 /screenshot.jpg、/batch 和 /ws（模拟旧版 Helper）
+    python mock_helper.py --latency 40 --jitter 15 --frame-kb 300   # 模拟网络延迟和较大的截图
+
+然后设置 PHONE_HELPER_URL=http://127.0.0.1:8080
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+import logging
+import random
+import struct
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from urllib.parse import parse_qs, urlparse
+
+from PIL import Image, ImageDraw
+
+logger = logging.getLogger('mock_helper')
+
+_WEBSOCKET_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+OPCODE_TEXT, OPCODE_BINARY, OPCODE_CLOSE, OPCODE_PING, OPCODE_PONG = 0x1, 0x2, 0x8, 0x9, 0xA
+
+
+def read_ws_frame(stream):
+    """读取一个客户端 WebSocket 帧（客户端帧带掩码），连接关闭时返回 None"""
+    header = stream.read(2)
+    if len(header) < 2:
+        return None
+    opcode = header[0] & 0x0F
+    length = header[1] & 0x7F
+    if length == 126:
+        length = struct.unpack('>H', stream.read(2))[0]
+    elif length == 127:
+        length = struct.unpack('>Q', stream.read(8))[0]
+    mask = stream.read(4) if header[1] & 0x80 else None
+    payload = stream.read(length) if length else b''
+    if mask:
+        repeated = (mask * (length // 4 + 1))[:length]
+        payload = (int.from_bytes(payload, 'big') ^ int.from_bytes(repeated, 'big')).to_bytes(length, 'big')
+    return opcode, payload
+
+
+def encode_ws_frame(opcode: int, payload: bytes) -> bytes:
+    """编码服务端 WebSocket 帧（不带掩码）"""
+    length = len(payload)
+    if length < 126:
+        header = struct.pack('>BB', 0x80 | opcode, length)
+    elif length < 65536:
+        header = struct.pack('>BBH', 0x80 | opcode, 126, length)
+    else:
+        header = struct.pack('>BBQ', 0x80 | opcode, 127, length)
+    return header + payload
+
+
+def pad_jpeg(data: bytes, size: int) -> bytes:
+    """在 SOI 之后插入注释段（COM），把 JPEG 填充到至少 size 字节，图片内容不变"""
+    missing = size - len(data)
+    segments = []
+    while missing > 4:
+        length = min(missing - 2, 65535)
+        segments.append(struct.pack('>BBH', 0xFF, 0xFE, length) + b'\0' * (length - 2))
+        missing -= length + 2
+    return data[:2] + b''.join(segments) + data[2:] if segments else data
+
+
+class MockPhone:
+    """
+    模拟手机屏幕状态
+
+    每次点击、滑动、输入都会改变画面（模拟页面跳转），
+    编码后的截图按 (画面版本, 质量, 缩放) 缓存
+
+    Args:
+        frame_bytes: 截图最小字节数，不足时用 JPEG 注释段填充（模拟内容复杂的真实截图）
+    """
+
+    def __init__(self, width: int = 1080, height: int = 2400, frame_bytes: int = 0):
+        self.width = width
+        self.height = height
+        self.frame_bytes = frame_bytes
+        self.version = 0
+        self.actions = []
+        self._lock = threading.Lock()
+        self._cache = {}
+
+    def apply(self, action: dict):
+        """记录动作并切换画面"""
+        with self._lock:
+            self.actions.append(action)
+            self.version += 1
+            self._cache.clear()
+
+    def render(self) -> Image.Image:
+        """绘制当前画面：色块 + 文字行，画面版本不同则内容不同"""
+        image = Image.new('RGB', (self.width, self.height), (245, 245, 245))
+        draw = ImageDraw.Draw(image)
+        hue = (self.version * 47) % 255
+        draw.rectangle([0, 0, self.width, self.height // 10], fill=(hue, 120, 255 - hue))
+        row_height = self.height // 24
+        for row in range(2, 24):
+            y = row * row_height
+            shade = (row * 13 + self.version * 29) % 200
+            draw.rectangle([40, y + 8, self.width - 40, y + row_height - 8], fill=(shade, shade, 230))
+            draw.text((60, y + 16), f"page {self.version} item {row}", fill=(0, 0, 0))
+        return image
+
+    def jpeg(self, quality: int = 80, scale: float = 1.0) -> bytes:
+        """当前画面的 JPEG 字节"""
+        key = (self.version, quality, scale)
+        with self._lock:
+            data = self._cache.get(key)
+        if data is not None:
+            return data
+
+        image = self.render()
+        if scale < 1.0:
+            size = (max(1, round(self.width * scale)), max(1, round(self.height * scale)))
+            image = image.resize(size, Image.BILINEAR)
+        buffer = BytesIO()
+        image.save(buffer, format='JPEG', quality=quality)
+        data = pad_jpeg(buffer.getvalue(), round(self.frame_bytes * scale * scale))
+        with self._lock:
+            self._cache[key] = data
+        return data
+
+
+def make_handler(phone: MockPhone, legacy: bool = False, latency_ms: float = 0, jitter_ms: float = 0):
+    """
+    创建绑定到指定模拟手机的请求处理类
+
+    Args:
+        latency_ms: 每个请求的处理延迟（毫秒），模拟网络往返和手机端耗时
+        jitter_ms: 延迟的随机波动范围（±毫秒）
+    """
+
+    def delay():
+        if latency_ms or jitter_ms:
+            time.sleep(max(0.0, latency_ms + random.uniform(-jitter_ms, jitter_ms)) / 1000)
+
+    class MockHelperHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # 支持 keep-alive
+
+        def log_message(self, format, *args):
+            logger.debug(format % args)
+
+        def _send(self, status: int, body: bytes, content_type: str, headers: dict = None):
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, str(value))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _send_json(self, data: dict, status: int = 200):
+            self._send(status, json.dumps(data).encode(), 'application/json')
+
+        def _read_json(self) -> dict:
+            length = int(self.headers.get('Content-Length') or 0)
+            body = self.rfile.read(length) if length else b''
+            return json.loads(body or b'{}')
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            query = parse_qs(url.query)
+            if url.path != '/ws':
+                delay()
+
+            if url.path == '/ws' and not legacy and self.headers.get('Upgrade', '').lower() == 'websocket':
+                self._serve_websocket()
+            elif url.path == '/status':
+                self._send_json(status())
+            elif url.path == '/screenshot':
+                image = base64.b64encode(phone.jpeg()).decode()
+                self._send_json({'success': True, 'image': image, 'format': 'base64'})
+            elif url.path == '/screenshot.jpg' and not legacy:
+                quality, scale = screenshot_params(query.get('quality', [80])[0], query.get('scale', [1.0])[0])
+                self._send(200, phone.jpeg(quality, scale), 'image/jpeg', {
+                    'X-Screen-Width': phone.width,
+                    'X-Screen-Height': phone.height,
+                })
+            else:
+                self._send_json({'error': 'Not found'}, 404)
+
+        def do_POST(self):
+            url = urlparse(self.path)
+            delay()
+            try:
+                data = self._read_json()
+            except ValueError:
+                self._send_json({'error': 'Invalid JSON'}, 400)
+                return
+
+            if url.path in ('/tap', '/swipe', '/input'):
+                phone.apply(dict(data, type=url.path[1:]))
+                self._send_json({'success': True})
+            elif url.path == '/batch' and not legacy:
+                self._send_json(run_batch(data.get('ops', []), data.get('stop_on_error', True)))
+            else:
+                self._send_json({'error': 'Not found'}, 404)
+
+        def _serve_websocket(self):
+            """WebSocket 控制通道，协议与 Android Helper 的 ControlSocket 相同"""
+            key = self.headers.get('Sec-WebSocket-Key', '')
+            accept = base64.b64encode(hashlib.sha1((key + _WEBSOCKET_GUID).encode()).digest()).decode()
+            self.send_response(101, 'Switching Protocols')
+            self.send_header('Upgrade', 'websocket')
+            self.send_header('Connection', 'Upgrade')
+            self.send_header('Sec-WebSocket-Accept', accept)
+            self.end_headers()
+            self.wfile.flush()
+            self.close_connection = True
+
+            def send(opcode: int, payload: bytes):
+                self.wfile.write(encode_ws_frame(opcode, payload))
+                self.wfile.flush()
+
+            send(OPCODE_TEXT, json.dumps(dict(status(), event='status')).encode())
+            while True:
+                frame = read_ws_frame(self.rfile)
+                if frame is None:
+                    break
+                opcode, payload = frame
+                if opcode == OPCODE_CLOSE:
+                    send(OPCODE_CLOSE, payload[:2])
+                    break
+                if opcode == OPCODE_PING:
+                    send(OPCODE_PONG, payload)
+                elif opcode == OPCODE_TEXT:
+                    delay()
+                    request = json.loads(payload)
+                    request_id = request.get('id', 0)
+                    op = request.get('op')
+                    if op == 'screenshot':
+                        quality, scale = screenshot_params(request.get('quality', 80), request.get('scale', 1.0))
+                        header = struct.pack('>iii', request_id, phone.width, phone.height)
+                        send(OPCODE_BINARY, header + phone.jpeg(quality, scale))
+                        continue
+                    if op == 'status':
+                        response = dict(status(), success=True)
+                    elif op in ('tap', 'swipe', 'input'):
+                        phone.apply({k: v for k, v in request.items() if k not in ('id', 'op')})
+                        response = {'success': True}
+                    elif op == 'batch':
+                        response = run_batch(request.get('ops', []), request.get('stop_on_error', True))
+                    else:
+                        response = {'success': False, 'error': 'Unknown op'}
+                    response['id'] = request_id
+                    send(OPCODE_TEXT, json.dumps(response).encode())
+
+    def status() -> dict:
+        return {
+            'status': 'ok',
+            'service': 'AutoGLM Helper (mock)',
+            'version': '1.0.0',
+            'accessibility_enabled': True,
+        }
+
+    def screenshot_params(quality, scale):
+        return min(100, max(1, int(quality))), min(1.0, max(0.1, float(scale)))
+
+    def run_batch(ops: list, stop_on_error: bool) -> dict:
+        """按顺序执行批量操作，返回每一步的结果"""
+        results = []
+        for op in ops:
+            op_type = op.get('type')
+            if op_type in ('tap', 'swipe', 'input'):
+                phone.apply(dict(op))
+                results.append({'success': True})
+            elif op_type == 'wait':
+                time.sleep(min(max(op.get('ms', 0), 0), 5000) / 1000)
+                results.append({'success': True})
+            else:
+                results.append({'success': False, 'error': 'Unknown op type'})
+                if stop_on_error:
+                    break
+        return {
+            'success': all(result['success'] for result in results),
+            'results': results,
+        }
+
+    return MockHelperHandler
+
+
+def create_server(host: str = '127.0.0.1', port: int = 8080, phone: MockPhone = None,
+                  legacy: bool = False, latency_ms: float = 0, jitter_ms: float = 0) -> ThreadingHTTPServer:
+    """创建模拟服务器（port=0 时自动分配端口，见 server.server_address）"""
+    phone = phone or MockPhone()
+    server = ThreadingHTTPServer((host, port), make_handler(phone, legacy, latency_ms, jitter_ms))
+    server.daemon_threads = True
+    server.phone = phone
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='AutoGLM Helper 模拟服务器')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--width', type=int, default=1080, help='屏幕宽度（像素）')
+    parser.add_argument('--height', type=int, default=2400, help='屏幕高度（像素）')
+    parser.add_argument('--legacy', action='store_true', help='不提供 /screenshot.jpg、/batch 和 /ws（模拟旧版 Helper）')
+    parser.add_argument('--latency', type=float, default=0, help='每个请求的延迟（毫秒）')
+    parser.add_argument('--jitter', type=float, default=0, help='延迟的随机波动（±毫秒）')
+    parser.add_argument('--frame-kb', type=int, default=0, help='全尺寸截图的最小大小（KB）')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    phone = MockPhone(args.width, args.height, args.frame_kb * 1024)
+    server = create_server(args.host, args.port, phone, args.legacy, args.latency, args.jitter)
+    print(f"📱 模拟 Helper 已启动: http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -3,25 +3,41 @@ PhoneController 适配器
 将 PhoneControllerRemote（HTTP）适配为 device_factory 接口
 """
 
-import base64
 import logging
-from io import BytesIO
-from dataclasses import dataclass
-from typing import Optional
-from PIL import Image
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
 
-from phone_controller_remote import PhoneControllerRemote
+from phone_controller_remote import PhoneControllerRemote, RemoteScreenshot
+from image_policy import ImagePolicy
+from settle import (
+    FixedSettle, SettleDetector, SettleResult, MIN_CAPTURE_INTERVAL, PROBE_QUALITY, PROBE_SCALE
+)
+from metrics import RollingStats
+from tracing import record, span
 
 logger = logging.getLogger(__name__)
 
+# 截图数据：提供 image / width / height / base64_data，
+# base64_data 直接来自 Helper 返回的压缩字节，不再重新编码为 PNG
+Screenshot = RemoteScreenshot
 
-@dataclass
-class Screenshot:
-    """截图数据"""
-    image: Image.Image
-    width: int
-    height: int
-    base64_data: str
+# 双击两次点击之间的间隔（毫秒）
+DOUBLE_TAP_INTERVAL_MS = 100
+
+
+class PrefetchResult:
+    """等待界面稳定后获取的截图，以及稳定、截图和等待结果的耗时（毫秒）"""
+
+    __slots__ = ('screenshot', 'settle_ms', 'capture_ms', 'wait_ms', 'recorded')
+
+    def __init__(self, screenshot: Screenshot, settle_ms: float, capture_ms: float):
+        self.screenshot = screenshot
+        self.settle_ms = settle_ms
+        self.capture_ms = capture_ms
+        self.wait_ms = 0.0      # 步骤线程为等待结果阻塞的总时间（peek 和 get_screenshot 累计）
+        self.recorded = False   # 稳定耗时是否已计入某个步骤的 settle 阶段
 
 
 class PhoneControllerAdapter:
@@ -31,44 +47,288 @@ class PhoneControllerAdapter:
     这样 PhoneAgent 就能通过 HTTP 控制手机，而不需要 ADB
     """
 
-    def __init__(self, phone_controller: PhoneControllerRemote):
+    def __init__(self, phone_controller: PhoneControllerRemote, settle_mode: str = 'fixed',
+                 settle_delay: float = 0.5, settle_max_wait: float = 1.5,
+                 image_policy: Optional[ImagePolicy] = None, prefetch: bool = True):
+        """
+        Args:
+            phone_controller: 远程手机控制器
+            settle_mode: fixed（固定等待 settle_delay）或 adaptive（探测帧稳定检测）
+            settle_delay: fixed 模式下截图前的等待时间（秒）
+            settle_max_wait: adaptive 模式下的最长等待时间（秒）
+            image_policy: 发给模型前的截图处理策略（缩小、灰度、重新编码）
+            prefetch: 动作后是否在后台等待界面稳定并预取截图；
+                关闭时在下一次 get_screenshot 中同步等待（用于对比预取节省的时间）
+        """
         self.controller = phone_controller
+        self.image_policy = image_policy or ImagePolicy()
+        # 最近一次提供给模型的截图相对设备像素的缩放比例，用于换算动作坐标
+        self.screen_scale = 1.0
+
+        # 动作后等待界面稳定
+        if settle_mode == 'fixed':
+            self.settle_detector = FixedSettle(settle_delay)
+        else:
+            self.settle_detector = SettleDetector(self._probe, self._capture, max_wait=settle_max_wait)
+
+        # 最近一次动作类型，用于按动作统计稳定耗时
+        self._last_action: Optional[str] = None
+        self.settle_stats: Dict[str, RollingStats] = {}
+        self.settle_listeners: List[Callable[[str, SettleResult], None]] = []
+
+        # 截图往返耗时（毫秒），用于按延迟分配任务
+        self.capture_stats = RollingStats(window=50)
+
+        # 上一次截图（含探测）的时间，两次截图之间至少间隔 MIN_CAPTURE_INTERVAL
+        self._last_capture_at = 0.0
+        self._capture_lock = threading.Lock()
+        # 最近一次全尺寸截图（未经 image_policy 处理），作为下一次稳定检测的动作前画面
+        self._last_frame: Optional[Screenshot] = None
+
+        # 截图预取：动作完成后在后台等待界面稳定并截图，与日志、持久化等工作重叠
+        self.prefetch = prefetch
+        self._prefetch_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='screenshot-prefetch')
+        self._prefetch: Optional[Future] = None
+        self._prefetch_lock = threading.Lock()
+
+        self.last_screenshot: Optional[Screenshot] = None
+        self.last_screenshot_timing: Optional[dict] = None
         logger.info("PhoneControllerAdapter 初始化完成")
 
+    def _throttle(self):
+        """等待到距离上一次截图至少 MIN_CAPTURE_INTERVAL（Android 会拒绝过快的截图请求）"""
+        with self._capture_lock:
+            now = time.monotonic()
+            ready_at = max(now, self._last_capture_at + MIN_CAPTURE_INTERVAL)
+            self._last_capture_at = ready_at
+        if ready_at > now:
+            time.sleep(ready_at - now)
+
+    def _capture(self) -> Screenshot:
+        self._throttle()
+        start = time.monotonic()
+        screenshot = self.controller.screenshot_raw()
+        if not screenshot:
+            raise Exception("截图失败")
+        self.capture_stats.add((time.monotonic() - start) * 1000)
+        self._last_frame = screenshot
+        return screenshot
+
+    def _probe(self) -> Screenshot:
+        """界面稳定检测的低分辨率探测截图（在手机端缩小）"""
+        self._throttle()
+        screenshot = self.controller.screenshot_raw(quality=PROBE_QUALITY, scale=PROBE_SCALE)
+        if not screenshot:
+            raise Exception("探测截图失败")
+        return screenshot
+
+    def _settle(self, max_wait: float = None) -> SettleResult:
+        """
+        等待界面稳定并按最近的动作类型记录耗时
+
+        可能在预取线程中执行（没有正在记录的步骤），settle 阶段由使用结果的步骤记录
+        """
+        result = self.settle_detector.wait(max_wait, reference=self._last_frame)
+        action = self._last_action or 'none'
+        self._last_action = None
+
+        stats = self.settle_stats.get(action)
+        if stats is None:
+            stats = self.settle_stats.setdefault(action, RollingStats())
+        stats.add(result.elapsed_ms)
+        for listener in self.settle_listeners:
+            try:
+                listener(action, result)
+            except Exception as e:
+                logger.debug(f"稳定耗时回调失败: {e}")
+        return result
+
+    def _settle_and_capture(self, max_wait: float = None) -> PrefetchResult:
+        """等待界面稳定并返回全尺寸截图（稳定检测没有得到全尺寸帧时再截一次）"""
+        result = self._settle(max_wait)
+        start = time.monotonic()
+        screenshot = result.screenshot or self._capture()
+        with span('screenshot.encode'):
+            screenshot = self.image_policy.apply(screenshot)
+        return PrefetchResult(screenshot, result.elapsed_ms, (time.monotonic() - start) * 1000)
+
+    def _to_device(self, x: int, y: int) -> tuple:
+        """将截图坐标换算为设备像素坐标"""
+        if self.screen_scale == 1.0:
+            return x, y
+        return round(x * self.screen_scale), round(y * self.screen_scale)
+
+    def _settle_now(self, action: str, max_wait: float):
+        """
+        动作后同步等待界面稳定（最多 max_wait 秒），代替固定 sleep
+        稳定后的画面作为已完成的预取结果，下一次 get_screenshot 直接使用
+        """
+        self._last_action = action
+        try:
+            result = self._settle_and_capture(max_wait)
+        except Exception as e:
+            logger.warning(f"等待界面稳定失败: {e}")
+            return
+        # 在当前线程中同步等待，直接计入当前步骤
+        record('settle', result.settle_ms)
+        result.recorded = True
+        result.wait_ms = result.settle_ms + result.capture_ms
+        future = Future()
+        future.set_result(result)
+        with self._prefetch_lock:
+            self._prefetch = future
+
+    def prefetch_screenshot(self):
+        """
+        在后台开始获取下一帧截图（先等待界面稳定）
+        下一次 get_screenshot 直接使用预取结果；未开启预取时不做任何事
+        """
+        if self.prefetch:
+            self._start_prefetch()
+
+    def _start_prefetch(self):
+        with self._prefetch_lock:
+            if self._prefetch is None:
+                self._prefetch = self._prefetch_executor.submit(self._settle_and_capture)
+
+    def peek_screenshot(self, timeout: int = 10) -> Screenshot:
+        """
+        查看下一帧截图但不消费：结果保留为预取结果，下一次 get_screenshot 直接使用
+        """
+        self._start_prefetch()
+        with self._prefetch_lock:
+            future = self._prefetch
+        return self._wait_prefetch(future, timeout).screenshot
+
+    def _wait_prefetch(self, future: Future, timeout: float) -> PrefetchResult:
+        """
+        等待预取结果：阻塞的时间记为 screenshot.wait，
+        界面稳定耗时在第一次使用结果时计入当前步骤的 settle 阶段
+        """
+        start = time.monotonic()
+        with span('screenshot.wait'):
+            result = future.result(timeout=timeout)
+        result.wait_ms += (time.monotonic() - start) * 1000
+        if not result.recorded:
+            result.recorded = True
+            record('settle', result.settle_ms)
+        return result
+
+    def reset(self):
+        """新任务开始：丢弃预取结果和上一个任务的截图状态"""
+        self.cancel_prefetch()
+        self._last_action = None
+        self.last_screenshot = None
+        self.last_screenshot_timing = None
+
+    def cancel_prefetch(self):
+        """丢弃预取结果（界面已被新的动作改变）"""
+        with self._prefetch_lock:
+            future, self._prefetch = self._prefetch, None
+        if future is not None:
+            future.cancel()
+
+    def _use_screenshot(self, screenshot: Screenshot, timing: dict):
+        """记录提供给模型的截图；之后的动作坐标按它的缩放比例换算"""
+        timing['bytes'] = len(screenshot.data)
+        self.screen_scale = screenshot.scale
+        self.last_screenshot = screenshot
+        self.last_screenshot_timing = timing
+
     def get_screenshot(self, device_id: str = None, timeout: int = 10) -> Screenshot:
-        """获取屏幕截图"""
+        """获取屏幕截图（有预取结果时直接使用）"""
+        with self._prefetch_lock:
+            future, self._prefetch = self._prefetch, None
+        if future is None:
+            if not self.prefetch and self._last_action is not None:
+                # 未开启预取：动作后的界面稳定等待在这里同步执行
+                return self._settle_now_and_use()
+            self._last_action = None
+            prefetched = None
+        else:
+            # 等待预取结果不计入 screenshot 阶段（已计入 settle 和 screenshot.wait）
+            try:
+                prefetched = self._wait_prefetch(future, timeout)
+            except Exception as e:
+                logger.warning(f"预取截图失败，重新截图: {e}")
+                prefetched = None
+
+        with span('screenshot'):
+            if prefetched is not None:
+                self._use_screenshot(prefetched.screenshot, {
+                    'prefetched': self.prefetch,
+                    'settle_ms': round(prefetched.settle_ms, 1),
+                    'capture_ms': round(prefetched.capture_ms, 1),
+                    'wait_ms': round(prefetched.wait_ms, 1),
+                })
+                return prefetched.screenshot
+            return self._capture_now()
+
+    def _settle_now_and_use(self) -> Screenshot:
+        start = time.monotonic()
         try:
-            image = self.controller.screenshot()
-            if not image:
-                raise Exception("截图失败")
-
-            # 转换为 Base64
-            buffer = BytesIO()
-            image.save(buffer, format='PNG')
-            base64_data = base64.b64encode(buffer.getvalue()).decode()
-
-            return Screenshot(
-                image=image,
-                width=image.width,
-                height=image.height,
-                base64_data=base64_data
-            )
+            result = self._settle_and_capture()
+        except Exception as e:
+            logger.warning(f"等待界面稳定失败，重新截图: {e}")
+            with span('screenshot'):
+                return self._capture_now()
+        record('settle', result.settle_ms)
+        with span('screenshot'):
+            self._use_screenshot(result.screenshot, {
+                'prefetched': False,
+                'settle_ms': round(result.settle_ms, 1),
+                'capture_ms': round(result.capture_ms, 1),
+                'wait_ms': round((time.monotonic() - start) * 1000, 1),
+            })
+        return result.screenshot
+
+    def _capture_now(self) -> Screenshot:
+        start = time.monotonic()
+        try:
+            screenshot = self._capture()
+            with span('screenshot.encode'):
+                screenshot = self.image_policy.apply(screenshot)
         except Exception as e:
             logger.error(f"获取截图失败: {e}")
             raise
+        capture_ms = (time.monotonic() - start) * 1000
+        self._use_screenshot(screenshot, {
+            'prefetched': False,
+            'settle_ms': 0.0,
+            'capture_ms': round(capture_ms, 1),
+            'wait_ms': round(capture_ms, 1),
+        })
+        return screenshot
 
     def get_current_app(self, device_id: str = None) -> str:
         """获取当前应用名称"""
         # HTTP 接口暂不支持，返回空字符串
         return ""
 
+    def _run_batch(self, ops: List[dict], action: str, delay: float = None) -> List[bool]:
+        """发送批量动作（Helper 不支持时由控制器逐个执行）"""
+        self.cancel_prefetch()
+        try:
+            with span('action'):
+                results = self.controller.batch(ops)
+        except Exception as e:
+            logger.error(f"批量动作失败: {e}")
+            return [False] * len(ops)
+
+        self._last_action = action
+        if delay:
+            self._settle_now(action, delay)
+        return results
+
     def tap(self, x: int, y: int, device_id: str = None, delay: float = None):
         """点击坐标"""
+        self.cancel_prefetch()
         try:
-            success = self.controller.tap(x, y)
+            with span('action'):
+                success = self.controller.tap(*self._to_device(x, y))
+            self._last_action = 'tap'
             if delay:
-                import time
-                time.sleep(delay)
+                self._settle_now('tap', delay)
             return success
         except Exception as e:
             logger.error(f"点击失败 ({x}, {y}): {e}")
@@ -76,27 +336,38 @@ class PhoneControllerAdapter:
 
     def double_tap(self, x: int, y: int, device_id: str = None, delay: float = None):
         """双击坐标"""
-        # 通过两次点击模拟双击
-        self.tap(x, y, device_id)
-        import time
-        time.sleep(0.1)
-        return self.tap(x, y, device_id, delay)
+        # 两次点击和间隔作为一个批量请求发送，间隔在手机端执行，只需一次往返
+        x, y = self._to_device(x, y)
+        ops = [
+            {'type': 'tap', 'x': x, 'y': y},
+            {'type': 'wait', 'ms': DOUBLE_TAP_INTERVAL_MS},
+            {'type': 'tap', 'x': x, 'y': y},
+        ]
+        return all(self._run_batch(ops, 'double_tap', delay))
 
     def long_press(self, x: int, y: int, duration_ms: int = 3000, device_id: str = None, delay: float = None):
         """长按坐标"""
         # HTTP 接口暂不支持长按，使用普通点击代替
         logger.warning("长按操作暂不支持，使用普通点击代替")
-        return self.tap(x, y, device_id, delay)
+        success = self.tap(x, y, device_id)
+        self._last_action = 'long_press'
+        if delay:
+            self._settle_now('long_press', delay)
+        return success
 
     def swipe(self, start_x: int, start_y: int, end_x: int, end_y: int,
               duration_ms: int = None, device_id: str = None, delay: float = None):
         """滑动手势"""
+        duration = duration_ms or 300
+        start_x, start_y = self._to_device(start_x, start_y)
+        end_x, end_y = self._to_device(end_x, end_y)
+        self.cancel_prefetch()
         try:
-            duration = duration_ms or 300
-            success = self.controller.swipe(start_x, start_y, end_x, end_y, duration)
+            with span('action'):
+                success = self.controller.swipe(start_x, start_y, end_x, end_y, duration)
+            self._last_action = 'swipe'
             if delay:
-                import time
-                time.sleep(delay)
+                self._settle_now('swipe', delay)
             return success
         except Exception as e:
             logger.error(f"滑动失败: {e}")
@@ -122,8 +393,12 @@ class PhoneControllerAdapter:
 
     def type_text(self, text: str, device_id: str = None):
         """输入文字"""
+        self.cancel_prefetch()
         try:
-            return self.controller.input_text(text)
+            with span('action'):
+                success = self.controller.input_text(text)
+            self._last_action = 'type'
+            return success
         except Exception as e:
             logger.error(f"输入文字失败: {e}")
             return False
@@ -0,0 +1,356 @@
+"""
+异步远程手机控制器
+基于 aiohttp，一个事件循环即可同时驱动多台手机的 HTTP 请求；
+SyncPhoneController 在共享的后台事件循环上执行，提供与 PhoneControllerRemote 相同的同步接口
+"""
+
+import asyncio
+import base64
+import logging
+import os
+import threading
+from typing import Dict, List, Optional
+
+from phone_controller_remote import DEFAULT_TIMEOUTS, RemoteScreenshot, scale_from_headers
+from tracing import span
+
+try:
+    import aiohttp
+    AIOHTTP_AVAILABLE = True
+except ImportError:
+    aiohttp = None
+    AIOHTTP_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncPhoneControllerRemote:
+    """异步远程手机控制器"""
+
+    def __init__(self, helper_url: Optional[str] = None,
+                 pool_size: Optional[int] = None,
+                 timeouts: Optional[Dict[str, float]] = None,
+                 max_retries: Optional[int] = None,
+                 backoff_factor: Optional[float] = None):
+        """
+        初始化异步控制器（不发起网络请求，首次请求时创建连接池）
+
+        参数含义与 PhoneControllerRemote 相同
+        """
+        if not AIOHTTP_AVAILABLE:
+            raise ImportError("异步控制器需要 aiohttp，请执行: pip install aiohttp")
+
+        self.helper_url = helper_url or os.getenv('PHONE_HELPER_URL', 'http://localhost:8080')
+        self.pool_size = pool_size or int(os.getenv('PHONE_HTTP_POOL_SIZE', '4'))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv('PHONE_HTTP_RETRIES', '2'))
+        self.backoff_factor = (backoff_factor if backoff_factor is not None
+                               else float(os.getenv('PHONE_HTTP_BACKOFF', '0.3')))
+        self.connect_timeout = float(os.getenv('PHONE_CONNECT_TIMEOUT', '3'))
+        self.timeouts = dict(DEFAULT_TIMEOUTS)
+        if timeouts:
+            self.timeouts.update(timeouts)
+
+        self._session: Optional['aiohttp.ClientSession'] = None
+        self._stats = {'requests': 0, 'new_connections': 0, 'reused_connections': 0}
+        # Helper 是否支持二进制截图接口 / 批量动作接口（None 表示尚未探测）
+        self.binary_screenshot: Optional[bool] = None
+        self.batch_supported: Optional[bool] = None
+
+    def _create_session(self) -> 'aiohttp.ClientSession':
+        trace = aiohttp.TraceConfig()
+        trace.on_request_start.append(self._on_request_start)
+        trace.on_connection_create_end.append(self._on_connection_create)
+        trace.on_connection_reuseconn.append(self._on_connection_reuse)
+
+        connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=60)
+        return aiohttp.ClientSession(connector=connector, trace_configs=[trace])
+
+    async def _on_request_start(self, session, context, params):
+        self._stats['requests'] += 1
+
+    async def _on_connection_create(self, session, context, params):
+        self._stats['new_connections'] += 1
+
+    async def _on_connection_reuse(self, session, context, params):
+        self._stats['reused_connections'] += 1
+
+    async def _request(self, method: str, endpoint: str, json: Optional[dict] = None,
+                       params: Optional[dict] = None, raw: bool = False):
+        """
+        发送请求并解析 JSON
+
+        GET 请求失败时按退避重试；POST 只在建立连接失败时重试（请求尚未发出）
+
+        Args:
+            raw: 为 True 时不解析 JSON，返回 (响应体字节, 响应头)
+
+        Returns:
+            (HTTP 状态码, JSON 数据)
+        """
+        if self._session is None or self._session.closed:
+            self._session = self._create_session()
+
+        timeout = aiohttp.ClientTimeout(
+            sock_connect=self.connect_timeout,
+            sock_read=self.timeouts.get(endpoint, 10)
+        )
+        url = f"{self.helper_url}/{endpoint}"
+
+        attempt = 0
+        while True:
+            try:
+                async with self._session.request(method, url, json=json, params=params,
+                                                 timeout=timeout) as response:
+                    if method == 'GET' and response.status in (502, 503, 504) and attempt < self.max_retries:
+                        raise aiohttp.ClientResponseError(
+                            response.request_info, response.history, status=response.status
+                        )
+                    if response.status != 200:
+                        return response.status, None
+                    if raw:
+                        return response.status, (await response.read(), response.headers)
+                    return response.status, await response.json(content_type=None)
+            except (aiohttp.ClientConnectorError, aiohttp.ClientResponseError,
+                    aiohttp.ServerDisconnectedError, asyncio.TimeoutError) as e:
+                retryable = method == 'GET' or isinstance(e, aiohttp.ClientConnectorError)
+                if not retryable or attempt >= self.max_retries:
+                    raise
+                await asyncio.sleep(self.backoff_factor * (2 ** attempt))
+                attempt += 1
+
+    async def get_status(self) -> dict:
+        """获取 Helper 状态，无法访问时抛出异常"""
+        status, data = await self._request('GET', 'status')
+        if status != 200:
+            raise IOError(f"HTTP {status}")
+        return data
+
+    async def test_connection(self) -> bool:
+        """测试与手机的连接"""
+        try:
+            status, data = await self._request('GET', 'status')
+            if status == 200:
+                if data.get('accessibility_enabled'):
+                    logger.info(f"✅ 成功连接到手机 {self.helper_url}，无障碍服务已启用")
+                    return True
+                logger.warning(f"⚠️ 已连接到手机 {self.helper_url}，但无障碍服务未启用")
+                return False
+
+            logger.error(f"连接失败: HTTP {status}")
+            return False
+        except Exception as e:
+            logger.error(f"连接失败: {self.helper_url} ({e})")
+            return False
+
+    async def screenshot_raw(self, quality: Optional[int] = None,
+                             scale: Optional[float] = None) -> Optional[RemoteScreenshot]:
+        """
+        截取手机屏幕，保留原始压缩字节
+        优先使用二进制接口 /screenshot.jpg，旧版 Helper 返回 404 时改用 JSON 接口
+        """
+        if self.binary_screenshot is not False:
+            try:
+                params = {}
+                if quality:
+                    params['quality'] = int(quality)
+                if scale:
+                    params['scale'] = scale
+                status, result = await self._request('GET', 'screenshot.jpg', params=params, raw=True)
+                if status == 200:
+                    self.binary_screenshot = True
+                    data, headers = result
+                    shot = RemoteScreenshot(data, headers.get('Content-Type', '').split(';')[0] or None)
+                    shot.scale = scale_from_headers(headers, shot.width)
+                    return shot
+                if status == 404:
+                    logger.info(f"Helper 不支持二进制截图接口，使用 JSON 接口: {self.helper_url}")
+                    self.binary_screenshot = False
+                elif self.binary_screenshot:
+                    logger.error(f"截图失败: HTTP {status}")
+                    return None
+            except Exception as e:
+                logger.error(f"截图失败: {e}")
+                if self.binary_screenshot:
+                    return None
+
+        try:
+            status, data = await self._request('GET', 'screenshot')
+            if status == 200 and data.get('success'):
+                return RemoteScreenshot(base64.b64decode(data['image']))
+
+            logger.error(f"截图失败: HTTP {status}")
+            return None
+        except Exception as e:
+            logger.error(f"截图失败: {e}")
+            return None
+
+    async def screenshot(self):
+        """截取手机屏幕，返回 PIL.Image"""
+        shot = await self.screenshot_raw()
+        return shot.image if shot else None
+
+    async def _action(self, endpoint: str, payload: dict) -> bool:
+        try:
+            status, data = await self._request('POST', endpoint, json=payload)
+            return bool(status == 200 and data.get('success', False))
+        except Exception as e:
+            logger.error(f"{endpoint} 失败: {e}")
+            return False
+
+    async def tap(self, x: int, y: int) -> bool:
+        """执行点击操作"""
+        return await self._action('tap', {'x': x, 'y': y})
+
+    async def swipe(self, x1: int, y1: int, x2: int, y2: int, duration: int = 300) -> bool:
+        """执行滑动操作"""
+        return await self._action('swipe', {'x1': x1, 'y1': y1, 'x2': x2, 'y2': y2, 'duration': duration})
+
+    async def input_text(self, text: str) -> bool:
+        """输入文字"""
+        return await self._action('input', {'text': text})
+
+    async def batch(self, ops: List[dict], stop_on_error: bool = True) -> List[bool]:
+        """批量执行动作，参数和返回值与 PhoneControllerRemote.batch 相同"""
+        if self.batch_supported is not False:
+            try:
+                status, data = await self._request('POST', 'batch', json={'ops': ops, 'stop_on_error': stop_on_error})
+                if status == 200:
+                    self.batch_supported = True
+                    results = [bool(r.get('success')) for r in data.get('results', [])]
+                    return results + [False] * (len(ops) - len(results))
+                if status != 404:
+                    logger.error(f"批量动作失败: HTTP {status}")
+                    return [False] * len(ops)
+                logger.info(f"Helper 不支持批量动作接口，逐个执行: {self.helper_url}")
+                self.batch_supported = False
+            except Exception as e:
+                logger.error(f"批量动作失败: {e}")
+                return [False] * len(ops)
+
+        results = []
+        for op in ops:
+            op_type = op.get('type')
+            if op_type == 'tap':
+                success = await self.tap(op['x'], op['y'])
+            elif op_type == 'swipe':
+                success = await self.swipe(op['x1'], op['y1'], op['x2'], op['y2'], op.get('duration', 300))
+            elif op_type == 'input':
+                success = await self.input_text(op['text'])
+            elif op_type == 'wait':
+                await asyncio.sleep(op.get('ms', 0) / 1000)
+                success = True
+            else:
+                logger.error(f"未知的批量操作类型: {op_type}")
+                success = False
+
+            results.append(success)
+            if not success and stop_on_error:
+                break
+        return results + [False] * (len(ops) - len(results))
+
+    def get_connection_stats(self) -> dict:
+        """获取连接复用统计"""
+        total = self._stats['requests']
+        reused = self._stats['reused_connections']
+        return {
+            'requests': total,
+            'new_connections': self._stats['new_connections'],
+            'reused_connections': reused,
+            'reuse_ratio': round(reused / total, 3) if total else 0.0,
+            'pool_size': self.pool_size,
+        }
+
+    async def close(self):
+        """关闭连接池"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+
+class EventLoopThread:
+    """在后台线程中运行的事件循环，同步代码通过 run() 提交协程"""
+
+    def __init__(self, name: str = 'phone-io-loop'):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def run(self, coro, timeout: Optional[float] = None):
+        """在事件循环中执行协程并等待结果（不能在事件循环线程内调用）"""
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        return future.result(timeout)
+
+    def stop(self):
+        """停止事件循环"""
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout=5)
+
+
+_shared_loop: Optional[EventLoopThread] = None
+_shared_loop_lock = threading.Lock()
+
+
+def get_event_loop_thread() -> EventLoopThread:
+    """获取所有手机共享的 I/O 事件循环"""
+    global _shared_loop
+    with _shared_loop_lock:
+        if _shared_loop is None:
+            _shared_loop = EventLoopThread()
+        return _shared_loop
+
+
+class SyncPhoneController:
+    """
+    AsyncPhoneControllerRemote 的同步包装
+
+    接口与 PhoneControllerRemote 一致；所有手机的请求在同一个后台事件循环中执行，
+    调用线程只等待结果。
+    """
+
+    def __init__(self, helper_url: Optional[str] = None, loop: Optional[EventLoopThread] = None,
+                 check_connection: bool = True, **kwargs):
+        self.loop = loop or get_event_loop_thread()
+        self.async_controller = AsyncPhoneControllerRemote(helper_url, **kwargs)
+        self.helper_url = self.async_controller.helper_url
+
+        logger.info(f"初始化远程手机控制器（异步 I/O）: {self.helper_url}")
+
+        if check_connection and not self.loop.run(self.async_controller.test_connection()):
+            raise Exception(f"无法连接到手机控制服务: {self.helper_url}")
+
+    def get_status(self) -> dict:
+        return self.loop.run(self.async_controller.get_status())
+
+    def screenshot_raw(self, quality: Optional[int] = None,
+                       scale: Optional[float] = None) -> Optional[RemoteScreenshot]:
+        with span('screenshot.capture'):
+            return self.loop.run(self.async_controller.screenshot_raw(quality, scale))
+
+    def screenshot(self):
+        shot = self.screenshot_raw()
+        return shot.image if shot else None
+
+    def tap(self, x: int, y: int) -> bool:
+        with span('action.dispatch'):
+            return self.loop.run(self.async_controller.tap(x, y))
+
+    def swipe(self, x1: int, y1: int, x2: int, y2: int, duration: int = 300) -> bool:
+        with span('action.dispatch'):
+            return self.loop.run(self.async_controller.swipe(x1, y1, x2, y2, duration))
+
+    def input_text(self, text: str) -> bool:
+        with span('action.dispatch'):
+            return self.loop.run(self.async_controller.input_text(text))
+
+    def batch(self, ops: List[dict], stop_on_error: bool = True) -> List[bool]:
+        with span('action.dispatch'):
+            return self.loop.run(self.async_controller.batch(ops, stop_on_error))
+
+    def get_connection_stats(self) -> dict:
+        return self.async_controller.get_connection_stats()
+
+    def close(self):
+        self.loop.run(self.async_controller.close())
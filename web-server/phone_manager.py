@@ -53,6 +53,8 @@ class PhoneManager:
             with open(self.whitelist_file, 'r', encoding='utf-8') as f:
                 data = json.load(f)
                 self.phones = {p['id']: p for p in data.get('phones', [])}
+                for phone in self.phones.values():
+                    phone.setdefault('tags', [])
                 self.current_id = data.get('current_id')
 
             logger.info(f"已加载 {len(self.phones)} 台手机配置")
@@ -80,7 +82,29 @@ class PhoneManager:
         except Exception as e:
             logger.error(f"保存手机白名单失败: {e}", exc_info=True)
 
-    def add_phone(self, name: str, url: str, description: str = "") -> dict:
+    @staticmethod
+    def normalize_tags(tags) -> List[str]:
+        """
+        规范化标签：支持列表或逗号分隔的字符串，去掉空白和重复项
+
+        Raises:
+            ValueError: 标签格式无效
+        """
+        if not tags:
+            return []
+        if isinstance(tags, str):
+            tags = tags.split(',')
+        if not isinstance(tags, (list, tuple)) or not all(isinstance(tag, str) for tag in tags):
+            raise ValueError("标签必须是字符串列表")
+
+        result = []
+        for tag in tags:
+            tag = tag.strip()
+            if tag and tag not in result:
+                result.append(tag)
+        return result
+
+    def add_phone(self, name: str, url: str, description: str = "", tags=None) -> dict:
         """
         添加新手机到白名单
 
@@ -88,6 +112,7 @@ class PhoneManager:
             name: 手机名称
             url: AutoGLM Helper 的 URL (如 http://192.168.1.100:8080)
             description: 手机描述（可选）
+            tags: 标签（可选），提交任务时可按标签筛选手机
 
         Returns:
             新添加的手机信息字典
@@ -108,6 +133,7 @@ class PhoneManager:
             'name': name,
             'url': url,
             'description': description,
+            'tags': self.normalize_tags(tags),
             'added_at': datetime.now().isoformat(),
             'is_active': False
         }
@@ -160,6 +186,34 @@ class PhoneManager:
         logger.info(f"已删除手机: {name}")
         return True
 
+    def set_tags(self, phone_id: str, tags) -> Optional[dict]:
+        """
+        设置手机标签
+
+        Returns:
+            更新后的手机信息，手机不存在返回 None
+        """
+        phone = self.phones.get(phone_id)
+        if not phone:
+            return None
+        phone['tags'] = self.normalize_tags(tags)
+        self._save_whitelist()
+        logger.info(f"已更新手机标签: {phone['name']} {phone['tags']}")
+        return phone
+
+    def find_phones(self, tags: Optional[List[str]] = None) -> List[dict]:
+        """
+        获取包含所有指定标签的手机
+
+        Args:
+            tags: 标签列表，为空时返回所有手机
+        """
+        tags = self.normalize_tags(tags)
+        return [
+            phone for phone in self.phones.values()
+            if all(tag in phone.get('tags', []) for tag in tags)
+        ]
+
     def get_phones(self) -> List[dict]:
         """
         获取所有手机列表
@@ -0,0 +1,114 @@
+"""
+截图存储模块
+按内容哈希存储截图文件，相同画面只保存一份
+"""
+
+import base64
+import hashlib
+import logging
+import os
+import re
+import tempfile
+from pathlib import Path
+from typing import Optional
+
+from phone_controller_remote import detect_image_mime
+
+logger = logging.getLogger(__name__)
+
+# 截图访问路径前缀，任务中保存的截图引用即为该 URL
+SCREENSHOT_URL_PREFIX = '/api/screenshots/'
+
+_DIGEST_RE = re.compile(r'^[0-9a-f]{64}$')
+
+
+class ScreenshotStore:
+    """
+    内容寻址的截图存储
+
+    文件按 SHA-256 存放在 <root>/<前两位>/<哈希>，写入一次后不再修改，
+    因此可以被浏览器永久缓存。
+    """
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def is_valid_digest(digest: str) -> bool:
+        """检查是否为合法的哈希值"""
+        return bool(_DIGEST_RE.match(digest or ''))
+
+    @staticmethod
+    def url_for(digest: str) -> str:
+        """获取截图的访问 URL"""
+        return f"{SCREENSHOT_URL_PREFIX}{digest}"
+
+    @staticmethod
+    def digest_from_ref(ref: str) -> Optional[str]:
+        """从截图引用（URL）中取出哈希值"""
+        if ref and ref.startswith(SCREENSHOT_URL_PREFIX):
+            digest = ref[len(SCREENSHOT_URL_PREFIX):]
+            if ScreenshotStore.is_valid_digest(digest):
+                return digest
+        return None
+
+    def _path_for(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest
+
+    def put(self, data: bytes) -> str:
+        """
+        保存截图
+
+        Args:
+            data: 图片原始字节
+
+        Returns:
+            截图引用（访问 URL）
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._path_for(digest)
+
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # 先写临时文件再原子替换，避免读到写了一半的文件
+            fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix='.tmp-')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+            except Exception:
+                if os.path.exists(tmp_path):
+                    os.unlink(tmp_path)
+                raise
+            logger.debug(f"截图已保存: {digest[:12]} ({len(data)} 字节)")
+
+        return self.url_for(digest)
+
+    def put_data_uri(self, data_uri: str) -> Optional[str]:
+        """
+        保存 data URI 形式的截图
+
+        Returns:
+            截图引用，格式错误返回 None
+        """
+        if not data_uri.startswith('data:') or ';base64,' not in data_uri:
+            return None
+        try:
+            data = base64.b64decode(data_uri.split(';base64,', 1)[1])
+        except Exception as e:
+            logger.warning(f"解析截图 data URI 失败: {e}")
+            return None
+        return self.put(data)
+
+    def get_path(self, digest: str) -> Optional[Path]:
+        """获取截图文件路径，不存在返回 None"""
+        if not self.is_valid_digest(digest):
+            return None
+        path = self._path_for(digest)
+        return path if path.exists() else None
+
+    def get_mime_type(self, path: Path) -> str:
+        """根据文件头判断截图类型"""
+        with open(path, 'rb') as f:
+            return detect_image_mime(f.read(12))
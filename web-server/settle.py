@@ -0,0 +1,180 @@
+"""
+界面稳定检测模块
+动作执行后连续获取低分辨率探测帧，相邻帧足够接近即认为界面已稳定，
+代替固定时长的 sleep：快的界面尽早返回，慢的界面不会截到渲染一半的画面
+
+Android 的 AccessibilityService.takeScreenshot 两次调用至少间隔约 333 ms，
+过快的调用会被拒绝（Helper 返回 500），因此探测间隔不低于 MIN_CAPTURE_INTERVAL，
+单次探测失败视为"尚未稳定"，直到超时
+
+为了不在稳定之后再多等一个间隔截全尺寸图，用于确认稳定的那一帧直接截全尺寸图：
+低分辨率探测帧和全尺寸帧交替，相邻两帧一致时返回其中的全尺寸帧；
+第一帧探测与动作前的画面一致时（动作没有产生可见变化），直接复用动作前的截图
+"""
+
+import io
+import logging
+import time
+from typing import Callable, Optional
+
+from lazy_import import lazy_module
+
+Image = lazy_module('PIL.Image')
+
+logger = logging.getLogger(__name__)
+
+# 探测帧尺寸（灰度），足以区分页面切换和动画，计算成本可忽略
+PROBE_SIZE = (16, 32)
+
+# 探测截图的缩放比例和 JPEG 质量（Helper 在手机端缩小，传输和解码成本约为全尺寸的 1/16）
+PROBE_SCALE = 0.25
+PROBE_QUALITY = 50
+
+# 两次截图之间的最小间隔（秒），略高于 Android takeScreenshot 的限制
+MIN_CAPTURE_INTERVAL = 0.35
+
+
+def probe_fingerprint(data: bytes, size=PROBE_SIZE) -> bytes:
+    """
+    计算截图的低分辨率灰度指纹
+
+    JPEG 使用 draft 模式在解码阶段直接按 1/2~1/8 缩小，不做全尺寸解码
+    """
+    image = Image.open(io.BytesIO(data))
+    if image.format == 'JPEG':
+        image.draft('L', (size[0] * 4, size[1] * 4))
+    return image.convert('L').resize(size, Image.BILINEAR).tobytes()
+
+
+def fingerprint_distance(a: bytes, b: bytes) -> float:
+    """两个指纹的平均灰度差（0~255）"""
+    if len(a) != len(b):
+        return 255.0
+    return sum(abs(x - y) for x, y in zip(a, b)) / len(a)
+
+
+class SettleResult:
+    """一次稳定检测的结果"""
+
+    __slots__ = ('settled', 'elapsed_ms', 'probes', 'screenshot')
+
+    def __init__(self, settled: bool, elapsed_ms: float, probes: int = 0, screenshot=None):
+        self.settled = settled          # 是否在时限内稳定
+        self.elapsed_ms = elapsed_ms    # 实际等待时间
+        self.probes = probes            # 截图次数（探测帧和全尺寸帧）
+        self.screenshot = screenshot    # 稳定画面的全尺寸截图，没有时为 None（由调用方另行截图）
+
+    def to_dict(self) -> dict:
+        return {
+            'settled': self.settled,
+            'settle_ms': round(self.elapsed_ms, 1),
+            'probes': self.probes,
+        }
+
+
+class SettleDetector:
+    """
+    界面稳定检测器
+
+    Args:
+        probe: 获取低分辨率探测截图的函数，返回带 data 属性（图片字节）的截图对象，失败时抛出异常
+        capture: 获取全尺寸截图的函数（同上），为 None 时只用探测帧判断，由调用方另行截图
+        interval: 相邻两次截图开始时间的间隔（秒），不低于 MIN_CAPTURE_INTERVAL
+        stable_frames: 连续多少帧一致视为稳定（含第一帧）
+        min_wait: 第一次探测前的等待（秒），给动画启动留出时间
+        max_wait: 最长等待时间（秒），超时后返回
+        threshold: 相邻帧平均灰度差低于该值视为一致
+    """
+
+    def __init__(self, probe: Callable, capture: Optional[Callable] = None,
+                 interval: float = MIN_CAPTURE_INTERVAL, stable_frames: int = 2,
+                 min_wait: float = 0.1, max_wait: float = 1.5, threshold: float = 2.0):
+        self.probe = probe
+        self.capture = capture
+        self.interval = max(interval, MIN_CAPTURE_INTERVAL)
+        self.stable_frames = max(2, stable_frames)
+        self.min_wait = min_wait
+        self.max_wait = max_wait
+        self.threshold = threshold
+
+    def wait(self, max_wait: Optional[float] = None, reference=None) -> SettleResult:
+        """
+        等待界面稳定
+
+        Args:
+            max_wait: 本次等待上限（秒），默认使用 self.max_wait
+            reference: 动作前最后一帧全尺寸截图，作为一致序列的第一帧
+
+        Returns:
+            SettleResult，screenshot 为稳定画面的全尺寸截图（超时时为最后一帧全尺寸截图或 None）
+        """
+        limit = self.max_wait if max_wait is None else max_wait
+        start = time.monotonic()
+        deadline = start + limit
+
+        # previous: 上一帧指纹；stable: 以上一帧结尾的一致帧数；full: 这些帧中最近的全尺寸截图
+        previous = None
+        stable = 0
+        full = None
+        if reference is not None:
+            try:
+                previous = probe_fingerprint(reference.data)
+                stable = 1
+                full = reference
+            except Exception as e:
+                logger.debug(f"动作前截图解析失败: {e}")
+
+        if self.min_wait > 0:
+            time.sleep(min(self.min_wait, limit))
+
+        probes = 0
+        while True:
+            # 一致序列中还没有全尺寸帧时，这一帧截全尺寸图：若与上一帧一致即可直接返回
+            use_full = self.capture is not None and previous is not None and full is None
+            frame_start = time.monotonic()
+            probes += 1
+            frame = None
+            try:
+                frame = (self.capture if use_full else self.probe)()
+                fingerprint = probe_fingerprint(frame.data)
+            except Exception as e:
+                # 截图被拒绝（间隔过短）或解析失败：视为尚未稳定，下一次探测重新开始计数
+                logger.debug(f"探测截图失败: {e}")
+                fingerprint = None
+
+            if fingerprint is None:
+                stable = 0
+                full = None
+            elif previous is not None and fingerprint_distance(previous, fingerprint) <= self.threshold:
+                stable += 1
+                if use_full:
+                    full = frame
+            else:
+                stable = 1
+                full = frame if use_full else None
+            previous = fingerprint
+
+            elapsed = time.monotonic() - start
+            if stable >= self.stable_frames and (full is not None or self.capture is None):
+                return SettleResult(True, elapsed * 1000, probes, full)
+
+            next_at = frame_start + self.interval
+            if next_at >= deadline:
+                return SettleResult(False, elapsed * 1000, probes,
+                                    frame if use_full and fingerprint is not None else None)
+
+            time.sleep(max(0.0, next_at - time.monotonic()))
+
+
+class FixedSettle:
+    """固定时长等待（兼容旧行为），不做探测"""
+
+    def __init__(self, delay: float = 0.5):
+        self.delay = delay
+        self.max_wait = delay
+
+    def wait(self, max_wait: Optional[float] = None, reference=None) -> SettleResult:
+        delay = self.delay if max_wait is None else max_wait
+        if delay > 0:
+            time.sleep(delay)
+        return SettleResult(True, delay * 1000)
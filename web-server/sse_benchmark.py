@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+实时日志（SSE）并发压测
+在本进程内分别用开发服务器（WEB_SERVER_MODE=dev）和生产模式（aiohttp）启动 Web 服务，
+让 N 个观看者同时订阅任务日志流，对比线程数、内存、事件送达延迟和普通接口的响应时间
+
+与 benchmark.py 一样使用模拟 Helper 和脚本化的 PhoneAgent，不需要真实手机和模型 API；
+客户端使用 aiohttp
+
+用法:
+    python sse_benchmark.py --viewers 200                 # 依次压测两种模式并对比
+    python sse_benchmark.py --mode aiohttp --viewers 1000 --json
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import aiohttp
+
+import config
+from benchmark import isolate_storage, peak_rss_mb, prepare_manager, start_helpers
+from metrics import RollingStats
+
+logger = logging.getLogger('sse_benchmark')
+
+MODES = ('dev', 'aiohttp')
+
+
+class ThreadSampler:
+    """后台采样进程线程数的峰值"""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.peak = threading.active_count()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="thread-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.peak = max(self.peak, threading.active_count())
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+
+def start_dev_server(flask_app):
+    """Flask 开发服务器（与 app.run(threaded=True) 相同），返回 (端口, 停止函数)"""
+    from werkzeug.serving import make_server
+
+    server = make_server('127.0.0.1', 0, flask_app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="dev-server", daemon=True).start()
+    return server.server_address[1], server.shutdown
+
+
+def start_aiohttp_server(flask_app, args):
+    """生产模式服务，在单独线程的事件循环中运行，返回 (端口, 停止函数)"""
+    from aiohttp import web
+    from aio_server import create_server_app
+
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="aiohttp-server", daemon=True).start()
+
+    async def start():
+        runner = web.AppRunner(
+            create_server_app(flask_app, args.worker_threads, args.max_connections),
+            access_log=None,
+            handler_cancellation=True,
+        )
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        return runner
+
+    runner = asyncio.run_coroutine_threadsafe(start(), loop).result()
+    port = runner.addresses[0][1]
+
+    def stop():
+        asyncio.run_coroutine_threadsafe(runner.cleanup(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+
+    return port, stop
+
+
+async def view(session, base_url: str, task_id: str, started: float, result: dict):
+    """一个观看者：订阅日志流直到收到 end 事件"""
+    try:
+        async with session.get(f"{base_url}/api/tasks/{task_id}/logs") as response:
+            if response.status != 200:
+                result['error'] = f"HTTP {response.status}"
+                return
+            async for line in response.content:
+                if not line.startswith(b'data: '):
+                    continue
+                event = json.loads(line[6:])
+                now = time.monotonic()
+                result['events'] = result.get('events', 0) + 1
+                if event.get('type') == 'init':
+                    result['init_ms'] = (now - started) * 1000
+                elif event.get('type') == 'end':
+                    result['end_at'] = now
+                    return
+                elif 'error' in event:
+                    result['error'] = event['error']
+                    return
+    except Exception as e:
+        result['error'] = str(e) or type(e).__name__
+
+
+async def probe_api(session, base_url: str, stopped: asyncio.Event, stats: RollingStats):
+    """观看期间反复请求普通接口，统计响应时间（检查线程池是否被 SSE 连接占满）"""
+    while not stopped.is_set():
+        started = time.monotonic()
+        try:
+            async with session.get(f"{base_url}/api/health") as response:
+                await response.read()
+            stats.add((time.monotonic() - started) * 1000)
+        except Exception as e:
+            logger.warning(f"接口请求失败: {e}")
+        await asyncio.sleep(0.05)
+
+
+async def drive_viewers(base_url: str, task_ids: list, args) -> dict:
+    connector = aiohttp.TCPConnector(limit=0)
+    timeout = aiohttp.ClientTimeout(total=args.timeout)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        results = [{} for _ in range(args.viewers)]
+        api_stats = RollingStats(window=100000)
+        stopped = asyncio.Event()
+        prober = asyncio.ensure_future(probe_api(session, base_url, stopped, api_stats))
+
+        started = time.monotonic()
+        await asyncio.gather(*(
+            view(session, base_url, task_ids[index % len(task_ids)], started, results[index])
+            for index in range(args.viewers)
+        ))
+        stopped.set()
+        await prober
+
+    return {'results': results, 'api_ms': api_stats.snapshot()}
+
+
+def run_mode(args) -> dict:
+    """在本进程内压测一种服务模式"""
+    with tempfile.TemporaryDirectory(prefix='autoglm-sse-bench-') as directory:
+        isolate_storage(Path(directory))
+        helpers = start_helpers(args.phones, args)
+        task_manager = prepare_manager(helpers, args)
+
+        from app import create_app
+
+        flask_app = create_app(init_task_manager=False)
+
+        baseline_threads = threading.active_count()
+        if args.mode == 'aiohttp':
+            port, stop = start_aiohttp_server(flask_app, args)
+        else:
+            port, stop = start_dev_server(flask_app)
+
+        sampler = ThreadSampler()
+        sampler.start()
+
+        task_ids = [
+            task_manager.submit_task(f"SSE 压测任务 {index + 1}", phone_id='any').id
+            for index in range(args.tasks)
+        ]
+        outcome = asyncio.run(drive_viewers(f"http://127.0.0.1:{port}", task_ids, args))
+
+        sampler.stop()
+        stop()
+        task_manager.stop_worker()
+        for _, _, server in helpers:
+            server.shutdown()
+
+    results = outcome['results']
+    init_stats = RollingStats(window=100000)
+    spread_stats = RollingStats(window=100000)
+    end_times = {}
+    for index, result in enumerate(results):
+        if 'init_ms' in result:
+            init_stats.add(result['init_ms'])
+        if 'end_at' in result:
+            end_times.setdefault(task_ids[index % len(task_ids)], []).append(result['end_at'])
+    for times in end_times.values():
+        first = min(times)
+        for end_at in times:
+            spread_stats.add((end_at - first) * 1000)
+
+    init_snapshot = init_stats.snapshot()
+    spread_snapshot = spread_stats.snapshot()
+    errors = [result['error'] for result in results if 'error' in result]
+    return {
+        'mode': args.mode,
+        'viewers': args.viewers,
+        'tasks': args.tasks,
+        'finished_viewers': sum(1 for result in results if 'end_at' in result),
+        'errors': len(errors),
+        'first_error': errors[0] if errors else None,
+        'events': sum(result.get('events', 0) for result in results),
+        'threads_baseline': baseline_threads,
+        'threads_peak': sampler.peak,
+        'init_ms': {'p50': init_snapshot['p50'], 'p99': init_snapshot['p99']},
+        'end_spread_ms': {'p50': spread_snapshot['p50'], 'p99': spread_snapshot['p99']},
+        'api_ms': {'p50': outcome['api_ms']['p50'], 'p99': outcome['api_ms']['p99']},
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def run_all(args) -> list:
+    """每种模式在单独的子进程中压测（线程数和内存互不影响）"""
+    results = []
+    for mode in MODES:
+        command = [
+            sys.executable, os.path.abspath(__file__), '--mode', mode, '--json',
+            '--viewers', str(args.viewers), '--tasks', str(args.tasks), '--steps', str(args.steps),
+            '--phones', str(args.phones), '--think', str(args.think), '--latency', str(args.latency),
+            '--jitter', str(args.jitter), '--worker-threads', str(args.worker_threads),
+            '--max-connections', str(args.max_connections), '--timeout', str(args.timeout),
+        ]
+        output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+        results.append(json.loads(output))
+    return results
+
+
+def print_results(results: list):
+    rows = [
+        ('完成的观看者', lambda r: f"{r['finished_viewers']}/{r['viewers']}"),
+        ('错误数', lambda r: r['errors']),
+        ('收到事件数', lambda r: r['events']),
+        ('线程数（启动前 -> 峰值）', lambda r: f"{r['threads_baseline']} -> {r['threads_peak']}"),
+        ('首个事件 p50 / p99 (ms)', lambda r: f"{r['init_ms']['p50']} / {r['init_ms']['p99']}"),
+        ('end 事件送达差 p50 / p99 (ms)', lambda r: f"{r['end_spread_ms']['p50']} / {r['end_spread_ms']['p99']}"),
+        ('/api/health p50 / p99 (ms)', lambda r: f"{r['api_ms']['p50']} / {r['api_ms']['p99']}"),
+        ('峰值内存 (MB)', lambda r: r['peak_rss_mb']),
+    ]
+    print(f"观看者: {results[0]['viewers']}  任务: {results[0]['tasks']}")
+    print(f"{'':<30}" + ''.join(f"{r['mode']:>22}" for r in results))
+    for title, value in rows:
+        print(f"{title:<30}" + ''.join(f"{str(value(r)):>22}" for r in results))
+    for result in results:
+        if result['first_error']:
+            print(f"{result['mode']} 首个错误: {result['first_error']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='AutoGLM 实时日志并发压测')
+    parser.add_argument('--mode', choices=MODES + ('both',), default='both', help='服务模式')
+    parser.add_argument('--viewers', type=int, default=200, help='同时订阅日志流的观看者数')
+    parser.add_argument('--tasks', type=int, default=2, help='被观看的任务数（观看者平均分配）')
+    parser.add_argument('--steps', type=int, default=10, help='每个任务的步数')
+    parser.add_argument('--phones', type=int, default=2, help='模拟手机数')
+    parser.add_argument('--think', type=float, default=300, help='模拟模型耗时（毫秒）')
+    parser.add_argument('--latency', type=float, default=20, help='Helper 请求延迟（毫秒）')
+    parser.add_argument('--jitter', type=float, default=5, help='Helper 延迟波动（±毫秒）')
+    parser.add_argument('--worker-threads', type=int, default=config.WEB_WORKER_THREADS,
+                        help='aiohttp 模式的线程池大小')
+    parser.add_argument('--max-connections', type=int, default=config.WEB_MAX_CONNECTIONS,
+                        help='aiohttp 模式的连接上限')
+    parser.add_argument('--timeout', type=float, default=300, help='观看者等待任务结束的最长时间（秒）')
+    parser.add_argument('--json', action='store_true', help='输出 JSON')
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+    # benchmark.start_helpers / prepare_manager 使用的参数
+    args.width, args.height, args.frame_kb, args.think_jitter = 1080, 2400, 0, 0
+
+    logging.basicConfig(
+        level=logging.INFO if args.verbose else logging.WARNING,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    if not args.verbose:
+        for name in ('tasks', 'health'):
+            logging.getLogger(name).setLevel(logging.ERROR)
+
+    results = run_all(args) if args.mode == 'both' else [run_mode(args)]
+
+    if args.json:
+        print(json.dumps(results if args.mode == 'both' else results[0], ensure_ascii=False, indent=2))
+        return
+    print_results(results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+启动耗时压测
+每个场景在新的 Python 进程中执行（-X importtime），输出导入耗时、导入最慢的模块，
+以及启动阶段被提前导入的重量级依赖（PIL、requests、aiohttp、phone_agent 等，应在第一次使用时才导入）
+
+场景:
+    tasks   import tasks（命令行工具）
+    app     import app + create_app()（Web 服务监听端口前）
+    ready   app + 任务管理器初始化完成（任务存储、白名单、worker 指向临时目录）
+
+用法:
+    python startup_benchmark.py
+    python startup_benchmark.py --repeat 10 --top 15
+    python startup_benchmark.py --max-ms 800 --json     # 超过阈值或提前导入了重量级依赖时退出码为 1
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+WEB_SERVER_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 启动阶段不应导入的模块
+HEAVY_MODULES = ('PIL.Image', 'requests', 'aiohttp', 'websocket', 'phone_agent', 'openai')
+
+# 在临时目录中运行，不读写正式的任务历史和白名单
+_ISOLATE = """
+import config
+from pathlib import Path
+directory = Path({directory!r})
+config.TASK_HISTORY_FILE = directory / 'task_history.json'
+config.TASK_JOURNAL_FILE = directory / 'task_journal.jsonl'
+config.TASK_DB_FILE = directory / 'tasks.db'
+config.TASK_SPILL_FILE = directory / 'task_spill.db'
+config.SCREENSHOT_DIR = directory / 'screenshots'
+config.PHONE_WHITELIST_FILE = directory / 'phone_whitelist.json'
+# 不启动后台健康检查：它第一次探测时按需导入 requests，会与启动路径竞争，掩盖启动路径上的提前导入
+import health
+health.PhoneHealthProber.start = lambda self: None
+"""
+
+SCENARIOS = {
+    'tasks': "import tasks",
+    'app': "import app\napp.create_app(init_task_manager=False)",
+    'ready': "import app\napp.create_app(init_task_manager=False)\napp.get_task_manager()",
+}
+
+_TEMPLATE = """
+import json, sys, time
+{isolate}
+started = time.perf_counter()
+{code}
+elapsed_ms = (time.perf_counter() - started) * 1000
+print(json.dumps({{'ms': elapsed_ms, 'heavy': [m for m in {heavy!r} if m in sys.modules]}}))
+sys.stdout.flush()
+# 不等待健康检查等后台线程结束
+import os
+os._exit(0)
+"""
+
+
+def parse_importtime(stderr: str) -> dict:
+    """解析 -X importtime 输出，返回 {模块: 累计耗时（毫秒）}"""
+    cumulative = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[1].strip().isdigit():
+            continue  # 表头
+        name = fields[2].strip()
+        cumulative[name] = max(cumulative.get(name, 0.0), int(fields[1]) / 1000)
+    return cumulative
+
+
+def run_once(scenario: str, directory: str) -> dict:
+    isolate = _ISOLATE.format(directory=directory) if scenario == 'ready' else ''
+    # config 本身在计时之外导入，计时只包含场景代码
+    code = _TEMPLATE.format(isolate=isolate or 'import config', code=SCENARIOS[scenario], heavy=HEAVY_MODULES)
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        cwd=WEB_SERVER_DIR, capture_output=True, text=True, timeout=120,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"场景 {scenario} 执行失败:\n{result.stderr[-2000:]}")
+    data = json.loads(result.stdout.strip().splitlines()[-1])
+    data['modules'] = parse_importtime(result.stderr)
+    return data
+
+
+def run_scenario(scenario: str, repeat: int, top: int) -> dict:
+    runs = []
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory(prefix='autoglm-startup-') as directory:
+            runs.append(run_once(scenario, directory))
+
+    elapsed = [run['ms'] for run in runs]
+    # 导入最慢的模块取各次运行的中位数（只统计本项目模块和顶层包）
+    names = set().union(*(run['modules'] for run in runs))
+    modules = {
+        name: statistics.median(run['modules'].get(name, 0.0) for run in runs)
+        for name in names if '.' not in name
+    }
+    slowest = sorted(modules.items(), key=lambda item: item[1], reverse=True)[:top]
+    return {
+        'scenario': scenario,
+        'repeat': repeat,
+        'median_ms': round(statistics.median(elapsed), 1),
+        'min_ms': round(min(elapsed), 1),
+        'heavy_modules': runs[-1]['heavy'],
+        'slowest_imports_ms': {name: round(ms, 1) for name, ms in slowest},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='AutoGLM 启动耗时压测')
+    parser.add_argument('--scenario', choices=tuple(SCENARIOS) + ('all',), default='all')
+    parser.add_argument('--repeat', type=int, default=5, help='每个场景运行次数（取中位数）')
+    parser.add_argument('--top', type=int, default=10, help='列出导入最慢的模块数')
+    parser.add_argument('--max-ms', type=float, default=None,
+                        help='app 场景耗时中位数的上限（毫秒），超过时退出码为 1')
+    parser.add_argument('--json', action='store_true', help='输出 JSON')
+    args = parser.parse_args()
+
+    scenarios = tuple(SCENARIOS) if args.scenario == 'all' else (args.scenario,)
+    results = [run_scenario(scenario, max(1, args.repeat), args.top) for scenario in scenarios]
+
+    failed = False
+    for result in results:
+        if result['heavy_modules']:
+            failed = True
+        if args.max_ms is not None and result['scenario'] == 'app' and result['median_ms'] > args.max_ms:
+            failed = True
+
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+    else:
+        for result in results:
+            print(f"[{result['scenario']}] 中位数 {result['median_ms']} ms  最快 {result['min_ms']} ms  "
+                  f"({result['repeat']} 次)")
+            print(f"  提前导入的重量级依赖: {', '.join(result['heavy_modules']) or '无'}")
+            print("  导入最慢的模块（累计毫秒）:")
+            for name, elapsed_ms in result['slowest_imports_ms'].items():
+                print(f"    {name:<28} {elapsed_ms}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
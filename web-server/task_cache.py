@@ -0,0 +1,190 @@
+"""
+任务缓存模块
+内存中只保留最近使用的任务（按估算字节数和任务数限制），超出上限时按 LRU 淘汰；
+被淘汰的任务由调用方写入磁盘，get_task 时再按需读回
+"""
+
+import logging
+import sys
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 任务对象本身（属性字典、列表等）的固定开销估算（字节）
+TASK_BASE_BYTES = 2048
+
+# 列表中每个元素的引用开销（字节）
+POINTER_BYTES = 8
+
+# 计入内存估算的文本字段（更新时整体替换）
+TEXT_FIELDS = ('description', 'thinking', 'error')
+
+
+def estimate_bytes(value) -> int:
+    """估算对象占用的内存（字节），递归计算列表和字典中的元素"""
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(
+            estimate_bytes(key) + estimate_bytes(item) for key, item in value.items()
+        )
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_bytes(item) for item in value)
+    return sys.getsizeof(value)
+
+
+def estimate_text_bytes(task) -> int:
+    """估算任务文本字段（描述、思考过程、错误）占用的内存"""
+    return sum(sys.getsizeof(text) for text in (getattr(task, name) for name in TEXT_FIELDS) if text)
+
+
+def estimate_item_bytes(value) -> int:
+    """估算追加到任务列表（日志、截图引用、动作、单步耗时）中的一项占用的内存"""
+    return estimate_bytes(value) + POINTER_BYTES
+
+
+def estimate_task_bytes(task) -> int:
+    """估算任务占用的内存：日志、截图引用、思考过程、动作和单步耗时"""
+    size = TASK_BASE_BYTES
+    size += estimate_text_bytes(task)
+    size += estimate_bytes(task.logs)
+    size += estimate_bytes(task.screenshots)
+    size += estimate_bytes(task.actions)
+    size += estimate_bytes(task.step_timings)
+    return size
+
+
+class TaskCache:
+    """
+    按字节数和任务数限制的 LRU 任务缓存（线程安全）
+
+    加入缓存时完整估算一次任务大小，之后任务变化时只累加变化的部分（grow / resize_text），
+    不再重新遍历整个任务
+
+    Args:
+        max_bytes: 缓存任务的估算内存上限（字节），0 表示不限制
+        max_tasks: 缓存任务数上限，0 表示不限制
+        can_evict: 任务是否可以淘汰（排队中和执行中的任务始终保留在内存中）
+        on_evict: 淘汰前调用（写入磁盘），抛出异常时保留该任务
+        sizeof: 估算任务占用的内存
+        text_sizeof: 估算任务文本字段占用的内存（包含在 sizeof 中）
+    """
+
+    def __init__(self, max_bytes: int = 0, max_tasks: int = 0,
+                 can_evict: Callable[[object], bool] = lambda task: True,
+                 on_evict: Optional[Callable[[object], None]] = None,
+                 sizeof: Callable[[object], int] = estimate_task_bytes,
+                 text_sizeof: Callable[[object], int] = estimate_text_bytes):
+        self.max_bytes = max_bytes
+        self.max_tasks = max_tasks
+        self.can_evict = can_evict
+        self.on_evict = on_evict
+        self.sizeof = sizeof
+        self.text_sizeof = text_sizeof
+        self._lock = threading.RLock()
+        self._tasks: 'OrderedDict[str, object]' = OrderedDict()  # 最久未使用的在前
+        self._sizes: Dict[str, int] = {}
+        self._text_sizes: Dict[str, int] = {}
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._tasks)
+
+    def __contains__(self, task_id: str) -> bool:
+        return task_id in self._tasks
+
+    def get(self, task_id: str):
+        """读取任务并标记为最近使用，不在缓存中时返回 None"""
+        with self._lock:
+            task = self._tasks.get(task_id)
+            if task is None:
+                self.misses += 1
+                return None
+            self._tasks.move_to_end(task_id)
+            self.hits += 1
+            return task
+
+    def peek(self, task_id: str):
+        """读取任务，不改变 LRU 顺序"""
+        return self._tasks.get(task_id)
+
+    def put(self, task):
+        """加入（或替换）任务并标记为最近使用，超出上限时淘汰最久未使用的任务"""
+        with self._lock:
+            self._tasks[task.id] = task
+            self._tasks.move_to_end(task.id)
+            self._resize(task)
+            self._evict()
+
+    def grow(self, task, delta: int):
+        """任务追加内容（日志、截图引用、动作等）后累加估算大小（不改变 LRU 顺序）"""
+        with self._lock:
+            if self._tasks.get(task.id) is not task:
+                return
+            self._sizes[task.id] += delta
+            self.total_bytes += delta
+            self._evict()
+
+    def resize_text(self, task):
+        """任务文本字段更新后只重新估算文本部分（不改变 LRU 顺序）"""
+        with self._lock:
+            if self._tasks.get(task.id) is not task:
+                return
+            size = self.text_sizeof(task)
+            delta = size - self._text_sizes.get(task.id, 0)
+            self._text_sizes[task.id] = size
+            self.grow(task, delta)
+
+    def values(self) -> List[object]:
+        """缓存中所有任务的快照（从最久未使用到最近使用）"""
+        with self._lock:
+            return list(self._tasks.values())
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'tasks': len(self._tasks),
+                'bytes': self.total_bytes,
+                'max_bytes': self.max_bytes,
+                'max_tasks': self.max_tasks,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+    def _resize(self, task):
+        size = self.sizeof(task)
+        self.total_bytes += size - self._sizes.get(task.id, 0)
+        self._sizes[task.id] = size
+        self._text_sizes[task.id] = self.text_sizeof(task)
+
+    def _over_limit(self) -> bool:
+        return bool(
+            (self.max_bytes and self.total_bytes > self.max_bytes)
+            or (self.max_tasks and len(self._tasks) > self.max_tasks)
+        )
+
+    def _evict(self):
+        if not self._over_limit():
+            return
+
+        # 从最久未使用的开始淘汰，跳过不能淘汰的任务；
+        # 先写入磁盘再移出缓存，期间其他线程读取时仍能在内存中找到
+        for task_id, task in list(self._tasks.items()):
+            if not self._over_limit():
+                break
+            if not self.can_evict(task):
+                continue
+            if self.on_evict is not None:
+                try:
+                    self.on_evict(task)
+                except Exception as e:
+                    logger.error(f"任务写入磁盘失败，保留在内存中: {task_id}: {e}", exc_info=True)
+                    continue
+            del self._tasks[task_id]
+            self.total_bytes -= self._sizes.pop(task_id, 0)
+            self._text_sizes.pop(task_id, None)
+            self.evictions += 1
@@ -0,0 +1,156 @@
+"""
+任务事件总线
+按任务发布/订阅实时事件（日志、截图、状态），供 SSE 推送使用
+"""
+
+import logging
+import threading
+from collections import OrderedDict, deque
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class _Channel:
+    """单个任务的事件通道"""
+
+    def __init__(self, buffer_size: int):
+        self.cond = threading.Condition()
+        self.events: deque = deque(maxlen=buffer_size)  # (event_id, event)
+        self.last_id = 0
+        self.closed = False
+        self.listeners: List[Callable[[], None]] = []  # 有新事件或通道关闭时回调（异步订阅者）
+
+    def notify(self):
+        """唤醒所有订阅者（调用方需持有 cond）"""
+        self.cond.notify_all()
+        for listener in self.listeners:
+            try:
+                listener()
+            except Exception as e:
+                logger.debug(f"事件回调失败: {e}")
+
+
+class TaskEventBus:
+    """
+    任务事件总线
+
+    - 每个任务一个通道，事件带递增 ID，保留最近 buffer_size 条用于断线续传
+    - 订阅者阻塞等待新事件，发布时立即唤醒，不需要轮询
+    - 异步订阅者通过 add_listener 登记回调，不占用线程
+    - 任务结束后通道关闭，保留最近 max_closed 个已关闭通道供重连读取
+    """
+
+    def __init__(self, buffer_size: int = 500, max_closed: int = 100):
+        self.buffer_size = buffer_size
+        self.max_closed = max_closed
+        self._lock = threading.Lock()
+        self._channels: Dict[str, _Channel] = {}
+        self._closed: 'OrderedDict[str, None]' = OrderedDict()
+
+    def _channel(self, task_id: str) -> _Channel:
+        with self._lock:
+            channel = self._channels.get(task_id)
+            if channel is None:
+                channel = _Channel(self.buffer_size)
+                self._channels[task_id] = channel
+            return channel
+
+    def publish(self, task_id: str, event: dict) -> int:
+        """
+        发布事件
+
+        Returns:
+            事件 ID
+        """
+        channel = self._channel(task_id)
+        with channel.cond:
+            channel.last_id += 1
+            channel.events.append((channel.last_id, event))
+            channel.notify()
+            return channel.last_id
+
+    def close(self, task_id: str):
+        """任务结束，唤醒所有订阅者"""
+        channel = self._channel(task_id)
+        with channel.cond:
+            channel.closed = True
+            channel.notify()
+
+        with self._lock:
+            self._closed[task_id] = None
+            self._closed.move_to_end(task_id)
+            while len(self._closed) > self.max_closed:
+                old_id, _ = self._closed.popitem(last=False)
+                self._channels.pop(old_id, None)
+
+    def _get(self, task_id: str) -> Optional[_Channel]:
+        with self._lock:
+            return self._channels.get(task_id)
+
+    def last_event_id(self, task_id: str) -> int:
+        """当前最新事件 ID"""
+        channel = self._get(task_id)
+        if channel is None:
+            return 0
+        with channel.cond:
+            return channel.last_id
+
+    def can_resume(self, task_id: str, after_id: int) -> bool:
+        """after_id 之后的事件是否仍全部保留在缓冲区中"""
+        channel = self._get(task_id)
+        if channel is None:
+            return after_id == 0
+        with channel.cond:
+            if after_id > channel.last_id:
+                return False
+            if after_id == channel.last_id:
+                return True
+            return bool(channel.events) and channel.events[0][0] <= after_id + 1
+
+    def wait(self, task_id: str, after_id: int,
+             timeout: Optional[float] = None) -> Tuple[List[Tuple[int, dict]], bool]:
+        """
+        等待 after_id 之后的新事件
+
+        Args:
+            task_id: 任务 ID
+            after_id: 已收到的最后一个事件 ID
+            timeout: 最长等待时间（秒），超时返回空列表
+
+        Returns:
+            (新事件列表 [(事件 ID, 事件)], 通道是否已关闭)；
+            通道不存在（未知任务或已清理的已结束任务）时立即返回 ([], True)
+        """
+        # 只读路径不创建通道，否则未知任务 ID 的请求会留下永远不会清理的通道
+        channel = self._get(task_id)
+        if channel is None:
+            return [], True
+        with channel.cond:
+            channel.cond.wait_for(
+                lambda: channel.last_id > after_id or channel.closed,
+                timeout=timeout
+            )
+            events = [(event_id, event) for event_id, event in channel.events if event_id > after_id]
+            return events, channel.closed
+
+    def add_listener(self, task_id: str, listener: Callable[[], None]):
+        """
+        登记回调，有新事件或通道关闭时在发布者线程中调用
+
+        回调必须立即返回（例如 loop.call_soon_threadsafe），之后用 wait(timeout=0) 读取事件；
+        通道不存在时不登记（wait 会立即返回已关闭）
+        """
+        channel = self._get(task_id)
+        if channel is None:
+            return
+        with channel.cond:
+            channel.listeners.append(listener)
+
+    def remove_listener(self, task_id: str, listener: Callable[[], None]):
+        channel = self._get(task_id)
+        if channel is None:
+            return
+        with channel.cond:
+            if listener in channel.listeners:
+                channel.listeners.remove(listener)
@@ -0,0 +1,222 @@
+"""
+任务日志（追加写）模块
+任务的生命周期事件、日志、动作、截图引用和单步耗时逐条追加到 JSON Lines 文件，
+定期压缩为快照，启动时读取快照并重放快照之后的日志尾部
+"""
+
+import json
+import logging
+import os
+import tempfile
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 事件类型
+EVENT_CREATE = 'create'          # 新任务（完整快照）
+EVENT_UPDATE = 'update'          # 字段更新（状态、时间、错误等）
+EVENT_LOG = 'log'                # 追加日志
+EVENT_ACTION = 'action'          # 追加动作
+EVENT_SCREENSHOT = 'screenshot'  # 追加截图引用
+EVENT_STEP_TIMING = 'step_timing'  # 追加单步耗时
+
+# 追加类事件对应的列表字段
+_LIST_FIELDS = {
+    EVENT_LOG: 'logs',
+    EVENT_ACTION: 'actions',
+    EVENT_SCREENSHOT: 'screenshots',
+    EVENT_STEP_TIMING: 'step_timings',
+}
+
+
+def apply_event(tasks: Dict[str, dict], record: dict):
+    """
+    将一条日志事件应用到任务字典上
+
+    追加类事件带有元素下标，重复应用同一事件不会产生重复数据，
+    因此快照与日志尾部有重叠时重放结果依然正确。
+    """
+    task_id = record.get('task_id')
+    event = record.get('event')
+    data = record.get('data') or {}
+
+    if event == EVENT_CREATE:
+        if task_id not in tasks:
+            tasks[task_id] = data['task']
+        return
+
+    task = tasks.get(task_id)
+    if task is None:
+        return
+
+    if event == EVENT_UPDATE:
+        task.update(data)
+    elif event in _LIST_FIELDS:
+        items = task.setdefault(_LIST_FIELDS[event], [])
+        index = data.get('index', len(items))
+        if index == len(items):
+            items.append(data['value'])
+        elif index < len(items):
+            items[index] = data['value']
+
+
+class TaskJournal:
+    """
+    追加写的任务日志
+
+    - 每个事件一行 JSON，带递增序号 seq，写入成本与事件大小成正比
+    - 每追加 compact_every 条事件，调用 snapshot_provider 生成快照并清空日志
+    - 快照记录 last_seq，先原子替换快照再截断日志；
+      两步之间崩溃时，重放会跳过 seq <= last_seq 的事件
+    - 末尾写了一半的行（进程崩溃）在加载时被忽略
+    """
+
+    def __init__(self, journal_file: Path, snapshot_file: Path,
+                 compact_every: int = 500, fsync: bool = False):
+        self.journal_file = Path(journal_file)
+        self.snapshot_file = Path(snapshot_file)
+        self.compact_every = compact_every
+        self.fsync = fsync
+        self.snapshot_provider: Optional[Callable[[], List[dict]]] = None
+
+        self._lock = threading.RLock()
+        self._seq = 0
+        self._events_since_compact = 0
+        self._file = None
+
+    def load(self) -> Dict[str, dict]:
+        """
+        加载任务：读取快照，再重放快照之后的日志尾部
+
+        Returns:
+            任务 ID 到任务字典的映射
+        """
+        tasks: Dict[str, dict] = {}
+        last_seq = 0
+
+        if self.snapshot_file.exists():
+            try:
+                with open(self.snapshot_file, 'r', encoding='utf-8') as f:
+                    snapshot = json.load(f)
+                # 兼容旧版：整个文件就是任务列表
+                if isinstance(snapshot, list):
+                    task_list = snapshot
+                else:
+                    task_list = snapshot.get('tasks', [])
+                    last_seq = snapshot.get('last_seq', 0)
+                for task_dict in task_list:
+                    tasks[task_dict['id']] = task_dict
+            except Exception as e:
+                logger.error(f"加载任务快照失败: {e}", exc_info=True)
+
+        self._seq = last_seq
+        replayed = 0
+
+        if self.journal_file.exists():
+            valid_size = 0
+            with open(self.journal_file, 'rb') as f:
+                for line_no, raw in enumerate(f, 1):
+                    if not raw.endswith(b'\n'):
+                        # 进程崩溃时写了一半的最后一行
+                        logger.warning(f"丢弃不完整的任务日志行: 第 {line_no} 行")
+                        break
+                    valid_size += len(raw)
+
+                    line = raw.strip()
+                    if not line:
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except (json.JSONDecodeError, UnicodeDecodeError):
+                        logger.warning(f"跳过损坏的任务日志行: 第 {line_no} 行")
+                        continue
+
+                    seq = record.get('seq', 0)
+                    self._seq = max(self._seq, seq)
+                    if seq <= last_seq:
+                        continue
+                    apply_event(tasks, record)
+                    replayed += 1
+
+            # 截掉不完整的尾部，保证后续追加从新行开始
+            if valid_size < self.journal_file.stat().st_size:
+                with open(self.journal_file, 'r+b') as f:
+                    f.truncate(valid_size)
+
+        self._events_since_compact = replayed
+        logger.info(f"任务日志加载完成: 快照 {len(tasks)} 条任务, 重放 {replayed} 条事件")
+        return tasks
+
+    def _open(self):
+        if self._file is None:
+            self.journal_file.parent.mkdir(parents=True, exist_ok=True)
+            self._file = open(self.journal_file, 'a', encoding='utf-8')
+        return self._file
+
+    def append(self, event: str, task_id: str, data: dict):
+        """追加一条事件"""
+        with self._lock:
+            self._seq += 1
+            record = {
+                'seq': self._seq,
+                'ts': datetime.now().isoformat(),
+                'event': event,
+                'task_id': task_id,
+                'data': data,
+            }
+            f = self._open()
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+
+            self._events_since_compact += 1
+            if self.compact_every and self._events_since_compact >= self.compact_every:
+                self.compact()
+
+    def compact(self):
+        """将当前任务写成快照，并清空日志"""
+        if self.snapshot_provider is None:
+            return
+
+        with self._lock:
+            try:
+                tasks = self.snapshot_provider()
+                snapshot = {
+                    'version': 2,
+                    'last_seq': self._seq,
+                    'tasks': tasks,
+                }
+
+                self.snapshot_file.parent.mkdir(parents=True, exist_ok=True)
+                fd, tmp_path = tempfile.mkstemp(dir=self.snapshot_file.parent, prefix='.tmp-')
+                try:
+                    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                        json.dump(snapshot, f, ensure_ascii=False)
+                        f.flush()
+                        os.fsync(f.fileno())
+                    os.replace(tmp_path, self.snapshot_file)
+                except Exception:
+                    if os.path.exists(tmp_path):
+                        os.unlink(tmp_path)
+                    raise
+
+                # 快照已落盘，截断日志
+                if self._file is not None:
+                    self._file.close()
+                self._file = open(self.journal_file, 'w', encoding='utf-8')
+                self._events_since_compact = 0
+
+                logger.debug(f"任务日志已压缩: {len(tasks)} 条任务, last_seq={self._seq}")
+            except Exception as e:
+                logger.error(f"压缩任务日志失败: {e}", exc_info=True)
+
+    def close(self):
+        """关闭日志文件"""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
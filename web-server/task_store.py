@@ -0,0 +1,284 @@
+"""
+SQLite 任务存储模块（可选）
+以 WAL 模式保存全部任务历史，按状态、创建时间和手机建立索引，
+支持 /api/tasks 的筛选和游标分页
+"""
+
+import json
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from task_journal import (
+    EVENT_CREATE, EVENT_UPDATE, EVENT_LOG, EVENT_ACTION, EVENT_SCREENSHOT, EVENT_STEP_TIMING
+)
+
+logger = logging.getLogger(__name__)
+
+# 可通过 update 事件修改的列
+_COLUMNS = (
+    'description', 'status', 'phone_id', 'priority', 'created_at', 'started_at',
+    'completed_at', 'queue_wait_ms', 'thinking', 'error',
+)
+
+# 后续版本新增的标量列（旧版数据库启动时补充）
+_ADDED_COLUMNS = {
+    'priority': "TEXT NOT NULL DEFAULT 'normal'",
+    'queue_wait_ms': "REAL",
+}
+
+# 未完成的任务状态（服务重启后不会再被执行）
+_UNFINISHED_STATUSES = ('pending', 'running')
+
+# 追加类事件对应的 JSON 列
+_JSON_COLUMNS = {
+    EVENT_ACTION: 'actions',
+    EVENT_SCREENSHOT: 'screenshots',
+    EVENT_STEP_TIMING: 'step_timings',
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id TEXT PRIMARY KEY,
+    description TEXT NOT NULL,
+    status TEXT NOT NULL,
+    phone_id TEXT,
+    priority TEXT NOT NULL DEFAULT 'normal',
+    created_at TEXT NOT NULL,
+    started_at TEXT,
+    completed_at TEXT,
+    queue_wait_ms REAL,
+    thinking TEXT,
+    error TEXT,
+    actions TEXT NOT NULL DEFAULT '[]',
+    screenshots TEXT NOT NULL DEFAULT '[]',
+    step_timings TEXT NOT NULL DEFAULT '[]'
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_created ON tasks (created_at);
+CREATE INDEX IF NOT EXISTS idx_tasks_created_id ON tasks (created_at, id);
+CREATE INDEX IF NOT EXISTS idx_tasks_status_created ON tasks (status, created_at);
+CREATE INDEX IF NOT EXISTS idx_tasks_phone_created ON tasks (phone_id, created_at);
+
+CREATE TABLE IF NOT EXISTS task_logs (
+    task_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    message TEXT NOT NULL,
+    PRIMARY KEY (task_id, idx)
+);
+"""
+
+# 分页游标中创建时间与任务 ID 的分隔符
+_CURSOR_SEPARATOR = '|'
+
+
+def make_cursor(created_at: str, task_id: str) -> str:
+    """生成分页游标（创建时间 + 任务 ID，创建时间相同的任务也不会在翻页时被跳过）"""
+    return f"{created_at}{_CURSOR_SEPARATOR}{task_id}"
+
+
+def parse_cursor(cursor: str) -> Tuple[str, str]:
+    """
+    解析分页游标，返回 (created_at, task_id)
+
+    兼容只有创建时间的旧游标：task_id 为空字符串，此时只返回更早创建的任务
+    """
+    created_at, _, task_id = cursor.partition(_CURSOR_SEPARATOR)
+    return created_at, task_id
+
+
+class SqliteTaskStore:
+    """
+    SQLite 任务存储
+
+    与 TaskJournal 提供相同的 append / load / compact / close 接口，
+    另外提供 get 和 query 用于按需读取不在内存中的历史任务。
+    """
+
+    def __init__(self, db_path: Path, load_limit: int = 50):
+        self.db_path = Path(db_path)
+        self.load_limit = load_limit
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = self._conn()
+        conn.executescript(_SCHEMA)
+        self._migrate(conn)
+        conn.commit()
+
+    def _migrate(self, conn: sqlite3.Connection):
+        """为旧版数据库补充新增的列"""
+        existing = {row['name'] for row in conn.execute("PRAGMA table_info(tasks)")}
+        for column, definition in _ADDED_COLUMNS.items():
+            if column not in existing:
+                conn.execute(f"ALTER TABLE tasks ADD COLUMN {column} {definition}")
+        for column in _JSON_COLUMNS.values():
+            if column not in existing:
+                conn.execute(f"ALTER TABLE tasks ADD COLUMN {column} TEXT NOT NULL DEFAULT '[]'")
+
+    def _conn(self) -> sqlite3.Connection:
+        """每个线程一个连接"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.db_path), timeout=10)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def append(self, event: str, task_id: str, data: dict):
+        """写入一条任务事件"""
+        with self._write_lock:
+            conn = self._conn()
+            with conn:
+                if event == EVENT_CREATE:
+                    self._insert_task(conn, data['task'])
+                elif event == EVENT_UPDATE:
+                    fields = {k: v for k, v in data.items() if k in _COLUMNS}
+                    if fields:
+                        assignments = ', '.join(f"{k} = ?" for k in fields)
+                        conn.execute(
+                            f"UPDATE tasks SET {assignments} WHERE id = ?",
+                            (*fields.values(), task_id)
+                        )
+                elif event == EVENT_LOG:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO task_logs (task_id, idx, message) VALUES (?, ?, ?)",
+                        (task_id, data['index'], data['value'])
+                    )
+                elif event in _JSON_COLUMNS:
+                    column = _JSON_COLUMNS[event]
+                    conn.execute(
+                        f"UPDATE tasks SET {column} = json_set({column}, ?, json(?)) WHERE id = ?",
+                        (f"$[{int(data['index'])}]", json.dumps(data['value'], ensure_ascii=False), task_id)
+                    )
+
+    def _insert_task(self, conn: sqlite3.Connection, task: dict):
+        conn.execute(
+            "INSERT OR REPLACE INTO tasks (id, description, status, phone_id, priority, created_at, "
+            "started_at, completed_at, queue_wait_ms, thinking, error, actions, screenshots, step_timings) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                task['id'], task['description'], task['status'], task.get('phone_id'),
+                task.get('priority') or 'normal', task['created_at'], task.get('started_at'),
+                task.get('completed_at'), task.get('queue_wait_ms'),
+                task.get('thinking'), task.get('error'),
+                json.dumps(task.get('actions', []), ensure_ascii=False),
+                json.dumps(task.get('screenshots', []), ensure_ascii=False),
+                json.dumps(task.get('step_timings', []), ensure_ascii=False),
+            )
+        )
+        conn.execute("DELETE FROM task_logs WHERE task_id = ?", (task['id'],))
+        conn.executemany(
+            "INSERT INTO task_logs (task_id, idx, message) VALUES (?, ?, ?)",
+            [(task['id'], i, message) for i, message in enumerate(task.get('logs', []))]
+        )
+
+    def _rows_to_dicts(self, rows: List[sqlite3.Row]) -> List[dict]:
+        if not rows:
+            return []
+
+        ids = [row['id'] for row in rows]
+        logs: Dict[str, List[str]] = {task_id: [] for task_id in ids}
+        placeholders = ', '.join('?' for _ in ids)
+        for log_row in self._conn().execute(
+            f"SELECT task_id, message FROM task_logs WHERE task_id IN ({placeholders}) ORDER BY task_id, idx",
+            ids
+        ):
+            logs[log_row['task_id']].append(log_row['message'])
+
+        tasks = []
+        for row in rows:
+            task = {column: row[column] for column in ('id',) + _COLUMNS}
+            for column in _JSON_COLUMNS.values():
+                task[column] = json.loads(row[column])
+            task['logs'] = logs[row['id']]
+            tasks.append(task)
+        return tasks
+
+    def get(self, task_id: str) -> Optional[dict]:
+        """按 ID 读取任务"""
+        rows = self._conn().execute("SELECT * FROM tasks WHERE id = ?", (task_id,)).fetchall()
+        tasks = self._rows_to_dicts(rows)
+        return tasks[0] if tasks else None
+
+    def query(self, status: Optional[str] = None, phone_id: Optional[str] = None,
+              before: Optional[str] = None, limit: int = 20) -> List[dict]:
+        """
+        按创建时间倒序查询任务（创建时间相同时按 ID 倒序）
+
+        Args:
+            status: 只返回该状态的任务
+            phone_id: 只返回该手机的任务
+            before: 游标（make_cursor），只返回排在该任务之后的任务
+            limit: 最多返回条数
+        """
+        conditions = []
+        params: list = []
+        if status:
+            conditions.append("status = ?")
+            params.append(status)
+        if phone_id:
+            conditions.append("phone_id = ?")
+            params.append(phone_id)
+        if before:
+            conditions.append("(created_at, id) < (?, ?)")
+            params.extend(parse_cursor(before))
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        rows = self._conn().execute(
+            f"SELECT * FROM tasks {where} ORDER BY created_at DESC, id DESC LIMIT ?",
+            (*params, limit)
+        ).fetchall()
+        return self._rows_to_dicts(rows)
+
+    def fail_unfinished(self, error: str, log_entry: str, completed_at: str) -> int:
+        """
+        将所有未完成（排队中、执行中）的任务标记为失败并追加一条日志
+
+        启动时在 load 之前调用：load 只加载最近的任务，更早的未完成任务也需要处理
+
+        Returns:
+            标记的任务数
+        """
+        placeholders = ', '.join('?' for _ in _UNFINISHED_STATUSES)
+        with self._write_lock:
+            conn = self._conn()
+            with conn:
+                conn.execute(
+                    "INSERT INTO task_logs (task_id, idx, message) "
+                    "SELECT id, COALESCE((SELECT MAX(idx) + 1 FROM task_logs WHERE task_id = tasks.id), 0), ? "
+                    f"FROM tasks WHERE status IN ({placeholders})",
+                    (log_entry, *_UNFINISHED_STATUSES)
+                )
+                cursor = conn.execute(
+                    f"UPDATE tasks SET status = 'failed', completed_at = ?, error = ? WHERE status IN ({placeholders})",
+                    (completed_at, error, *_UNFINISHED_STATUSES)
+                )
+        if cursor.rowcount:
+            logger.info(f"SQLite 任务存储: {cursor.rowcount} 条未完成的任务已标记为失败")
+        return cursor.rowcount
+
+    def load(self) -> Dict[str, dict]:
+        """启动时只加载最近的任务到内存，其余按需读取"""
+        tasks = self.query(limit=self.load_limit)
+        logger.info(f"SQLite 任务存储: 已加载最近 {len(tasks)} 条任务")
+        return {task['id']: task for task in tasks}
+
+    def compact(self):
+        """合并 WAL 文件"""
+        with self._write_lock:
+            try:
+                self._conn().execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            except Exception as e:
+                logger.error(f"SQLite checkpoint 失败: {e}", exc_info=True)
+
+    def close(self):
+        """关闭当前线程的连接"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
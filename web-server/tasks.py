@@ -3,43 +3,95 @@
 集成 Open-AutoGLM 的完整 AI 逻辑
 """
 
+import itertools
 import json
 import logging
 import threading
 import time
 import uuid
-import base64
 import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Optional
-from queue import Queue
-from io import BytesIO
+from typing import Callable, Dict, Generator, List, Optional
+from queue import Empty, PriorityQueue
 
 # 添加路径
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'mac-server'))
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'Open-AutoGLM'))
 
-from config import TASK_HISTORY_FILE, MAX_TASK_HISTORY, PHONE_HELPER_URL, PHONE_WHITELIST_FILE
+from config import (
+    TASK_HISTORY_FILE, MAX_TASK_HISTORY, PHONE_HELPER_URL, PHONE_WHITELIST_FILE, SCREENSHOT_DIR,
+    TASK_JOURNAL_FILE, TASK_JOURNAL_COMPACT_EVERY, TASK_JOURNAL_FSYNC, TASK_STORE, TASK_DB_FILE,
+    TASK_CACHE_MAX_MB, TASK_CACHE_MAX_TASKS, TASK_SPILL_FILE,
+    PHONE_IO_MODE, SCREENSHOT_SETTLE_MODE, SCREENSHOT_SETTLE_DELAY, SCREENSHOT_SETTLE_MAX_WAIT,
+    SCREENSHOT_PREFETCH,
+    FRAME_DIFF_ENABLED, FRAME_DIFF_RETRIES, FRAME_DIFF_RETRY_DELAY, FRAME_DIFF_HASH_THRESHOLD,
+    SCREENSHOT_MAX_EDGE, SCREENSHOT_FORMAT, SCREENSHOT_QUALITY, SCREENSHOT_GRAYSCALE,
+    PHONE_HEALTH_INTERVAL, PHONE_HEALTH_TIMEOUT, PHONE_HEALTH_CONCURRENCY
+)
 from phone_controller_remote import PhoneControllerRemote
 from phone_adapter import PhoneControllerAdapter
 from phone_manager import PhoneManager
-
-# 导入 PhoneAgent 相关模块
-try:
-    from phone_agent import PhoneAgent
-    from phone_agent.model import ModelConfig
-    from phone_agent.agent import AgentConfig
-    from phone_agent.device_factory import get_device_factory, set_device_type, DeviceType
-    AI_AVAILABLE = True
-except ImportError as e:
-    logger_temp = logging.getLogger(__name__)
-    logger_temp.warning(f"无法导入 PhoneAgent: {e}")
-    AI_AVAILABLE = False
+from screenshot_store import ScreenshotStore
+from frame_diff import FrameComparator
+from image_policy import ImagePolicy
+from task_journal import (
+    TaskJournal, EVENT_CREATE, EVENT_UPDATE, EVENT_LOG, EVENT_ACTION, EVENT_SCREENSHOT,
+    EVENT_STEP_TIMING
+)
+from task_store import SqliteTaskStore, make_cursor, parse_cursor
+from task_cache import TEXT_FIELDS, TaskCache, estimate_item_bytes
+from task_events import TaskEventBus
+from metrics import RollingStats, Histogram, Counter, Gauge, REGISTRY
+from tracing import span, record, begin_trace, end_trace, span_listeners
+from health import PhoneHealthProber, HEALTH_ONLINE, HEALTH_UNKNOWN
+from lazy_import import is_available
 
 logger = logging.getLogger(__name__)
 
+# PhoneAgent 相关模块在创建第一个 worker 时才导入（见 load_phone_agent），
+# 这里只检查 phone_agent 包是否存在，不执行其中的代码
+AI_AVAILABLE = is_available('phone_agent')
+PhoneAgent = None
+ModelConfig = None
+AgentConfig = None
+_phone_agent_lock = threading.Lock()
+
+# 白名单为空时使用 PHONE_HELPER_URL 的默认手机 ID
+DEFAULT_PHONE_ID = 'default'
+
+# 提交任务时表示"任意空闲手机"的手机 ID，由调度器按负载和延迟选择
+PHONE_ANY = 'any'
+
+# AI 模式单个任务的最大步数
+MAX_AI_STEPS = 20
+
+# 界面稳定耗时直方图的桶上界（毫秒）
+SETTLE_BUCKETS_MS = (50, 100, 200, 300, 500, 750, 1000, 1500, 2000)
+
+# Prometheus 耗时直方图的桶上界（秒）
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+SPAN_DURATION = REGISTRY.register(Histogram(
+    'autoglm_span_duration_seconds', '任务各阶段耗时（含后台预取）', DURATION_BUCKETS, ('span',)))
+STEP_DURATION = REGISTRY.register(Histogram(
+    'autoglm_step_duration_seconds', 'AI 单步总耗时', DURATION_BUCKETS))
+QUEUE_WAIT = REGISTRY.register(Histogram(
+    'autoglm_queue_wait_seconds', '任务排队等待时间', DURATION_BUCKETS))
+SETTLE_DURATION = REGISTRY.register(Histogram(
+    'autoglm_settle_duration_seconds', '动作后界面稳定耗时', DURATION_BUCKETS, ('action',)))
+TASKS_FINISHED = REGISTRY.register(Counter(
+    'autoglm_tasks_finished_total', '已结束的任务数', ('status',)))
+TASK_CACHE_EVICTIONS = REGISTRY.register(Counter(
+    'autoglm_task_cache_evictions_total', '从内存淘汰的任务数'))
+TASK_CACHE_RELOADS = REGISTRY.register(Counter(
+    'autoglm_task_cache_reloads_total', '从磁盘读回内存的任务数'))
+
+span_listeners.append(lambda name, elapsed_ms: SPAN_DURATION.observe(elapsed_ms / 1000, name))
+
 
 class TaskStatus:
     """任务状态枚举"""
@@ -49,21 +101,42 @@ class TaskStatus:
     FAILED = 'failed'        # 失败
 
 
+class TaskPriority:
+    """任务优先级（数值越小越先执行）"""
+    HIGH = 'high'
+    NORMAL = 'normal'
+    LOW = 'low'
+
+    ORDER = {HIGH: 0, NORMAL: 1, LOW: 2}
+
+
 class Task:
     """任务对象"""
 
-    def __init__(self, description: str, task_id: str = None):
+    def __init__(self, description: str, task_id: str = None, phone_id: str = None,
+                 priority: str = TaskPriority.NORMAL):
         self.id = task_id or str(uuid.uuid4())
         self.description = description
+        self.phone_id = phone_id  # 执行任务的手机 ID
+        self.priority = priority
+        self.queue_wait_ms: Optional[float] = None  # 从入队到开始执行的等待时间
+        self.enqueued_at: Optional[float] = None  # 入队时间（monotonic，不持久化）
         self.status = TaskStatus.PENDING
         self.created_at = datetime.now().isoformat()
         self.started_at: Optional[str] = None
         self.completed_at: Optional[str] = None
         self.logs: List[str] = []
-        self.screenshots: List[str] = []  # 支持多张截图
+        self.screenshots: List[str] = []  # 截图引用（/api/screenshots/<hash>），支持多张
         self.thinking: Optional[str] = None  # AI 思考过程
         self.actions: List[dict] = []  # AI 执行的动作列表
+        self.step_timings: List[dict] = []  # 每一步的耗时（毫秒）
         self.error: Optional[str] = None
+        self._listeners: List[Callable[['Task', str, dict], None]] = []
+
+    @property
+    def cursor(self) -> str:
+        """任务列表的分页游标（创建时间 + ID）"""
+        return make_cursor(self.created_at, self.id)
 
     @property
     def screenshot(self) -> Optional[str]:
@@ -73,30 +146,39 @@ class Task:
     @screenshot.setter
     def screenshot(self, value: str):
         """兼容旧版本，添加截图"""
-        if value:
-            self.screenshots.append(value)
+        self.add_screenshot(value)
 
     def to_dict(self) -> dict:
         """转换为字典"""
         return {
             'id': self.id,
             'description': self.description,
+            'phone_id': self.phone_id,
+            'priority': self.priority,
             'status': self.status,
             'created_at': self.created_at,
             'started_at': self.started_at,
             'completed_at': self.completed_at,
+            'queue_wait_ms': self.queue_wait_ms,
             'logs': self.logs,
             'screenshot': self.screenshot,  # 兼容旧版本
             'screenshots': self.screenshots,
             'thinking': self.thinking,
             'actions': self.actions,
+            'step_timings': self.step_timings,
+            'timing_breakdown': self.timing_breakdown(),
+            'frame_diff': self.frame_diff_stats(),
             'error': self.error,
         }
 
     @classmethod
     def from_dict(cls, data: dict) -> 'Task':
         """从字典创建任务"""
-        task = cls(data['description'], data['id'])
+        task = cls(
+            data['description'], data['id'], data.get('phone_id'),
+            data.get('priority', TaskPriority.NORMAL)
+        )
+        task.queue_wait_ms = data.get('queue_wait_ms')
         task.status = data['status']
         task.created_at = data['created_at']
         task.started_at = data.get('started_at')
@@ -105,111 +187,273 @@ class Task:
         task.screenshots = data.get('screenshots', [])
         task.thinking = data.get('thinking')
         task.actions = data.get('actions', [])
+        task.step_timings = data.get('step_timings', [])
         task.error = data.get('error')
         return task
 
+    def add_listener(self, callback: Callable[['Task', str, dict], None]):
+        """注册变更监听器，回调参数为 (task, event, data)"""
+        self._listeners.append(callback)
+
+    def _notify(self, event: str, data: dict):
+        """通知监听器"""
+        for callback in self._listeners:
+            try:
+                callback(self, event, data)
+            except Exception as e:
+                logger.error(f"任务事件处理失败 ({event}): {e}", exc_info=True)
+
+    def update(self, **fields):
+        """更新任务字段（状态、时间、错误等）"""
+        for key, value in fields.items():
+            setattr(self, key, value)
+        self._notify(EVENT_UPDATE, fields)
+
+    def add_action(self, action: dict):
+        """添加 AI 执行的动作"""
+        self.actions.append(action)
+        self._notify(EVENT_ACTION, {'index': len(self.actions) - 1, 'value': action})
+
+    def add_step_timing(self, timing: dict):
+        """添加单步耗时"""
+        self.step_timings.append(timing)
+        self._notify(EVENT_STEP_TIMING, {'index': len(self.step_timings) - 1, 'value': timing})
+
+    def timing_breakdown(self) -> dict:
+        """所有 AI 步骤的各阶段耗时之和（毫秒），顶层阶段相加约等于步骤总耗时"""
+        totals: Dict[str, float] = {}
+        for timing in self.step_timings:
+            for name, elapsed_ms in timing.get('spans', {}).items():
+                totals[name] = totals.get(name, 0.0) + elapsed_ms
+        return {name: round(elapsed_ms, 1) for name, elapsed_ms in totals.items()}
+
+    def frame_diff_stats(self) -> dict:
+        """
+        帧差异检测命中率
+        unchanged 为检测到画面未变化的步数，recovered 为等待重截后画面出现变化的步数
+        """
+        checks = [t['frame'] for t in self.step_timings if t.get('frame')]
+        unchanged = sum(1 for frame in checks if frame['retries'] > 0)
+        return {
+            'checks': len(checks),
+            'unchanged': unchanged,
+            'recovered': sum(1 for frame in checks if frame['retries'] > 0 and not frame['unchanged']),
+            'hit_rate': round(unchanged / len(checks), 3) if checks else None,
+        }
+
+    def add_screenshot(self, ref: str):
+        """添加截图引用"""
+        if ref:
+            self.screenshots.append(ref)
+            self._notify(EVENT_SCREENSHOT, {'index': len(self.screenshots) - 1, 'value': ref})
+
     def add_log(self, message: str):
         """添加日志"""
         timestamp = datetime.now().strftime('%H:%M:%S')
         log_entry = f"[{timestamp}] {message}"
         self.logs.append(log_entry)
         logger.info(f"任务 {self.id[:8]}: {message}")
+        self._notify(EVENT_LOG, {'index': len(self.logs) - 1, 'value': log_entry})
 
 
-class TaskManager:
+def create_phone_controller(helper_url: str):
     """
-    任务管理器（单例，AI 增强版）
-    集成 Open-AutoGLM 的完整 AI 规划能力
+    按 PHONE_IO_MODE 创建手机控制器
+    - sync（默认）: PhoneControllerRemote，基于 requests 连接池
+    - async: SyncPhoneController，所有手机的请求共享一个 aiohttp 事件循环
+
+    创建时不测试连接（不发起网络请求），连接状态由 TaskManager.health 在后台探测
     """
+    if PHONE_IO_MODE == 'async':
+        # 只有 async 模式才导入 aiohttp
+        from phone_controller_async import SyncPhoneController
+        return SyncPhoneController(helper_url=helper_url, check_connection=False)
+    return PhoneControllerRemote(helper_url=helper_url, check_connection=False)
 
-    _instance = None
-    _lock = threading.Lock()
 
-    def __new__(cls):
-        if cls._instance is None:
-            with cls._lock:
-                if cls._instance is None:
-                    cls._instance = super().__new__(cls)
-        return cls._instance
+class RoutingDeviceFactory:
+    """
+    按线程路由的 device_factory
+
+    phone_agent 通过全局 device_factory 操作手机；多台手机并发执行时，
+    每个 worker 线程绑定自己的适配器，调用按当前线程转发到对应手机。
+    """
 
     def __init__(self):
-        if hasattr(self, '_initialized'):
-            return
+        self._local = threading.local()
+
+    def bind(self, adapter: PhoneControllerAdapter):
+        """将当前线程绑定到指定手机的适配器"""
+        self._local.adapter = adapter
+
+    @property
+    def adapter(self) -> PhoneControllerAdapter:
+        adapter = getattr(self._local, 'adapter', None)
+        if adapter is None:
+            raise Exception("当前线程未绑定手机")
+        return adapter
+
+    def get_screenshot(self, device_id=None, timeout=10):
+        return self.adapter.get_screenshot(device_id, timeout)
+
+    def get_current_app(self, device_id=None):
+        return self.adapter.get_current_app(device_id)
+
+    def tap(self, x, y, device_id=None, delay=None):
+        return self.adapter.tap(x, y, device_id, delay)
+
+    def double_tap(self, x, y, device_id=None, delay=None):
+        # 两次点击和间隔在适配器中合并为一次批量请求（/batch）
+        return self.adapter.double_tap(x, y, device_id, delay)
+
+    def swipe(self, start_x, start_y, end_x, end_y, duration_ms=None, device_id=None, delay=None):
+        return self.adapter.swipe(start_x, start_y, end_x, end_y, duration_ms, device_id, delay)
+
+    def type_text(self, text, device_id=None):
+        return self.adapter.type_text(text, device_id)
+
+    def long_press(self, x, y, duration_ms=3000, device_id=None, delay=None):
+        return self.adapter.long_press(x, y, duration_ms, device_id, delay)
+
+    def back(self, device_id=None, delay=None):
+        return self.adapter.back(device_id, delay)
+
+    def home(self, device_id=None, delay=None):
+        return self.adapter.home(device_id, delay)
+
+    def launch_app(self, app_name, device_id=None, delay=None):
+        return self.adapter.launch_app(app_name, device_id, delay)
+
+    def clear_text(self, device_id=None):
+        return self.adapter.clear_text(device_id)
+
+    def detect_and_set_adb_keyboard(self, device_id=None):
+        return self.adapter.detect_and_set_adb_keyboard(device_id)
+
+    def restore_keyboard(self, ime, device_id=None):
+        return self.adapter.restore_keyboard(ime, device_id)
+
+    def list_devices(self):
+        return self.adapter.list_devices()
+
+
+# 全局路由 device_factory，替换 phone_agent 默认的 ADB 实现
+device_router = RoutingDeviceFactory()
+
+# 任务执行过程（PhoneWorker._task_plan）：依次产出需要阻塞执行的单元，单元的结果通过 send 传回
+TaskPlan = Generator[Callable[[], object], object, None]
+
+
+def advance_plan(plan: TaskPlan, unit: Optional[Callable[[], object]] = None) -> Optional[Callable[[], object]]:
+    """
+    执行一个单元，把结果（或异常）传回 plan，返回下一个单元；plan 结束时返回 None
+
+    unit 为 None 时启动 plan。线程模式在 worker 线程中循环调用，
+    异步模式由 AsyncStepRunner 在线程池中逐次调用，单元之间不占用线程
+    """
+    try:
+        if unit is None:
+            return next(plan)
+        try:
+            result = unit()
+        except Exception as e:
+            return plan.throw(e)
+        return plan.send(result)
+    except StopIteration:
+        return None
+
+
+def load_phone_agent() -> bool:
+    """
+    导入 PhoneAgent 相关模块，并把 phone_agent 的全局 device_factory 换成 device_router
+    只在第一次调用时导入，之后直接返回结果
+
+    Returns:
+        AI 功能是否可用
+    """
+    global AI_AVAILABLE, PhoneAgent, ModelConfig, AgentConfig
+
+    with _phone_agent_lock:
+        if PhoneAgent is not None or not AI_AVAILABLE:
+            return AI_AVAILABLE
+
+        try:
+            from phone_agent import PhoneAgent
+            from phone_agent.model import ModelConfig
+            from phone_agent.agent import AgentConfig
+            import phone_agent.device_factory as device_factory_module
+        except ImportError as e:
+            logger.warning(f"无法导入 PhoneAgent: {e}")
+            AI_AVAILABLE = False
+            return False
+
+        device_factory_module._device_factory = device_router
+        return True
+
+
+class PhoneWorker:
+    """
+    单台手机的任务执行器
+    每台手机拥有独立的任务队列、执行线程、控制器和 PhoneAgent，多台手机并发执行
+    """
+
+    def __init__(self, manager: 'TaskManager', phone_id: str, name: str, helper_url: str):
+        self.manager = manager
+        self.phone_id = phone_id
+        self.name = name
+        self.helper_url = helper_url
 
-        self._initialized = True
         self.current_task: Optional[Task] = None
-        self.task_queue = Queue()
-        self.task_history: Dict[str, Task] = {}
+        # 优先级队列: (优先级, 序号, 任务)，同一优先级按提交顺序执行
+        self.task_queue = PriorityQueue()
+        self._sequence = itertools.count()
         self.worker_thread: Optional[threading.Thread] = None
+        # async 模式下不创建执行线程，所有手机的任务由同一个事件循环推进
+        self.step_runner = None
+        if PHONE_IO_MODE == 'async':
+            from async_runner import get_step_runner
+            self.step_runner = get_step_runner()
         self.running = False
         self.phone_agent: Optional['PhoneAgent'] = None
+        self.adapter: Optional[PhoneControllerAdapter] = None
+        self.queue_wait_stats = RollingStats()
+        self.frame_comparator = FrameComparator(FRAME_DIFF_HASH_THRESHOLD) if FRAME_DIFF_ENABLED else None
 
-        # 初始化手机管理器
-        self.phone_manager = PhoneManager(PHONE_WHITELIST_FILE)
-
-        # 初始化手机控制器（从白名单获取或使用环境变量）
+        # 初始化手机控制器
         try:
-            # 优先使用白名单中的激活手机
-            active_phone_url = self.phone_manager.get_active_phone_url()
-            helper_url = active_phone_url if active_phone_url else PHONE_HELPER_URL
-
-            self.phone_controller = PhoneControllerRemote(helper_url=helper_url)
-            logger.info(f"✅ 手机控制器初始化成功 ({helper_url})")
+            self.phone_controller = create_phone_controller(helper_url)
+            self.adapter = PhoneControllerAdapter(
+                self.phone_controller,
+                settle_mode=SCREENSHOT_SETTLE_MODE,
+                settle_delay=SCREENSHOT_SETTLE_DELAY,
+                settle_max_wait=SCREENSHOT_SETTLE_MAX_WAIT,
+                image_policy=ImagePolicy(
+                    max_edge=SCREENSHOT_MAX_EDGE,
+                    format=SCREENSHOT_FORMAT,
+                    quality=SCREENSHOT_QUALITY,
+                    grayscale=SCREENSHOT_GRAYSCALE,
+                ),
+                prefetch=SCREENSHOT_PREFETCH,
+            )
+            self.adapter.settle_listeners.append(self.manager.record_settle)
+            self.manager.health.register(phone_id, self.phone_controller)
+            logger.info(f"✅ 手机控制器已创建: {name} ({helper_url})")
         except Exception as e:
-            logger.error(f"❌ 手机控制器初始化失败: {e}")
+            logger.error(f"❌ 手机控制器初始化失败: {name} ({e})")
             self.phone_controller = None
 
         # 初始化 AI Agent（如果可用）
-        if AI_AVAILABLE and self.phone_controller:
+        if self.phone_controller and load_phone_agent():
             try:
                 self._init_phone_agent()
             except Exception as e:
                 logger.error(f"❌ PhoneAgent 初始化失败: {e}", exc_info=True)
                 self.phone_agent = None
         else:
-            logger.warning("⚠️ AI 功能不可用，将使用简单模式")
-
-        # 加载历史记录
-        self._load_history()
+            logger.warning(f"⚠️ AI 功能不可用，{name} 将使用简单模式")
 
     def _init_phone_agent(self):
         """初始化 PhoneAgent"""
-        # 创建适配器
-        adapter = PhoneControllerAdapter(self.phone_controller)
-
-        # 创建自定义 device_factory
-        class CustomDeviceFactory:
-            def __init__(self, adapter):
-                self.adapter = adapter
-
-            def get_screenshot(self, device_id=None, timeout=10):
-                return self.adapter.get_screenshot(device_id, timeout)
-
-            def get_current_app(self, device_id=None):
-                return self.adapter.get_current_app(device_id)
-
-            def tap(self, x, y, device_id=None, delay=None):
-                return self.adapter.tap(x, y, device_id, delay)
-
-            def swipe(self, start_x, start_y, end_x, end_y, duration_ms=None, device_id=None, delay=None):
-                return self.adapter.swipe(start_x, start_y, end_x, end_y, duration_ms, device_id, delay)
-
-            def type_text(self, text, device_id=None):
-                return self.adapter.type_text(text, device_id)
-
-            def long_press(self, x, y, duration_ms=3000, device_id=None, delay=None):
-                return self.adapter.long_press(x, y, duration_ms, device_id, delay)
-
-            def back(self, device_id=None, delay=None):
-                return self.adapter.back(device_id, delay)
-
-            def home(self, device_id=None, delay=None):
-                return self.adapter.home(device_id, delay)
-
-        # 替换全局 device_factory
-        import phone_agent.device_factory as factory_module
-        factory_module._device_factory = CustomDeviceFactory(adapter)
-
         # 读取配置
         api_key = os.getenv('PHONE_AGENT_API_KEY', 'EMPTY')
         base_url = os.getenv('PHONE_AGENT_BASE_URL', 'https://api.grsai.com/v1')
@@ -225,241 +469,410 @@ class TaskManager:
 
         # 创建 AgentConfig
         agent_config = AgentConfig(
-            max_steps=20,  # 最多 20 步
+            max_steps=MAX_AI_STEPS,
             lang='cn',
             verbose=True
         )
 
-        # 创建 PhoneAgent
+        # 创建 PhoneAgent（每台手机一个，互不共享上下文）
         self.phone_agent = PhoneAgent(
             model_config=model_config,
             agent_config=agent_config
         )
 
-        logger.info("✅ PhoneAgent 初始化成功")
+        logger.info(f"✅ PhoneAgent 初始化成功: {self.name}")
         logger.info(f"   - API Base URL: {base_url}")
         logger.info(f"   - Model: {model_name}")
 
-    def submit_task(self, description: str) -> Task:
-        """提交新任务"""
-        task = Task(description)
-        task.add_log("任务已提交到队列")
-
-        # 添加到队列
-        self.task_queue.put(task)
-
-        # 添加到历史
-        self.task_history[task.id] = task
-
-        # 启动 worker（如果未启动）
+    def submit(self, task: Task):
+        """将任务按优先级加入本手机的队列"""
+        task.enqueued_at = time.monotonic()
+        priority = TaskPriority.ORDER.get(task.priority, TaskPriority.ORDER[TaskPriority.NORMAL])
+        self._put((priority, next(self._sequence), task))
         if not self.running:
-            self.start_worker()
+            self.start()
 
-        logger.info(f"任务已提交: {task.id}, 描述: {description}")
-        return task
+    def _put(self, item: tuple):
+        """加入队列，async 模式下唤醒事件循环中等待的协程"""
+        self.task_queue.put(item)
+        if self.step_runner:
+            self.step_runner.wake(self)
 
-    def get_task(self, task_id: str) -> Optional[Task]:
-        """获取任务"""
-        return self.task_history.get(task_id)
+    def queue_size(self) -> int:
+        """等待中的任务数"""
+        return self.task_queue.qsize()
 
-    def get_current_task(self) -> Optional[Task]:
-        """获取当前正在执行的任务"""
-        return self.current_task
-
-    def get_recent_tasks(self, limit: int = 20) -> List[Task]:
-        """获取最近的任务列表"""
-        tasks = sorted(
-            self.task_history.values(),
-            key=lambda t: t.created_at,
-            reverse=True
-        )
-        return tasks[:limit]
+    def load(self) -> int:
+        """等待中和正在执行的任务数"""
+        return self.queue_size() + (1 if self.current_task else 0)
 
-    def start_worker(self):
-        """启动任务执行线程"""
+    def latency_ms(self) -> Optional[float]:
+        """
+        最近的截图往返耗时中位数（毫秒）
+        还没有执行过任务时用健康检查的探测延迟估计，没有任何样本返回 None
+        """
+        if self.adapter and self.adapter.capture_stats.count:
+            return self.adapter.capture_stats.percentile(0.5)
+        return self.manager.health.get_latency(self.phone_id)
+
+    def start(self):
+        """启动执行线程（async 模式下在共享事件循环中启动该手机的协程）"""
         if self.running:
-            logger.warning("Worker 已在运行")
             return
 
         self.running = True
-        self.worker_thread = threading.Thread(target=self._worker_loop, daemon=True)
-        self.worker_thread.start()
-        logger.info("任务 worker 已启动")
+        if self.step_runner:
+            self.step_runner.start(self)
+            logger.info(f"任务 worker 已启动（事件循环）: {self.name}")
+            return
 
-    def stop_worker(self):
-        """停止任务执行线程"""
-        self.running = False
-        if self.worker_thread:
-            self.worker_thread.join(timeout=5)
-        logger.info("任务 worker 已停止")
+        self.worker_thread = threading.Thread(
+            target=self._worker_loop,
+            name=f"worker-{self.phone_id[:8]}",
+            daemon=True
+        )
+        self.worker_thread.start()
+        logger.info(f"任务 worker 已启动: {self.name}")
 
-    def switch_phone(self, phone_id: str) -> bool:
+    def stop(self, timeout: float = 5):
         """
-        切换到指定手机
+        停止执行线程
+        当前任务执行完后退出，队列中等待的任务保留，重新 start 后继续执行
+        """
+        if not self.running:
+            return
 
-        Args:
-            phone_id: 手机 ID
+        self.running = False
+        # 停止信号优先级最高，排在所有等待任务之前
+        self._put((-1, next(self._sequence), None))
+        if self.step_runner:
+            self.step_runner.join(self, timeout)
+        elif self.worker_thread:
+            self.worker_thread.join(timeout=timeout)
+        logger.info(f"任务 worker 已停止: {self.name}")
+
+    def cancel_pending(self, reason: str) -> int:
+        """
+        取消队列中等待的任务（手机被删除时调用）：标记为失败，实时日志的订阅者随之收到 end 事件
 
         Returns:
-            是否切换成功
+            取消的任务数
         """
-        try:
-            # 检查手机是否存在
-            phone = self.phone_manager.get_phone(phone_id)
-            if not phone:
-                logger.error(f"手机不存在: {phone_id}")
-                return False
-
-            # 设置为激活状态
-            if not self.phone_manager.set_active_phone(phone_id):
-                return False
-
-            # 重新初始化手机控制器
-            phone_url = phone['url']
-            self.phone_controller = PhoneControllerRemote(helper_url=phone_url)
-            logger.info(f"✅ 已切换到手机: {phone['name']} ({phone_url})")
-
-            # 如果有 AI Agent，需要重新初始化
-            if AI_AVAILABLE:
-                try:
-                    self._init_phone_agent()
-                    logger.info("✅ PhoneAgent 已重新初始化")
-                except Exception as e:
-                    logger.error(f"⚠️ PhoneAgent 重新初始化失败: {e}")
-                    self.phone_agent = None
-
-            return True
-
-        except Exception as e:
-            logger.error(f"切换手机失败: {e}", exc_info=True)
-            return False
+        cancelled = []
+        stop_signals = []
+        while True:
+            try:
+                item = self.task_queue.get_nowait()
+            except Empty:
+                break
+            self.task_queue.task_done()
+            if item[2] is None:
+                # 执行线程还在处理当前任务（stop 等待超时），保留停止信号让它退出
+                stop_signals.append(item)
+            else:
+                cancelled.append(item[2])
+        for item in stop_signals:
+            self._put(item)
+
+        for task in cancelled:
+            task.add_log(f"❌ 任务已取消: {reason}")
+            task.update(
+                status=TaskStatus.FAILED,
+                completed_at=datetime.now().isoformat(),
+                error=reason
+            )
+            TASKS_FINISHED.inc(TaskStatus.FAILED)
+        if cancelled:
+            logger.warning(f"已取消 {len(cancelled)} 个排队中的任务: {reason}")
+        return len(cancelled)
 
     def _worker_loop(self):
-        """Worker 主循环"""
-        logger.info("Worker 循环已启动")
+        """Worker 主循环：阻塞等待任务，收到停止信号后退出"""
+        logger.info(f"Worker 循环已启动: {self.name}")
 
-        while self.running:
-            try:
-                # 从队列获取任务
-                if not self.task_queue.empty():
-                    task = self.task_queue.get(timeout=1)
-                    self.current_task = task
+        self.bind_device()
 
-                    # 执行任务
-                    self._execute_task(task)
+        while True:
+            _, _, task = self.task_queue.get()
+            try:
+                if task is None:
+                    break
 
-                    self.current_task = None
-                    self.task_queue.task_done()
-                else:
-                    time.sleep(0.5)
+                self.current_task = task
+                self._execute_task(task)
 
             except Exception as e:
                 logger.error(f"Worker 循环错误: {e}", exc_info=True)
-                time.sleep(1)
+            finally:
+                self.current_task = None
+                self.task_queue.task_done()
 
-        logger.info("Worker 循环已退出")
+        logger.info(f"Worker 循环已退出: {self.name}")
 
     def _execute_task(self, task: Task):
-        """执行单个任务"""
-        try:
-            task.status = TaskStatus.RUNNING
-            task.started_at = datetime.now().isoformat()
-            task.add_log("开始执行任务...")
+        """在当前线程中执行单个任务"""
+        plan = self._task_plan(task)
+        unit = advance_plan(plan)
+        while unit is not None:
+            unit = advance_plan(plan, unit)
+
+    def bind_device(self):
+        """phone_agent 在当前线程内的设备操作都转发到这台手机"""
+        if self.adapter:
+            device_router.bind(self.adapter)
+
+    def _task_plan(self, task: Task) -> TaskPlan:
+        """
+        单个任务的执行过程（线程模式和 async 模式共用）
 
+        健康检查、模型调用和动作等阻塞操作作为单元产出，由调用方执行后传回结果或异常（见 advance_plan）
+        """
+        wait_ms = (time.monotonic() - task.enqueued_at) * 1000
+        self.queue_wait_stats.add(wait_ms)
+        self.manager.queue_wait_stats.add(wait_ms)
+        QUEUE_WAIT.observe(wait_ms / 1000)
+        task.update(queue_wait_ms=round(wait_ms, 1))
+
+        self._begin_task(task)
+        try:
             # 检查手机控制器是否可用
             if not self.phone_controller:
-                raise Exception("手机控制器未初始化")
+                raise Exception(f"手机控制器未初始化: {self.name}")
+            yield self._ensure_online
 
             # 使用 AI Agent（如果可用）
             if self.phone_agent:
-                self._execute_with_ai(task)
+                yield from self._ai_plan(task)
             else:
-                self._execute_simple(task)
+                yield partial(self._execute_simple, task)
 
-            # 完成
-            task.status = TaskStatus.COMPLETED
-            task.completed_at = datetime.now().isoformat()
-            task.add_log("✅ 任务执行完成")
+            self._finish_task(task)
 
         except Exception as e:
-            task.status = TaskStatus.FAILED
-            task.completed_at = datetime.now().isoformat()
-            task.error = str(e)
-            task.add_log(f"❌ 任务执行失败: {e}")
-            logger.error(f"任务 {task.id} 执行失败: {e}", exc_info=True)
+            self._fail_task(task, e)
 
-        finally:
-            # 保存历史
-            self._save_history()
+    def _ensure_online(self):
+        """
+        确认手机可用：后台探测结果为在线时直接返回，
+        否则（尚未探测或已离线）立即探测一次，手机可能已经恢复
+        """
+        health = self.manager.health
+        if health.is_online(self.phone_id):
+            return
+        status = health.check(self.phone_id)
+        if status and status['state'] != HEALTH_ONLINE:
+            raise Exception(f"手机不可用: {self.name} ({status['error']})")
+
+    def _begin_task(self, task: Task):
+        """标记任务开始执行"""
+        task.update(status=TaskStatus.RUNNING, started_at=datetime.now().isoformat())
+        task.add_log("开始执行任务...")
+
+    def _finish_task(self, task: Task):
+        """标记任务完成"""
+        task.add_log("✅ 任务执行完成")
+        task.update(status=TaskStatus.COMPLETED, completed_at=datetime.now().isoformat())
+        TASKS_FINISHED.inc(TaskStatus.COMPLETED)
+
+    def _fail_task(self, task: Task, error: Exception):
+        """标记任务失败"""
+        task.add_log(f"❌ 任务执行失败: {error}")
+        task.update(
+            status=TaskStatus.FAILED,
+            completed_at=datetime.now().isoformat(),
+            error=str(error)
+        )
+        TASKS_FINISHED.inc(TaskStatus.FAILED)
+        logger.error(f"任务 {task.id} 执行失败: {error}", exc_info=True)
 
-    def _execute_with_ai(self, task: Task):
+    def _ai_plan(self, task: Task) -> TaskPlan:
         """
-        使用 PhoneAgent 执行任务（完整 AI 逻辑）
+        使用 PhoneAgent 执行任务（完整 AI 逻辑），每一步为一个单元
         """
+        yield partial(self._start_ai_task, task)
+
+        # 执行任务，逐步执行
+        step_count = 0
+        while step_count < MAX_AI_STEPS:
+            try:
+                finished = yield partial(self._execute_ai_step, task, step_count)
+                step_count += 1
+                if finished:
+                    break
+
+            except Exception as e:
+                task.add_log(f"⚠️ 步骤执行错误: {e}")
+                logger.error(f"步骤 {step_count} 执行错误: {e}", exc_info=True)
+                break
+
+        if step_count >= MAX_AI_STEPS:
+            task.add_log("⚠️ 达到最大步数限制")
+
+    def _start_ai_task(self, task: Task):
+        """AI 任务开始前的准备"""
         task.add_log("🤖 使用 AI 规划模式")
         task.add_log("正在分析任务...")
 
         # 重置 agent 状态
         self.phone_agent.reset()
+        if self.adapter:
+            self.adapter.reset()
+        if self.frame_comparator:
+            self.frame_comparator.reset()
 
-        # 执行任务，逐步执行
-        step_count = 0
-        max_steps = 20
+    def _execute_ai_step(self, task: Task, step_index: int) -> bool:
+        """
+        执行一步 AI 规划（截图 -> 模型 -> 动作），并记录思考、动作和截图
 
-        while step_count < max_steps:
-            try:
-                # 执行一步
-                task.add_log(f"执行第 {step_count + 1} 步...")
+        Args:
+            task: 当前任务
+            step_index: 步骤序号（从 0 开始）
 
-                # 第一步传入任务描述
-                if step_count == 0:
-                    result = self.phone_agent.step(task.description)
-                else:
-                    result = self.phone_agent.step()
+        Returns:
+            任务是否已完成
+        """
+        task.add_log(f"执行第 {step_index + 1} 步...")
+        total_start = time.monotonic()
+        trace = begin_trace()
+        try:
+            frame = None
+            if step_index > 0:
+                frame = self._wait_for_frame_change(task)
+            step_start = time.monotonic()
+            traced_before_step = trace.top_level_ms()
+
+            # 第一步传入任务描述
+            if step_index == 0:
+                result = self.phone_agent.step(task.description)
+            else:
+                result = self.phone_agent.step()
 
-                step_count += 1
+            # 动作已执行，立即在后台等待界面稳定并预取下一帧，
+            # 与下面的记录、持久化和事件推送并行
+            if not result.finished and self.adapter:
+                self.adapter.prefetch_screenshot()
+            step_ms = (time.monotonic() - step_start) * 1000
 
+            # 模型请求在 PhoneAgent 内部，无法直接埋点：
+            # 单步耗时减去其中的截图、动作和界面稳定等待，剩下的即为模型请求（含构造请求）
+            record('model', max(0.0, step_ms - (trace.top_level_ms() - traced_before_step)))
+
+            with span('persist'):
                 # 记录思考过程
                 if result.thinking:
-                    task.thinking = result.thinking
+                    task.update(thinking=result.thinking)
                     task.add_log(f"💭 AI 思考: {result.thinking[:100]}...")
 
                 # 记录动作
                 if result.action:
-                    task.actions.append(result.action)
+                    task.add_action(result.action)
                     action_type = result.action.get('_metadata', 'unknown')
                     task.add_log(f"🎯 执行动作: {action_type}")
 
-                # 获取截图
-                try:
-                    screenshot = self.phone_agent._context[-2] if len(self.phone_agent._context) >= 2 else None
-                    if screenshot and 'content' in screenshot:
-                        for content in screenshot['content']:
-                            if isinstance(content, dict) and content.get('type') == 'image_url':
-                                # 提取 base64 图片
-                                image_url = content.get('image_url', {}).get('url', '')
-                                if image_url.startswith('data:image'):
-                                    task.screenshots.append(image_url)
-                                    task.add_log("📸 已保存截图")
-                                    break
-                except Exception as e:
-                    logger.debug(f"提取截图失败: {e}")
-
-                # 检查是否完成
-                if result.finished:
-                    task.add_log(f"✅ 任务完成: {result.message or '操作成功'}")
-                    break
+                # 保存本步模型看到的截图：优先使用适配器保留的原始 JPEG，避免 base64 解码
+                if not self._save_step_screenshot(task):
+                    self._save_context_screenshot(task)
+        finally:
+            end_trace()
+
+        total_ms = (time.monotonic() - total_start) * 1000
+        STEP_DURATION.observe(total_ms / 1000)
+        self._record_step_timing(task, step_index, step_ms, frame, trace.to_dict(), total_ms)
+
+        # 检查是否完成
+        if result.finished:
+            task.add_log(f"✅ 任务完成: {result.message or '操作成功'}")
+            return True
+        return False
 
-                # 短暂延迟
-                time.sleep(0.5)
+    def _wait_for_frame_change(self, task: Task) -> Optional[dict]:
+        """
+        检查上一步的动作是否产生了可见变化
+
+        点到空白处或页面仍在加载时画面不变，此时先等待并重新截图，
+        而不是把相同的画面再发给模型；重试用尽后仍正常执行这一步。
+        等待预取截图的时间记为 settle / screenshot.wait，比较和重试等待记为 frame_diff
+
+        Returns:
+            比较结果（含重试次数），无法比较时返回 None
+        """
+        if not self.frame_comparator or not self.adapter:
+            return None
 
+        retries = 0
+        while True:
+            try:
+                screenshot = self.adapter.peek_screenshot()
             except Exception as e:
-                task.add_log(f"⚠️ 步骤执行错误: {e}")
-                logger.error(f"步骤 {step_count} 执行错误: {e}", exc_info=True)
-                break
+                logger.debug(f"帧差异检测截图失败: {e}")
+                return None
+
+            with span('frame_diff'):
+                diff = self.frame_comparator.compare(screenshot.data)
+                if diff is None:
+                    return None
+                if not diff.unchanged or retries >= FRAME_DIFF_RETRIES:
+                    break
 
-        if step_count >= max_steps:
-            task.add_log("⚠️ 达到最大步数限制")
+                retries += 1
+                task.add_log(f"⏳ 画面没有变化，等待后重新截图 ({retries}/{FRAME_DIFF_RETRIES})")
+                self.adapter.cancel_prefetch()
+                time.sleep(FRAME_DIFF_RETRY_DELAY)
+                self.adapter.prefetch_screenshot()
+
+        frame = diff.to_dict()
+        frame['retries'] = retries
+        return frame
+
+    def _record_step_timing(self, task: Task, step_index: int, step_ms: float, frame: dict = None,
+                            spans: dict = None, total_ms: float = None):
+        """
+        记录单步耗时
+        step_ms 为 PhoneAgent.step 耗时，total_ms 含帧差异检测和持久化；
+        spans 为各阶段耗时分解，saved_ms 为预取节省的等待时间，frame 为帧差异检测结果
+        """
+        timing = dict(self.adapter.last_screenshot_timing or {}) if self.adapter else {}
+        timing['step'] = step_index + 1
+        timing['step_ms'] = round(step_ms, 1)
+        if total_ms is not None:
+            timing['total_ms'] = round(total_ms, 1)
+        if spans:
+            timing['spans'] = spans
+        if frame:
+            timing['frame'] = frame
+        if timing.get('prefetched'):
+            timing['saved_ms'] = round(
+                max(0.0, timing['settle_ms'] + timing['capture_ms'] - timing['wait_ms']), 1
+            )
+        task.add_step_timing(timing)
+
+    def _save_step_screenshot(self, task: Task) -> bool:
+        """保存适配器最近一次提供给模型的截图"""
+        screenshot = self.adapter.last_screenshot if self.adapter else None
+        if screenshot is None:
+            return False
+        self.adapter.last_screenshot = None
+        if self.frame_comparator:
+            self.frame_comparator.remember(screenshot.data)
+        task.add_screenshot(self.manager.screenshot_store.put(screenshot.data))
+        task.add_log("📸 已保存截图")
+        return True
+
+    def _save_context_screenshot(self, task: Task):
+        """从 agent 上下文中提取截图"""
+        try:
+            screenshot = self.phone_agent._context[-2] if len(self.phone_agent._context) >= 2 else None
+            if screenshot and 'content' in screenshot:
+                for content in screenshot['content']:
+                    if isinstance(content, dict) and content.get('type') == 'image_url':
+                        # 提取 base64 图片
+                        image_url = content.get('image_url', {}).get('url', '')
+                        if image_url.startswith('data:image'):
+                            task.add_screenshot(self.manager.screenshot_store.put_data_uri(image_url))
+                            task.add_log("📸 已保存截图")
+                            break
+        except Exception as e:
+            logger.debug(f"提取截图失败: {e}")
 
     def _execute_simple(self, task: Task):
         """
@@ -505,13 +918,10 @@ class TaskManager:
     def _do_screenshot(self, task: Task):
         """截取屏幕并保存"""
         try:
-            image = self.phone_controller.screenshot()
-            if image:
-                buffer = BytesIO()
-                image.save(buffer, format='PNG')
-                img_data = base64.b64encode(buffer.getvalue()).decode()
-                task.screenshots.append(f"data:image/png;base64,{img_data}")
-                task.add_log(f"✅ 截图成功 ({image.size[0]}x{image.size[1]})")
+            shot = self.phone_controller.screenshot_raw()
+            if shot:
+                task.add_screenshot(self.manager.screenshot_store.put(shot.data))
+                task.add_log(f"✅ 截图成功 ({shot.width}x{shot.height})")
             else:
                 task.add_log("⚠️ 截图失败")
         except Exception as e:
@@ -550,37 +960,583 @@ class TaskManager:
         except Exception as e:
             task.add_log(f"⚠️ 输入错误: {e}")
 
-    def _load_history(self):
-        """从文件加载任务历史"""
-        if not TASK_HISTORY_FILE.exists():
-            logger.info("任务历史文件不存在，创建新文件")
+class TaskManager:
+    """
+    任务管理器（单例，AI 增强版）
+    集成 Open-AutoGLM 的完整 AI 规划能力；白名单中的每台手机由独立的 PhoneWorker 并发执行
+    """
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if hasattr(self, '_initialized'):
+            return
+
+        # 构造时只创建内存中的状态，不读文件、不发网络请求；
+        # 任务存储、白名单、PhoneAgent 等由 initialize() 并发初始化
+        self._initialized = True
+        # 内存中的热任务（LRU），已结束的任务超出上限时淘汰，get_task 时从磁盘读回
+        self.task_history = TaskCache(
+            max_bytes=int(TASK_CACHE_MAX_MB * 1024 * 1024),
+            max_tasks=TASK_CACHE_MAX_TASKS,
+            can_evict=lambda task: task.status in (TaskStatus.COMPLETED, TaskStatus.FAILED),
+            on_evict=self._spill_task,
+        )
+        self.workers: Dict[str, PhoneWorker] = {}
+        self._workers_lock = threading.Lock()
+        self._route_lock = threading.Lock()
+        self._init_lock = threading.Lock()
+        self.running = False
+        self.ready = threading.Event()  # initialize() 完成后置位
+        self.init_error: Optional[str] = None
+        self.init_timings: Dict[str, float] = {}  # 各组件初始化耗时（毫秒）
+        self.screenshot_store = ScreenshotStore(SCREENSHOT_DIR)
+        self.queue_wait_stats = RollingStats()  # 所有手机的任务排队等待时间（毫秒）
+        self.settle_stats: Dict[str, RollingStats] = {}  # 按动作类型统计的界面稳定耗时（毫秒）
+        self._settle_stats_lock = threading.Lock()
+
+        # 实时事件总线（SSE 推送）
+        self.event_bus = TaskEventBus()
+
+        self.task_store = None
+        self.spill_store: Optional[SqliteTaskStore] = None  # journal 存储下被淘汰任务的落盘位置
+        self.phone_manager: Optional[PhoneManager] = None
+
+        # 后台健康检查：并发探测白名单中的所有手机，启动和切换手机时不等待连接测试
+        self.health = PhoneHealthProber(
+            PHONE_HEALTH_INTERVAL,
+            timeout=PHONE_HEALTH_TIMEOUT,
+            concurrency=PHONE_HEALTH_CONCURRENCY,
+            targets=self._health_targets,
+        )
+
+        self._register_gauges()
+
+    def initialize(self):
+        """
+        并发初始化各组件（只执行一次，其他线程同时调用时等待完成）
+
+        - 任务存储：打开任务日志或 SQLite，加载任务历史
+        - 手机：加载白名单，启动健康检查，创建激活手机的 worker 和 PhoneAgent
+
+        Raises:
+            RuntimeError: 初始化失败（下次调用时重试）
+        """
+        if self.ready.is_set():
             return
 
+        with self._init_lock:
+            if self.ready.is_set():
+                return
+
+            started = time.monotonic()
+            with ThreadPoolExecutor(max_workers=2, thread_name_prefix='init') as executor:
+                futures = {
+                    name: executor.submit(self._timed_init, name, func)
+                    for name, func in (('task_store', self._init_task_store), ('phones', self._init_phones))
+                }
+            errors = [f"{name}: {future.exception()}" for name, future in futures.items() if future.exception()]
+            self.init_timings['total'] = round((time.monotonic() - started) * 1000, 1)
+
+            if errors:
+                self.init_error = '; '.join(errors)
+                raise RuntimeError(f"任务管理器初始化失败: {self.init_error}")
+
+            self.init_error = None
+            self.ready.set()
+            logger.info(f"任务管理器初始化完成: {self.init_timings}")
+
+    def _timed_init(self, name: str, func: Callable[[], None]):
+        started = time.monotonic()
         try:
-            with open(TASK_HISTORY_FILE, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                for task_dict in data:
-                    task = Task.from_dict(task_dict)
-                    self.task_history[task.id] = task
-            logger.info(f"已加载 {len(self.task_history)} 条任务历史")
+            func()
         except Exception as e:
-            logger.error(f"加载任务历史失败: {e}", exc_info=True)
+            logger.error(f"初始化 {name} 失败: {e}", exc_info=True)
+            raise
+        finally:
+            self.init_timings[name] = round((time.monotonic() - started) * 1000, 1)
+
+    def _init_task_store(self):
+        """任务持久化：追加写日志（默认）或 SQLite，并加载历史记录"""
+        if self.task_store is None:
+            self.task_store = self._create_task_store()
+        if self.spill_store is None and not isinstance(self.task_store, SqliteTaskStore):
+            self.spill_store = SqliteTaskStore(TASK_SPILL_FILE, load_limit=0)
+        self._load_history()
 
-    def _save_history(self):
-        """保存任务历史到文件"""
+    def _init_phones(self):
+        """加载白名单，启动健康检查，预先创建激活手机的 worker（不发起网络请求）"""
+        if self.phone_manager is None:
+            self.phone_manager = PhoneManager(PHONE_WHITELIST_FILE)
+        self.health.start()
+        self.get_worker(self._default_phone_id())
+
+    def get_init_status(self) -> dict:
+        """初始化状态（/api/ready）"""
+        return {
+            'ready': self.ready.is_set(),
+            'error': self.init_error,
+            'timings_ms': dict(self.init_timings),
+        }
+
+    def _register_gauges(self):
+        """注册 /metrics 中按需读取的实时指标"""
+        REGISTRY.register(Gauge(
+            'autoglm_queue_size', '各手机等待中的任务数',
+            lambda: {(phone_id,): worker.queue_size() for phone_id, worker in list(self.workers.items())},
+            ('phone',)))
+        REGISTRY.register(Gauge(
+            'autoglm_running_tasks', '正在执行的任务数',
+            lambda: len(self.get_running_tasks())))
+        REGISTRY.register(Gauge(
+            'autoglm_phone_up', '手机是否在线（健康检查）',
+            lambda: {(phone_id,): 1 if health['state'] == HEALTH_ONLINE else 0
+                     for phone_id, health in self.health.get_all().items()},
+            ('phone',)))
+        REGISTRY.register(Gauge(
+            'autoglm_task_cache_bytes', '内存中缓存任务的估算大小（字节）',
+            lambda: self.task_history.total_bytes))
+        REGISTRY.register(Gauge(
+            'autoglm_task_cache_tasks', '内存中缓存的任务数',
+            lambda: len(self.task_history)))
+
+        def probe_rtt():
+            values = {}
+            for phone_id in self.health.get_all():
+                latency = self.health.get_latency(phone_id)
+                if latency is not None:
+                    values[(phone_id,)] = latency / 1000
+            return values
+
+        REGISTRY.register(Gauge(
+            'autoglm_phone_probe_rtt_seconds', '手机健康检查往返延迟中位数', probe_rtt, ('phone',)))
+
+    def _create_task_store(self):
+        """根据 TASK_STORE 配置创建任务存储"""
+        if TASK_STORE == 'sqlite':
+            logger.info(f"使用 SQLite 任务存储: {TASK_DB_FILE}")
+            return SqliteTaskStore(TASK_DB_FILE, load_limit=MAX_TASK_HISTORY)
+
+        journal = TaskJournal(
+            TASK_JOURNAL_FILE,
+            TASK_HISTORY_FILE,
+            compact_every=TASK_JOURNAL_COMPACT_EVERY,
+            fsync=TASK_JOURNAL_FSYNC
+        )
+        journal.snapshot_provider = self._snapshot_tasks
+        return journal
+
+    def _default_phone_id(self) -> str:
+        """未指定手机时使用的手机 ID：激活手机，白名单为空时为默认手机"""
+        return self.phone_manager.current_id or DEFAULT_PHONE_ID
+
+    def _health_targets(self) -> Dict[str, str]:
+        """健康检查的探测目标：白名单中的手机，白名单为空时为默认手机"""
+        if self.phone_manager is None:
+            return {}
+        phones = {phone['id']: phone['url'] for phone in self.phone_manager.get_phones()}
+        return phones or {DEFAULT_PHONE_ID: PHONE_HELPER_URL}
+
+    def get_worker(self, phone_id: str) -> Optional[PhoneWorker]:
+        """
+        获取指定手机的 worker（首次访问时创建）
+
+        Args:
+            phone_id: 手机 ID，DEFAULT_PHONE_ID 表示 PHONE_HELPER_URL
+
+        Returns:
+            PhoneWorker，手机不存在返回 None
+        """
+        with self._workers_lock:
+            worker = self.workers.get(phone_id)
+            if worker:
+                return worker
+
+            if phone_id == DEFAULT_PHONE_ID:
+                name, helper_url = '默认手机', PHONE_HELPER_URL
+            else:
+                phone = self.phone_manager.get_phone(phone_id)
+                if not phone:
+                    return None
+                name, helper_url = phone['name'], phone['url']
+
+            worker = PhoneWorker(self, phone_id, name, helper_url)
+            self.workers[phone_id] = worker
+            return worker
+
+    def remove_worker(self, phone_id: str):
+        """停止并移除手机的 worker（手机从白名单删除后调用），队列中等待的任务标记为失败"""
+        with self._workers_lock:
+            worker = self.workers.pop(phone_id, None)
+        self.health.unregister(phone_id)
+        if worker:
+            worker.stop()
+            worker.cancel_pending(f"手机已删除: {worker.name}")
+
+    @property
+    def phone_controller(self) -> Optional[PhoneControllerRemote]:
+        """当前激活手机的控制器（兼容单手机接口）"""
+        worker = self.workers.get(self._default_phone_id())
+        return worker.phone_controller if worker else None
+
+    def get_phone_health(self, phone_id: Optional[str] = None) -> Optional[dict]:
+        """手机的后台健康检查结果，默认为当前激活手机"""
+        return self.health.get(phone_id or self._default_phone_id())
+
+    @property
+    def phone_agent(self) -> Optional['PhoneAgent']:
+        """当前激活手机的 PhoneAgent（兼容单手机接口）"""
+        worker = self.workers.get(self._default_phone_id())
+        return worker.phone_agent if worker else None
+
+    def submit_task(self, description: str, phone_id: Optional[str] = None,
+                    priority: str = TaskPriority.NORMAL, tags: Optional[List[str]] = None) -> Task:
+        """
+        提交新任务
+
+        Args:
+            description: 任务描述
+            phone_id: 执行任务的手机 ID，默认为当前激活手机；
+                PHONE_ANY 表示由调度器选择负载最低、延迟最低的可用手机
+            priority: 优先级（high / normal / low），高优先级任务插队到普通任务之前
+            tags: 只在包含这些标签的手机中选择（指定标签时 phone_id 默认为 PHONE_ANY）
+
+        Raises:
+            ValueError: 手机不存在、没有符合条件的可用手机或优先级无效
+        """
+        if priority not in TaskPriority.ORDER:
+            raise ValueError(f"无效的优先级: {priority}")
+
+        tags = PhoneManager.normalize_tags(tags)
+        if phone_id == PHONE_ANY or (tags and not phone_id):
+            # 选择和入队在同一把锁内完成，并发提交的任务不会都分到同一台空闲手机
+            with self._route_lock:
+                worker = self._route_task(tags)
+                return self._enqueue_task(description, worker, priority, routed=True)
+
+        phone_id = phone_id or self._default_phone_id()
+        worker = self.get_worker(phone_id)
+        if not worker:
+            raise ValueError(f"手机不存在: {phone_id}")
+        return self._enqueue_task(description, worker, priority)
+
+    def _enqueue_task(self, description: str, worker: PhoneWorker, priority: str,
+                      routed: bool = False) -> Task:
+        task = Task(description, phone_id=worker.phone_id, priority=priority)
+        self._register_task(task)
+        if routed:
+            latency = worker.latency_ms()
+            task.add_log(
+                f"任务已自动分配到手机: {worker.name}"
+                f"（排队 {worker.load()} 个，延迟 {f'{latency:.0f} ms' if latency is not None else '未知'}）"
+            )
+        task.add_log(f"任务已提交到队列（手机: {worker.name}）")
+
+        # 添加到历史
+        self.task_history.put(task)
+
+        # 添加到该手机的队列
+        self.running = True
+        worker.submit(task)
+
+        logger.info(f"任务已提交: {task.id}, 手机: {worker.name}, 优先级: {priority}, 描述: {task.description}")
+        return task
+
+    def _route_task(self, tags: List[str]) -> PhoneWorker:
+        """
+        为任务选择手机：在符合标签的在线手机中，优先选择空闲（排队最少）的，
+        负载相同时选择最近截图延迟最低的；还没有探测结果的手机排在在线手机之后
+
+        Raises:
+            ValueError: 没有符合条件的可用手机
+        """
+        if self.phone_manager.get_phones():
+            phone_ids = [phone['id'] for phone in self.phone_manager.find_phones(tags)]
+        else:
+            phone_ids = [] if tags else [DEFAULT_PHONE_ID]
+
+        candidates = []
+        for phone_id in phone_ids:
+            state = self.health.get_state(phone_id)
+            if state not in (HEALTH_ONLINE, HEALTH_UNKNOWN):
+                continue
+            worker = self.get_worker(phone_id)
+            if not worker or not worker.phone_controller:
+                continue
+            latency = worker.latency_ms()
+            candidates.append((
+                state != HEALTH_ONLINE,
+                worker.load(),
+                latency if latency is not None else float('inf'),
+                worker,
+            ))
+
+        if not candidates:
+            suffix = f"（标签: {', '.join(tags)}）" if tags else ""
+            raise ValueError(f"没有可用的手机{suffix}")
+
+        candidates.sort(key=lambda candidate: candidate[:3])
+        return candidates[0][3]
+
+    def get_queue_stats(self) -> dict:
+        """获取排队指标：各手机队列长度和等待时间分布（毫秒）"""
+        return {
+            'wait_ms': self.queue_wait_stats.snapshot(),
+            'phones': {
+                phone_id: {
+                    'name': worker.name,
+                    'queue_size': worker.queue_size(),
+                    'wait_ms': worker.queue_wait_stats.snapshot(),
+                }
+                for phone_id, worker in list(self.workers.items())
+            },
+        }
+
+    def record_settle(self, action: str, result):
+        """记录一次动作后的界面稳定耗时（所有手机汇总）"""
+        with self._settle_stats_lock:
+            stats = self.settle_stats.get(action)
+            if stats is None:
+                stats = self.settle_stats[action] = RollingStats()
+        stats.add(result.elapsed_ms)
+        SETTLE_DURATION.observe(result.elapsed_ms / 1000, action)
+
+    @staticmethod
+    def _settle_summary(stats: Dict[str, RollingStats]) -> dict:
+        return {
+            action: dict(action_stats.snapshot(), histogram=action_stats.histogram(SETTLE_BUCKETS_MS))
+            for action, action_stats in list(stats.items())
+        }
+
+    def get_settle_stats(self) -> dict:
+        """按动作类型统计的界面稳定耗时（含直方图）"""
+        return {
+            'actions': self._settle_summary(self.settle_stats),
+            'phones': {
+                phone_id: self._settle_summary(worker.adapter.settle_stats)
+                for phone_id, worker in list(self.workers.items())
+                if worker.adapter
+            },
+        }
+
+    def _register_task(self, task: Task):
+        """记录新任务并开始跟踪其变更"""
+        task.add_listener(self._on_task_event)
+        self.task_store.append(EVENT_CREATE, task.id, {'task': task.to_dict()})
+
+    def _on_task_event(self, task: Task, event: str, data: dict):
+        """任务变更时追加到任务存储，并推送给实时订阅者"""
+        self.task_store.append(event, task.id, data)
+        if event == EVENT_UPDATE:
+            if any(name in data for name in TEXT_FIELDS):
+                self.task_history.resize_text(task)
+        else:
+            self.task_history.grow(task, estimate_item_bytes(data['value']))
+
+        if event == EVENT_LOG:
+            self.event_bus.publish(task.id, {'type': 'log', 'index': data['index'], 'message': data['value']})
+        elif event == EVENT_SCREENSHOT:
+            self.event_bus.publish(task.id, {'type': 'screenshot', 'data': data['value']})
+        elif event == EVENT_UPDATE and 'status' in data:
+            self.event_bus.publish(task.id, {'type': 'status', 'status': data['status']})
+            if data['status'] in (TaskStatus.COMPLETED, TaskStatus.FAILED):
+                self.event_bus.publish(task.id, {'type': 'end', 'status': data['status']})
+                self.event_bus.close(task.id)
+
+    def get_task(self, task_id: str) -> Optional[Task]:
+        """获取任务（内存中没有时从磁盘读回，并重新放入内存缓存）"""
+        task = self.task_history.get(task_id)
+        if task is None:
+            cold_store = self._cold_store()
+            task_dict = cold_store.get(task_id) if cold_store else None
+            if task_dict:
+                task = Task.from_dict(task_dict)
+                self.task_history.put(task)
+                TASK_CACHE_RELOADS.inc()
+        return task
+
+    def _cold_store(self) -> Optional[SqliteTaskStore]:
+        """被淘汰的任务所在的存储：SQLite 任务存储本身保存全部任务，journal 存储下为溢出文件"""
+        if isinstance(self.task_store, SqliteTaskStore):
+            return self.task_store
+        return self.spill_store
+
+    def _spill_task(self, task: Task):
+        """任务从内存淘汰前写入磁盘（SQLite 任务存储中已有完整记录，不需要再写）"""
+        if self.spill_store is not None:
+            self.spill_store.append(EVENT_CREATE, task.id, {'task': task.to_dict()})
+        TASK_CACHE_EVICTIONS.inc()
+
+    def get_cache_stats(self) -> dict:
+        """内存任务缓存的大小和命中情况"""
+        return self.task_history.stats()
+
+    def get_current_task(self) -> Optional[Task]:
+        """获取当前正在执行的任务（多台手机时返回其中最早开始的一个）"""
+        running = self.get_running_tasks()
+        return running[0] if running else None
+
+    def get_running_tasks(self) -> List[Task]:
+        """获取所有手机上正在执行的任务"""
+        tasks = [w.current_task for w in list(self.workers.values()) if w.current_task]
+        return sorted(tasks, key=lambda t: t.started_at or '')
+
+    def get_recent_tasks(self, limit: int = 20, status: Optional[str] = None,
+                         phone_id: Optional[str] = None, before: Optional[str] = None) -> List[Task]:
+        """
+        获取最近的任务列表（按创建时间倒序）
+
+        Args:
+            limit: 最多返回条数
+            status: 按状态筛选
+            phone_id: 按手机筛选
+            before: 游标（上一页最后一个任务的 Task.cursor），只返回排在该任务之后的任务
+        """
+        if isinstance(self.task_store, SqliteTaskStore):
+            # 走索引查询；内存中的任务对象优先，保证返回同一实例
+            return [
+                self.task_history.peek(task_dict['id']) or Task.from_dict(task_dict)
+                for task_dict in self.task_store.query(status, phone_id, before, limit)
+            ]
+
+        position = parse_cursor(before) if before else None
+        tasks = [
+            t for t in self.task_history.values()
+            if (not status or t.status == status)
+            and (not phone_id or t.phone_id == phone_id)
+            and (not position or (t.created_at, t.id) < position)
+        ]
+        if self.spill_store is not None:
+            # 合并已淘汰到磁盘的任务（列表查询不读回内存，内存中的任务优先）
+            tasks.extend(
+                Task.from_dict(task_dict)
+                for task_dict in self.spill_store.query(status, phone_id, before, limit)
+                if task_dict['id'] not in self.task_history
+            )
+        tasks.sort(key=lambda t: (t.created_at, t.id), reverse=True)
+        return tasks[:limit]
+
+    def start_worker(self):
+        """启动所有已创建的手机 worker"""
+        self.running = True
+        for worker in list(self.workers.values()):
+            worker.start()
+
+    def stop_worker(self):
+        """停止所有手机 worker"""
+        self.running = False
+        for worker in list(self.workers.values()):
+            worker.stop()
+        self._save_history()
+        logger.info("任务 worker 已全部停止")
+
+    def switch_phone(self, phone_id: str) -> bool:
+        """
+        切换默认手机（未指定手机的任务提交到该手机）
+        其他手机的 worker 保持运行，不会中断正在执行的任务
+
+        Args:
+            phone_id: 手机 ID
+
+        Returns:
+            是否切换成功
+        """
         try:
-            recent_tasks = self.get_recent_tasks(MAX_TASK_HISTORY)
-            data = [task.to_dict() for task in recent_tasks]
+            # 检查手机是否存在
+            phone = self.phone_manager.get_phone(phone_id)
+            if not phone:
+                logger.error(f"手机不存在: {phone_id}")
+                return False
 
-            TASK_HISTORY_FILE.parent.mkdir(parents=True, exist_ok=True)
+            # 设置为激活状态
+            if not self.phone_manager.set_active_phone(phone_id):
+                return False
 
-            with open(TASK_HISTORY_FILE, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+            worker = self.get_worker(phone_id)
+            self.health.schedule(phone_id)
+            if self.running:
+                worker.start()
+            logger.info(f"✅ 已切换到手机: {phone['name']} ({phone['url']})")
+            return True
 
-            logger.debug(f"任务历史已保存: {len(data)} 条记录")
         except Exception as e:
-            logger.error(f"保存任务历史失败: {e}", exc_info=True)
+            logger.error(f"切换手机失败: {e}", exc_info=True)
+            return False
 
+    def _load_history(self):
+        """从快照和任务日志加载任务历史"""
+        try:
+            if isinstance(self.task_store, SqliteTaskStore):
+                # 只会加载最近的任务，先在数据库中处理全部未完成的任务
+                self.task_store.fail_unfinished(
+                    error='服务重启，任务中断',
+                    log_entry=f"[{datetime.now().strftime('%H:%M:%S')}] ⚠️ 服务重启，任务已中断",
+                    completed_at=datetime.now().isoformat(),
+                )
+
+            migrated = False
+            interrupted = []
+            for task_dict in self.task_store.load().values():
+                task = Task.from_dict(task_dict)
+                migrated = self._migrate_screenshots(task) or migrated
+                task.add_listener(self._on_task_event)
+                self.task_history.put(task)
+                if task.status in (TaskStatus.PENDING, TaskStatus.RUNNING):
+                    interrupted.append(task)
+
+            # 上次退出时未完成的任务不会再被执行；
+            # 全部任务加载完成后再写入事件，写入触发的日志压缩不会生成缺少任务的快照
+            for task in interrupted:
+                task.add_log("⚠️ 服务重启，任务已中断")
+                task.update(
+                    status=TaskStatus.FAILED,
+                    completed_at=datetime.now().isoformat(),
+                    error='服务重启，任务中断'
+                )
+            logger.info(f"已加载 {len(self.task_history)} 条任务历史（内存缓存 {self.task_history.total_bytes} 字节）")
+
+            if migrated:
+                self._save_history()
+        except Exception as e:
+            logger.error(f"加载任务历史失败: {e}", exc_info=True)
 
-# 全局单例
-task_manager = TaskManager()
+    def _migrate_screenshots(self, task: Task) -> bool:
+        """将旧版历史中内联的 data URI 截图迁移到截图存储，返回是否有迁移"""
+        if not any(ref.startswith('data:') for ref in task.screenshots):
+            return False
+
+        migrated = []
+        for ref in task.screenshots:
+            if ref.startswith('data:'):
+                ref = self.screenshot_store.put_data_uri(ref)
+            if ref:
+                migrated.append(ref)
+        task.screenshots = migrated
+        return True
+
+    def _snapshot_tasks(self) -> List[dict]:
+        """生成任务快照（最近 MAX_TASK_HISTORY 条）"""
+        return [task.to_dict() for task in self.get_recent_tasks(MAX_TASK_HISTORY)]
+
+    def _save_history(self):
+        """压缩任务存储（任务日志写入快照并清空；SQLite 合并 WAL）"""
+        self.task_store.compact()
+
+
+def get_task_manager() -> TaskManager:
+    """
+    获取全局任务管理器，首次调用时初始化（其他线程同时调用时等待初始化完成）
+
+    只导入 tasks 模块不会创建任务管理器，也不会读取白名单或发起网络请求
+    """
+    manager = TaskManager()
+    manager.initialize()
+    return manager
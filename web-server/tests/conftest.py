@@ -0,0 +1,37 @@
+"""
+测试公共配置
+web-server 下的模块以脚本目录为导入根（from task_cache import ...），测试时同样加入 sys.path
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def manager(tmp_path, monkeypatch):
+    """
+    未初始化的任务管理器：任务日志和溢出文件在临时目录中，内存缓存最多 2 个任务，
+    不加载白名单、不创建 worker、不发网络请求
+    """
+    import tasks
+    from task_cache import TaskCache
+    from task_journal import TaskJournal
+    from task_store import SqliteTaskStore
+
+    monkeypatch.setattr(tasks, 'SCREENSHOT_DIR', tmp_path / 'screenshots')
+    monkeypatch.setattr(tasks.TaskManager, '_instance', None)
+    task_manager = tasks.TaskManager()
+    task_manager.task_store = TaskJournal(tmp_path / 'journal.jsonl', tmp_path / 'snapshot.json', compact_every=0)
+    task_manager.spill_store = SqliteTaskStore(tmp_path / 'spill.db')
+    task_manager.task_history = TaskCache(
+        max_tasks=2,
+        can_evict=lambda task: task.status in (tasks.TaskStatus.COMPLETED, tasks.TaskStatus.FAILED),
+        on_evict=task_manager._spill_task,
+    )
+    yield task_manager
+    task_manager.task_store.close()
+    task_manager.spill_store.close()
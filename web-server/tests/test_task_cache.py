@@ -0,0 +1,133 @@
+"""
+任务缓存（TaskCache）测试：LRU 淘汰、增量估算大小、溢出到磁盘和 get_task 读回
+"""
+
+from task_cache import TaskCache, estimate_item_bytes, estimate_task_bytes, TEXT_FIELDS
+from tasks import Task, TaskStatus
+
+
+def finished_task(description='task'):
+    task = Task(description)
+    task.status = TaskStatus.COMPLETED
+    return task
+
+
+def track(cache, task):
+    """与 TaskManager._on_task_event 相同的增量更新"""
+    def on_event(changed, event, data):
+        if event == 'update':
+            if any(name in data for name in TEXT_FIELDS):
+                cache.resize_text(changed)
+        else:
+            cache.grow(changed, estimate_item_bytes(data['value']))
+    task.add_listener(on_event)
+
+
+def test_evicts_least_recently_used():
+    evicted = []
+    cache = TaskCache(max_tasks=2, on_evict=lambda task: evicted.append(task.id))
+    a, b, c = finished_task('a'), finished_task('b'), finished_task('c')
+    cache.put(a)
+    cache.put(b)
+    assert cache.get(a.id) is a  # a 变为最近使用
+    cache.put(c)
+
+    assert evicted == [b.id]
+    assert b.id not in cache and a.id in cache and c.id in cache
+    assert cache.stats()['evictions'] == 1
+
+
+def test_running_tasks_and_failed_spills_stay_in_memory():
+    running = Task('running')
+    running.status = TaskStatus.RUNNING
+
+    def on_evict(task):
+        if task.description == 'stuck':
+            raise OSError('disk full')
+
+    cache = TaskCache(max_tasks=1, can_evict=lambda task: task.status == TaskStatus.COMPLETED,
+                      on_evict=on_evict)
+    stuck = finished_task('stuck')
+    cache.put(running)
+    cache.put(stuck)
+    assert running.id in cache and stuck.id in cache
+
+    done = finished_task('done')
+    cache.put(done)
+    # 写入磁盘失败的任务保留，可以淘汰的任务被淘汰后缓存仍可能超出上限
+    assert stuck.id in cache and running.id in cache
+    assert done.id not in cache
+
+
+def test_byte_limit_and_size_bookkeeping():
+    small, large = finished_task('small'), finished_task('x' * 10000)
+    cache = TaskCache(max_bytes=estimate_task_bytes(large) + estimate_task_bytes(small) - 1)
+    cache.put(small)
+    cache.put(large)
+    assert small.id not in cache
+    assert cache.total_bytes == estimate_task_bytes(large)
+
+
+def test_incremental_size_tracks_full_estimate():
+    cache = TaskCache()
+    task = Task('measure')
+    cache.put(task)
+    track(cache, task)
+
+    for i in range(200):
+        task.add_log(f"step {i}")
+        task.add_action({'action': 'Tap', 'element': [i, i]})
+        task.add_step_timing({'step': i, 'total_ms': 1.0})
+        task.add_screenshot(f"{i:064x}")
+        task.update(thinking='思考' * (i % 20))
+    task.update(status=TaskStatus.COMPLETED, error='boom')
+
+    full = estimate_task_bytes(task)
+    # 列表扩容等开销不计入增量估算，误差在 5% 以内
+    assert abs(cache.total_bytes - full) <= full * 0.05
+
+    # 重新放入时完整估算
+    cache.put(task)
+    assert cache.total_bytes == full
+
+
+def test_growth_past_limit_evicts_other_tasks():
+    evicted = []
+    old, growing = finished_task('old'), Task('growing')
+    cache = TaskCache(max_bytes=estimate_task_bytes(old) + estimate_task_bytes(growing) + 1000,
+                      can_evict=lambda task: task.status == TaskStatus.COMPLETED,
+                      on_evict=lambda task: evicted.append(task.id))
+    cache.put(old)
+    cache.put(growing)
+    track(cache, growing)
+
+    growing.add_log('x' * 2000)
+    assert evicted == [old.id]
+    assert cache.total_bytes == cache._sizes[growing.id]
+
+
+def test_spilled_task_is_reloaded_by_get_task(manager):
+    tasks = []
+    for i in range(4):
+        task = Task(f"task {i}")
+        manager._register_task(task)
+        manager.task_history.put(task)
+        task.add_log(f"log {i}")
+        task.add_action({'action': 'Tap', 'element': [i, i]})
+        task.update(status=TaskStatus.COMPLETED, thinking=f"done {i}")
+        tasks.append(task)
+
+    # 最多缓存 2 个任务：最早的两个已写入溢出文件
+    assert [task.id in manager.task_history for task in tasks] == [False, False, True, True]
+    assert manager.spill_store.get(tasks[0].id)['logs'] == tasks[0].logs
+
+    reloaded = manager.get_task(tasks[0].id)
+    assert reloaded is not tasks[0]
+    assert reloaded.to_dict() == tasks[0].to_dict()
+    assert manager.task_history.peek(tasks[0].id) is reloaded
+
+    # 读回后再次按 LRU 淘汰，列表查询仍然包含所有任务
+    assert len(manager.task_history) == 2
+    recent = manager.get_recent_tasks(limit=10)
+    assert sorted(task.id for task in recent) == sorted(task.id for task in tasks)
+    assert manager.get_task('missing') is None
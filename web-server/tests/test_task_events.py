@@ -0,0 +1,102 @@
+"""
+任务事件总线测试：从指定事件 ID 续传、缓冲区溢出后无法续传、未知任务不创建通道
+"""
+
+import threading
+
+from task_events import TaskEventBus
+
+
+def publish_all(bus, task_id, count):
+    return [bus.publish(task_id, {'n': n}) for n in range(count)]
+
+
+def test_resume_after_given_id():
+    bus = TaskEventBus()
+    ids = publish_all(bus, 't1', 5)
+    assert ids == [1, 2, 3, 4, 5]
+
+    events, closed = bus.wait('t1', after_id=3, timeout=0)
+    assert [event_id for event_id, _ in events] == [4, 5]
+    assert [event['n'] for _, event in events] == [3, 4]
+    assert not closed
+
+    # 已收到最新事件时等待超时返回空列表
+    assert bus.wait('t1', after_id=5, timeout=0) == ([], False)
+
+
+def test_resume_after_close_returns_tail():
+    bus = TaskEventBus()
+    publish_all(bus, 't1', 3)
+    bus.close('t1')
+
+    events, closed = bus.wait('t1', after_id=1, timeout=0)
+    assert [event_id for event_id, _ in events] == [2, 3]
+    assert closed
+    assert bus.last_event_id('t1') == 3
+
+
+def test_can_resume_only_within_buffer():
+    bus = TaskEventBus(buffer_size=3)
+    publish_all(bus, 't1', 5)  # 缓冲区只剩 3、4、5
+
+    assert bus.can_resume('t1', 2)
+    assert bus.can_resume('t1', 5)
+    assert not bus.can_resume('t1', 1)
+    assert not bus.can_resume('t1', 6)
+
+    events, _ = bus.wait('t1', after_id=2, timeout=0)
+    assert [event_id for event_id, _ in events] == [3, 4, 5]
+
+
+def test_wait_wakes_on_publish():
+    bus = TaskEventBus()
+    bus.publish('t1', {'n': 0})
+    result = {}
+
+    def subscriber():
+        result['value'] = bus.wait('t1', after_id=1, timeout=5)
+
+    thread = threading.Thread(target=subscriber)
+    thread.start()
+    bus.publish('t1', {'n': 1})
+    thread.join(timeout=5)
+
+    assert result['value'] == ([(2, {'n': 1})], False)
+
+
+def test_unknown_task_does_not_create_channel():
+    bus = TaskEventBus()
+
+    assert bus.wait('missing', after_id=0, timeout=0) == ([], True)
+    bus.add_listener('missing', lambda: None)
+    assert bus.can_resume('missing', 0)
+    assert not bus.can_resume('missing', 3)
+    assert 'missing' not in bus._channels
+
+
+def test_closed_channels_are_evicted():
+    bus = TaskEventBus(max_closed=2)
+    for task_id in ('a', 'b', 'c'):
+        bus.publish(task_id, {})
+        bus.close(task_id)
+
+    # 最早关闭的通道被清理，重连时视为已结束
+    assert bus.wait('a', after_id=0, timeout=0) == ([], True)
+    assert bus.last_event_id('a') == 0
+    assert bus.wait('c', after_id=0, timeout=0) == ([(1, {})], True)
+
+
+def test_listener_called_on_publish_and_close():
+    bus = TaskEventBus()
+    bus.publish('t1', {})
+    calls = []
+    listener = lambda: calls.append(1)
+    bus.add_listener('t1', listener)
+
+    bus.publish('t1', {})
+    bus.close('t1')
+    bus.remove_listener('t1', listener)
+    bus.publish('t1', {})
+
+    assert len(calls) == 2
@@ -0,0 +1,107 @@
+"""
+任务日志（TaskJournal）测试：崩溃留下的不完整行、压缩后的重放
+"""
+
+import shutil
+
+from task_journal import (
+    EVENT_CREATE, EVENT_LOG, EVENT_UPDATE, TaskJournal, apply_event
+)
+
+
+def make_journal(tmp_path, compact_every=0):
+    return TaskJournal(tmp_path / 'journal.jsonl', tmp_path / 'snapshot.json', compact_every=compact_every)
+
+
+def new_task(task_id):
+    return {'id': task_id, 'description': task_id, 'status': 'pending', 'logs': []}
+
+
+class Recorder:
+    """按写入顺序维护任务字典，作为压缩时的快照来源"""
+
+    def __init__(self, journal):
+        self.journal = journal
+        self.tasks = {}
+        journal.snapshot_provider = lambda: [dict(task, logs=list(task['logs'])) for task in self.tasks.values()]
+
+    def append(self, event, task_id, data):
+        apply_event(self.tasks, {'event': event, 'task_id': task_id, 'data': data})
+        self.journal.append(event, task_id, data)
+
+
+def test_torn_last_line_is_dropped_and_truncated(tmp_path):
+    journal = make_journal(tmp_path)
+    journal.append(EVENT_CREATE, 't1', {'task': new_task('t1')})
+    journal.append(EVENT_LOG, 't1', {'index': 0, 'value': 'first'})
+    journal.close()
+
+    # 进程在写最后一行时崩溃
+    with open(journal.journal_file, 'a', encoding='utf-8') as f:
+        f.write('{"seq": 3, "event": "log", "task_id": "t1", "data": {"index": 1, "val')
+
+    journal = make_journal(tmp_path)
+    tasks = journal.load()
+    assert tasks['t1']['logs'] == ['first']
+    assert journal.journal_file.read_bytes().endswith(b'\n')
+
+    # 截断后继续追加，新事件从新行开始，再次加载可以读到
+    journal.append(EVENT_LOG, 't1', {'index': 1, 'value': 'second'})
+    journal.close()
+    assert make_journal(tmp_path).load()['t1']['logs'] == ['first', 'second']
+
+
+def test_corrupt_middle_line_is_skipped(tmp_path):
+    journal = make_journal(tmp_path)
+    journal.append(EVENT_CREATE, 't1', {'task': new_task('t1')})
+    journal.close()
+    with open(journal.journal_file, 'a', encoding='utf-8') as f:
+        f.write('not json\n')
+    journal = make_journal(tmp_path)
+    journal.load()
+    journal.append(EVENT_UPDATE, 't1', {'status': 'completed'})
+    journal.close()
+
+    assert make_journal(tmp_path).load()['t1']['status'] == 'completed'
+
+
+def test_replay_after_compaction(tmp_path):
+    journal = make_journal(tmp_path, compact_every=3)
+    recorder = Recorder(journal)
+    recorder.append(EVENT_CREATE, 't1', {'task': new_task('t1')})
+    recorder.append(EVENT_LOG, 't1', {'index': 0, 'value': 'a'})
+    recorder.append(EVENT_LOG, 't1', {'index': 1, 'value': 'b'})  # 第 3 条事件触发压缩
+    assert journal.journal_file.read_text(encoding='utf-8') == ''
+
+    recorder.append(EVENT_CREATE, 't2', {'task': new_task('t2')})
+    recorder.append(EVENT_UPDATE, 't1', {'status': 'completed'})
+    journal.close()
+
+    journal = make_journal(tmp_path, compact_every=3)
+    tasks = journal.load()
+    assert tasks['t1']['logs'] == ['a', 'b']
+    assert tasks['t1']['status'] == 'completed'
+    assert set(tasks) == {'t1', 't2'}
+
+    # 序号从快照和日志尾部之后继续
+    journal.append(EVENT_LOG, 't2', {'index': 0, 'value': 'c'})
+    journal.close()
+    assert make_journal(tmp_path).load()['t2']['logs'] == ['c']
+
+
+def test_crash_between_snapshot_and_truncate_does_not_duplicate(tmp_path):
+    journal = make_journal(tmp_path)
+    recorder = Recorder(journal)
+    recorder.append(EVENT_CREATE, 't1', {'task': new_task('t1')})
+    recorder.append(EVENT_LOG, 't1', {'index': 0, 'value': 'a'})
+    journal._file.flush()
+    backup = tmp_path / 'journal.bak'
+    shutil.copy(journal.journal_file, backup)
+
+    # 快照已写入，但日志还没来得及截断
+    journal.compact()
+    journal.close()
+    shutil.copy(backup, journal.journal_file)
+
+    tasks = make_journal(tmp_path).load()
+    assert tasks['t1']['logs'] == ['a']
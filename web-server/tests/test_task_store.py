@@ -0,0 +1,105 @@
+"""
+SQLite 任务存储测试：(created_at, id) 游标分页、启动时标记未完成的任务
+"""
+
+import pytest
+
+from task_journal import EVENT_CREATE, EVENT_UPDATE
+from task_store import SqliteTaskStore, make_cursor, parse_cursor
+from tasks import Task
+
+SAME_TIME = '2026-01-01T00:00:00'
+
+
+@pytest.fixture
+def store(tmp_path):
+    task_store = SqliteTaskStore(tmp_path / 'tasks.db')
+    yield task_store
+    task_store.close()
+
+
+def add_task(store, task_id, created_at=SAME_TIME, status='completed', logs=()):
+    store.append(EVENT_CREATE, task_id, {'task': {
+        'id': task_id, 'description': task_id, 'status': status,
+        'created_at': created_at, 'logs': list(logs),
+    }})
+
+
+def paginate(fetch, page_size):
+    """按游标翻页直到没有结果，返回所有任务 ID"""
+    ids, cursor = [], None
+    while True:
+        page = fetch(cursor, page_size)
+        if not page:
+            return ids
+        ids.extend(task_id for task_id, _ in page)
+        cursor = make_cursor(page[-1][1], page[-1][0])
+
+
+def test_cursor_round_trip():
+    assert parse_cursor(make_cursor(SAME_TIME, 'abc')) == (SAME_TIME, 'abc')
+    # 旧版游标只有创建时间
+    assert parse_cursor(SAME_TIME) == (SAME_TIME, '')
+
+
+def test_query_pages_through_equal_created_at(store):
+    add_task(store, 'early', created_at='2025-12-31T23:59:59')
+    for i in range(5):
+        add_task(store, f"same-{i}")
+    add_task(store, 'late', created_at='2026-01-01T00:00:01')
+
+    def fetch(cursor, limit):
+        return [(task['id'], task['created_at']) for task in store.query(before=cursor, limit=limit)]
+
+    for page_size in (1, 2, 3):
+        assert paginate(fetch, page_size) == [
+            'late', 'same-4', 'same-3', 'same-2', 'same-1', 'same-0', 'early'
+        ]
+
+
+def test_query_filters_combine_with_cursor(store):
+    for i in range(4):
+        add_task(store, f"t{i}", status='failed' if i % 2 else 'completed')
+
+    first = store.query(status='failed', limit=1)
+    assert [task['id'] for task in first] == ['t3']
+    rest = store.query(status='failed', before=make_cursor(SAME_TIME, 't3'))
+    assert [task['id'] for task in rest] == ['t1']
+
+
+def test_memory_and_spill_pages_through_equal_created_at(manager):
+    ids = []
+    for i in range(5):
+        task = Task(f"task {i}", task_id=f"same-{i}")
+        task.created_at = SAME_TIME
+        manager._register_task(task)
+        manager.task_history.put(task)
+        task.update(status='completed')
+        ids.append(task.id)
+
+    # 内存中 2 个，溢出文件中 3 个，合并后按 (created_at, id) 倒序
+    assert len(manager.task_history) == 2
+
+    def fetch(cursor, limit):
+        return [(task.id, task.created_at) for task in manager.get_recent_tasks(limit=limit, before=cursor)]
+
+    for page_size in (1, 2, 4):
+        assert paginate(fetch, page_size) == ids[::-1]
+
+
+def test_fail_unfinished_marks_all_rows(store):
+    add_task(store, 'old-running', created_at='2020-01-01T00:00:00', status='running', logs=['started'])
+    add_task(store, 'old-pending', created_at='2020-01-01T00:00:01', status='pending')
+    add_task(store, 'done', status='completed')
+    store.append(EVENT_UPDATE, 'done', {'error': None})
+
+    assert store.fail_unfinished('服务重启，任务中断', '[00:00:00] 中断', '2026-01-02T00:00:00') == 2
+
+    running = store.get('old-running')
+    assert running['status'] == 'failed'
+    assert running['error'] == '服务重启，任务中断'
+    assert running['completed_at'] == '2026-01-02T00:00:00'
+    assert running['logs'] == ['started', '[00:00:00] 中断']
+    assert store.get('old-pending')['logs'] == ['[00:00:00] 中断']
+    assert store.get('done')['status'] == 'completed'
+    assert store.query(status='running') == [] and store.query(status='pending') == []
@@ -0,0 +1,74 @@
+"""
+耗时埋点模块
+用 span() 包住一段操作记录耗时：当前线程正在记录步骤时计入该步骤的耗时分解，
+同时通知所有 span_listeners（用于汇总为直方图）
+
+名称不含 "." 的为顶层阶段（同一线程内互不重叠，可以相加），
+含 "." 的为子阶段（如 screenshot.capture 包含在 screenshot 之内，也可能发生在后台预取线程）
+"""
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 耗时回调: (阶段名称, 毫秒)
+span_listeners: List[Callable[[str, float], None]] = []
+
+_local = threading.local()
+
+
+class StepTrace:
+    """一个步骤内各阶段的累计耗时（毫秒）"""
+
+    def __init__(self):
+        self.spans: Dict[str, float] = {}
+
+    def add(self, name: str, elapsed_ms: float):
+        self.spans[name] = self.spans.get(name, 0.0) + elapsed_ms
+
+    def top_level_ms(self) -> float:
+        """顶层阶段耗时之和"""
+        return sum(ms for name, ms in self.spans.items() if '.' not in name)
+
+    def to_dict(self) -> Dict[str, float]:
+        return {name: round(ms, 1) for name, ms in self.spans.items()}
+
+
+def begin_trace() -> StepTrace:
+    """开始在当前线程记录步骤耗时"""
+    trace = StepTrace()
+    _local.trace = trace
+    return trace
+
+
+def end_trace() -> Optional[StepTrace]:
+    """结束当前线程的记录，返回记录结果"""
+    trace = getattr(_local, 'trace', None)
+    _local.trace = None
+    return trace
+
+
+def record(name: str, elapsed_ms: float):
+    """记录一个阶段的耗时"""
+    trace = getattr(_local, 'trace', None)
+    if trace is not None:
+        trace.add(name, elapsed_ms)
+    for listener in span_listeners:
+        try:
+            listener(name, elapsed_ms)
+        except Exception as e:
+            logger.debug(f"耗时回调失败: {e}")
+
+
+@contextmanager
+def span(name: str):
+    """记录代码块的耗时（抛出异常时同样记录）"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, (time.perf_counter() - start) * 1000)